@@ -1,12 +1,22 @@
 from flask import Flask, request, jsonify, redirect, session
 from flask_cors import CORS
 import os
-import spotipy
 from spotipy.oauth2 import SpotifyOAuth
 from db import get_db
 from stats import stats_bp
 from stats_recently_played import stats_recently_played_bp
+from history import history_bp
+from ratings import ratings_bp
+from search import search_bp
+from export import export_bp
+from now_playing import now_playing_bp
+from feed import feed_bp
+from listening_patterns import listening_patterns_bp
+from recommendations import recommendations_bp
+from leaderboards import leaderboards_bp
 from config import Config
+from auth import use_spotify_endpoints, make_spotify_client
+from profiling import init_profiling
 
 def upsert_user(spotify_user_data):
     """
@@ -54,6 +64,17 @@ CORS(app, supports_credentials=True)
 
 app.register_blueprint(stats_bp)
 app.register_blueprint(stats_recently_played_bp)
+app.register_blueprint(history_bp)
+app.register_blueprint(ratings_bp)
+app.register_blueprint(search_bp)
+app.register_blueprint(export_bp)
+app.register_blueprint(now_playing_bp)
+app.register_blueprint(feed_bp)
+app.register_blueprint(listening_patterns_bp)
+app.register_blueprint(recommendations_bp)
+app.register_blueprint(leaderboards_bp)
+
+init_profiling(app)
 
 # Initialize Spotify OAuth handler - use session-based cache instead of file
 def get_sp_oauth():
@@ -94,13 +115,13 @@ def get_sp_oauth():
     cache_path = os.path.join(tempfile.gettempdir(), f'.spotipyoauthcache-{session_id}')
 
     # Return a configured SpotifyOAuth instance
-    return SpotifyOAuth(
+    return use_spotify_endpoints(SpotifyOAuth(
         Config.SPOTIFY_CLIENT_ID,      # Spotify app's client ID
         Config.SPOTIFY_CLIENT_SECRET,  # Spotify app's client secret
         Config.SPOTIPY_REDIRECT_URI,   # Spotify redirect after auth
         scope=Config.SPOTIFY_SCOPE,    # Permissions your app requests
         cache_path=cache_path          # Where to cache the OAuth tokens
-    )
+    ))
 
 # Routes
 @app.route('/')
@@ -125,7 +146,7 @@ def index():
     session['token_info'] = token_info
     #if token exists, use for authenticated API calls
     access_token = token_info['access_token']
-    sp = spotipy.Spotify(auth=access_token)
+    sp = make_spotify_client(access_token)
     results = sp.current_user()
 
     # Insert/update user in database
@@ -155,7 +176,7 @@ def callback():
 
     code = request.args.get('code')
     token_info = sp_oauth.get_access_token(code)
-    sp = spotipy.Spotify(auth=token_info['access_token'])
+    sp = make_spotify_client(token_info['access_token'])
     session['token_info'] = token_info
 
     # Get user data and insert/update in database
@@ -5,28 +5,76 @@ from flask import session
 import spotipy
 from spotipy.oauth2 import SpotifyOAuth
 import os
+from config import Config
 
-def get_authenticated_spotify_client():
+def use_spotify_endpoints(sp_oauth: SpotifyOAuth) -> SpotifyOAuth:
+    """Point an OAuth handler at the configured Spotify accounts service."""
+    sp_oauth.OAUTH_AUTHORIZE_URL = f"{Config.SPOTIFY_ACCOUNTS_BASE_URL}/authorize"
+    sp_oauth.OAUTH_TOKEN_URL = f"{Config.SPOTIFY_ACCOUNTS_BASE_URL}/api/token"
+    return sp_oauth
+
+def make_spotify_client(access_token: str) -> spotipy.Spotify:
     """
-    Get authenticated Spotify client, refreshing token if needed.
+    Create a Spotify Web API client for an access token.
+
+    Args:
+        access_token: OAuth access token
 
     Returns:
-        tuple: (spotipy.Spotify client, token_info dict) or (None, None) if not authenticated
+        spotipy.Spotify: Client talking to the configured Spotify API
     """
-    token_info = session.get('token_info')
-    if not token_info:
-        return None, None
+    sp = spotipy.Spotify(auth=access_token)
+    sp.prefix = Config.SPOTIFY_API_BASE_URL
+    return sp
 
-    sp_oauth = SpotifyOAuth(
+def get_spotify_oauth():
+    """
+    Create the SpotifyOAuth handler used to refresh access tokens.
+
+    Returns:
+        SpotifyOAuth: OAuth handler configured from the environment
+    """
+    return use_spotify_endpoints(SpotifyOAuth(
         client_id=os.getenv("SPOTIFY_CLIENT_ID"),
         client_secret=os.getenv("SPOTIFY_CLIENT_SECRET"),
         redirect_uri="http://127.0.0.1:8080/callback",
         scope='user-read-private user-read-email user-top-read user-read-recently-played user-read-playback-state user-read-currently-playing user-read-playback-position user-library-read user-library-modify playlist-read-private playlist-read-collaborative playlist-modify-public playlist-modify-private user-follow-read user-follow-modify user-modify-playback-state streaming app-remote-control ugc-image-upload'
-    )
+    ))
+
+def get_spotify_client_for_token(token_info):
+    """
+    Get a Spotify client for a stored token, refreshing it if needed.
+
+    Unlike get_authenticated_spotify_client() this does not touch the Flask
+    session, so it can be used from background threads.
+
+    Args:
+        token_info: Token dictionary from the OAuth flow
+
+    Returns:
+        tuple: (spotipy.Spotify client, token_info dict), token_info may be a refreshed copy
+    """
+    sp_oauth = get_spotify_oauth()
 
     if sp_oauth.is_token_expired(token_info):
         token_info = sp_oauth.refresh_access_token(token_info['refresh_token'])
-        session['token_info'] = token_info
 
-    sp = spotipy.Spotify(auth=token_info['access_token'])
+    sp = make_spotify_client(token_info['access_token'])
     return sp, token_info
+
+def get_authenticated_spotify_client():
+    """
+    Get authenticated Spotify client, refreshing token if needed.
+
+    Returns:
+        tuple: (spotipy.Spotify client, token_info dict) or (None, None) if not authenticated
+    """
+    token_info = session.get('token_info')
+    if not token_info:
+        return None, None
+
+    sp, refreshed_token_info = get_spotify_client_for_token(token_info)
+    if refreshed_token_info is not token_info:
+        session['token_info'] = refreshed_token_info
+
+    return sp, refreshed_token_info
@@ -0,0 +1,94 @@
+"""
+Circuit breaker for calls to external services (Spotify).
+
+After `failure_threshold` consecutive failures the breaker opens, and calls
+fail fast with CircuitOpenError instead of waiting on a service that is down.
+After `reset_timeout` seconds it lets a single trial call through (half-open).
+If the trial succeeds the breaker closes again; if it fails it stays open.
+"""
+import threading
+import time
+from config import Config
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the service while the breaker is open."""
+
+
+class CircuitBreaker:
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 60):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def is_open(self) -> bool:
+        """True while calls would be rejected (does not use up the half-open trial)."""
+        with self._lock:
+            return self._state != self.CLOSED and time.monotonic() - self._opened_at < self.reset_timeout
+
+    def allow_request(self) -> bool:
+        """
+        Check whether a call may go through right now.
+
+        Once the reset timeout has passed this admits one trial call and
+        restarts the timer, so other callers keep failing fast until the trial
+        reports back (or another timeout passes without an answer).
+        """
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._state = self.HALF_OPEN
+                self._opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    print(f"Circuit '{self.name}' opened after {self._failures} failures", flush=True)
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def call(self, func, *args, **kwargs):
+        """
+        Call func through the breaker.
+
+        Raises:
+            CircuitOpenError: If the breaker is open
+            Exception: Whatever func raises (which also counts as a failure)
+        """
+        if not self.allow_request():
+            raise CircuitOpenError(f"Circuit '{self.name}' is open")
+
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            self.record_failure()
+            raise
+
+        self.record_success()
+        return result
+
+
+# Shared by everything that talks to the Spotify Web API
+spotify_breaker = CircuitBreaker(
+    'spotify',
+    failure_threshold=Config.SPOTIFY_BREAKER_FAILURE_THRESHOLD,
+    reset_timeout=Config.SPOTIFY_BREAKER_RESET_SECONDS
+)
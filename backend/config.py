@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -13,6 +14,18 @@ class Config:
     SPOTIFY_CLIENT_SECRET = os.getenv('SPOTIFY_CLIENT_SECRET')
     SPOTIPY_REDIRECT_URI = os.getenv('SPOTIPY_REDIRECT_URI', 'http://127.0.0.1:8000/callback')
     SPOTIFY_SCOPE = 'user-read-private user-read-email user-top-read user-read-recently-played user-read-playback-state user-read-currently-playing user-read-playback-position user-library-read user-library-modify playlist-read-private playlist-read-collaborative playlist-modify-public playlist-modify-private user-follow-read user-follow-modify user-modify-playback-state streaming app-remote-control ugc-image-upload'
+    # Overridable so the load test (see loadtest.py) can point the app at a local stand-in
+    SPOTIFY_API_BASE_URL = os.getenv('SPOTIFY_API_BASE_URL', 'https://api.spotify.com/v1/')
+    SPOTIFY_ACCOUNTS_BASE_URL = os.getenv('SPOTIFY_ACCOUNTS_BASE_URL', 'https://accounts.spotify.com')
+
+    # Stats serving
+    STATS_MAX_AGE_HOURS = int(os.getenv('STATS_MAX_AGE_HOURS', '24'))
+    # Serve the latest stored snapshot immediately and refresh stale ones in the background
+    STATS_STALE_WHILE_REVALIDATE = os.getenv('STATS_STALE_WHILE_REVALIDATE', 'false').lower() == 'true'
+    SPOTIFY_BREAKER_FAILURE_THRESHOLD = int(os.getenv('SPOTIFY_BREAKER_FAILURE_THRESHOLD', '5'))
+    SPOTIFY_BREAKER_RESET_SECONDS = int(os.getenv('SPOTIFY_BREAKER_RESET_SECONDS', '60'))
+    # How long after a sync from Spotify the recently played page may be answered with a 304
+    RECENTLY_PLAYED_REVALIDATE_SECONDS = int(os.getenv('RECENTLY_PLAYED_REVALIDATE_SECONDS', '60'))
 
     # Database
     MYSQL_HOST = os.getenv('MYSQL_HOST', 'db')
@@ -21,6 +34,16 @@ class Config:
     MYSQL_PASSWORD = os.getenv('MYSQL_PASSWORD', os.getenv('MYSQL_ROOT_PASSWORD', 'root'))
     MYSQL_DATABASE = os.getenv('MYSQL_DATABASE', 'spotify_app')
 
+    # Retention (see retention.py)
+    RECENTLY_PLAYED_RETENTION_MONTHS = int(os.getenv('RECENTLY_PLAYED_RETENTION_MONTHS', '24'))
+    RECENTLY_PLAYED_PARTITIONS_AHEAD = int(os.getenv('RECENTLY_PLAYED_PARTITIONS_AHEAD', '3'))
+
+    # Profiling (see profiling.py); both empty means the hooks are not installed
+    PROFILING_HEADER_TOKEN = os.getenv('PROFILING_HEADER_TOKEN', '')
+    PROFILING_USERS = {name.strip() for name in os.getenv('PROFILING_USERS', '').split(',') if name.strip()}
+    PROFILING_SAMPLE_INTERVAL_MS = float(os.getenv('PROFILING_SAMPLE_INTERVAL_MS', '5'))
+    PROFILING_OUTPUT_DIR = os.getenv('PROFILING_OUTPUT_DIR', os.path.join(tempfile.gettempdir(), 'reverb-profiles'))
+
     # Cache
     CACHE_PATH = '.spotipyoauthcache'
 
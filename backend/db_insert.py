@@ -5,6 +5,124 @@ This module contains all functions related to inserting data into the database,
 including stats records, top songs, albums, and artists.
 """
 from db import get_db
+from search import index_catalog_items
+from recommendations import update_cooccurrence
+from leaderboards import update_leaderboards
+
+
+# Spotify ID and display name keys of the row dictionaries for each item type
+CATALOG_KEYS = {
+    'song': ('spotifyTrackId', 'songName'),
+    'album': ('spotifyAlbumId', 'albumName'),
+    'artist': ('spotifyArtistId', 'artistName'),
+}
+
+
+def _append_rank_history(cursor, stats_id: int, item_type: str, items: list) -> None:
+    """
+    Append one point per item to its (user, timeframe, item) series in RankHistory.
+
+    Args:
+        cursor: Open cursor on the connection doing the insert
+        stats_id: The statsID of the snapshot being written
+        item_type: 'song', 'album', or 'artist'
+        items: Item dictionaries being inserted (must contain 'rank' and the item's ID key)
+    """
+    cursor.execute("""
+        SELECT userName, timeframe, createdAt
+        FROM Stats
+        WHERE uniqueID = %s
+    """, (stats_id,))
+    snapshot = cursor.fetchone()
+    if not snapshot:
+        return
+
+    userName, timeframe, created_at = snapshot
+    id_key = CATALOG_KEYS[item_type][0]
+    rows = [
+        (userName, timeframe, item_type, item[id_key], created_at, stats_id, item['rank'])
+        for item in items
+        if item.get(id_key)
+    ]
+    if not rows:
+        return
+
+    # IGNORE keeps re-inserts of the same snapshot from duplicating points
+    cursor.executemany("""
+        INSERT IGNORE INTO RankHistory (userName, timeframe, itemType, spotifyId, recordedAt, statsID, `rank`)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+    """, rows)
+
+
+def _insert_stats_record(cursor, userName: str, timeframe: str) -> int:
+    """Insert a Stats row on the caller's cursor and return its uniqueID."""
+    cursor.execute("""
+        INSERT INTO Stats (userName, timeframe, totalMinutes)
+        VALUES (%s, %s, 0)
+    """, (userName, timeframe))
+    return cursor.lastrowid
+
+
+def _insert_top_songs(cursor, stats_id: int, songs: list) -> None:
+    """Bulk insert TopSong rows and their rank history on the caller's cursor."""
+    if not songs:
+        return
+
+    cursor.executemany("""
+        INSERT INTO TopSong (statsID, songName, artistName, spotifyTrackId, `rank`, playCount, imageUrl)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+    """, [(
+        stats_id,
+        song['songName'],
+        song['artistName'],
+        song['spotifyTrackId'],
+        song['rank'],
+        song['playCount'],
+        song['imageUrl']
+    ) for song in songs])
+
+    _append_rank_history(cursor, stats_id, 'song', songs)
+
+
+def _insert_top_albums(cursor, stats_id: int, albums: list) -> None:
+    """Bulk insert TopAlbum rows and their rank history on the caller's cursor."""
+    if not albums:
+        return
+
+    cursor.executemany("""
+        INSERT INTO TopAlbum (statsID, albumName, artistName, spotifyAlbumId, `rank`, playCount, imageUrl)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+    """, [(
+        stats_id,
+        album['albumName'],
+        album['artistName'],
+        album['spotifyAlbumId'],
+        album['rank'],
+        album['playCount'],
+        album['imageUrl']
+    ) for album in albums])
+
+    _append_rank_history(cursor, stats_id, 'album', albums)
+
+
+def _insert_top_artists(cursor, stats_id: int, artists: list) -> None:
+    """Bulk insert TopArtist rows and their rank history on the caller's cursor."""
+    if not artists:
+        return
+
+    cursor.executemany("""
+        INSERT INTO TopArtist (statsID, artistName, spotifyArtistId, `rank`, playCount, imageUrl)
+        VALUES (%s, %s, %s, %s, %s, %s)
+    """, [(
+        stats_id,
+        artist['artistName'],
+        artist['spotifyArtistId'],
+        artist['rank'],
+        artist['playCount'],
+        artist['imageUrl']
+    ) for artist in artists])
+
+    _append_rank_history(cursor, stats_id, 'artist', artists)
 
 
 def insert_stats_record(userName, timeframe='short_term'):
@@ -22,13 +140,8 @@ def insert_stats_record(userName, timeframe='short_term'):
     cursor = conn.cursor()
 
     try:
-        cursor.execute("""
-            INSERT INTO Stats (userName, timeframe, totalMinutes)
-            VALUES (%s, %s, 0)
-        """, (userName, timeframe))
-
+        stats_id = _insert_stats_record(cursor, userName, timeframe)
         conn.commit()
-        stats_id = cursor.lastrowid
         return stats_id
     except Exception as e:
         conn.rollback()
@@ -38,68 +151,67 @@ def insert_stats_record(userName, timeframe='short_term'):
         conn.close()
 
 
-def insert_top_songs_to_db(stats_id: int, songs: list) -> None:
+def insert_snapshot_pages(userName: str, timeframe: str, pages) -> int:
     """
-    Insert top songs data into the TopSong table.
+    Write a whole snapshot from pages of rows as they arrive, in one transaction.
 
-    Args:
-        stats_id: The statsID foreign key from the Stats table
-        songs: List of song dictionaries from fetch_all_top_songs()
-    """
-    conn = get_db()
-    cursor = conn.cursor()
+    The Stats record and every page of TopSong/TopAlbum/TopArtist rows share a
+    connection and commit together, so a failed fetch leaves no half-written
+    snapshot behind.
 
-    try:
-        for song in songs:
-            cursor.execute("""
-                INSERT INTO TopSong (statsID, songName, artistName, spotifyTrackId, `rank`, playCount, imageUrl)
-                VALUES (%s, %s, %s, %s, %s, %s, %s)
-            """, (
-                stats_id,
-                song['songName'],
-                song['artistName'],
-                song['spotifyTrackId'],
-                song['rank'],
-                song['playCount'],
-                song['imageUrl']
-            ))
+    Everything derived from the snapshot (rank history, search catalog,
+    co-occurrence counts, leaderboards) is written on the same cursor, so it
+    commits or rolls back with the rows it came from. Only the rank history,
+    which is private to the user, is written while pages are still arriving.
+    The catalog, co-occurrence and leaderboard rows are shared between users,
+    so they are updated once every page is in, in key order, right before the
+    commit. That way no lock on a shared row is held while waiting on Spotify,
+    and concurrent snapshots take those locks in the same order.
 
-        conn.commit()
-    except Exception as e:
-        conn.rollback()
-        raise e
-    finally:
-        cursor.close()
-        conn.close()
+    The transaction stays open while the caller fetches the remaining pages,
+    including any 429 backoff, on purpose. Committing page by page would let
+    readers see a snapshot with only some of its rows, and every reader of
+    Stats would need a completeness check to skip it. An open transaction holds
+    only a single connection and the locks on the new Stats, Top* and
+    RankHistory rows, which are this user's alone.
 
+    Args:
+        userName: The userName (Spotify ID)
+        timeframe: 'short_term', 'medium_term', or 'long_term'
+        pages: Iterable of (kind, rows) where kind is 'songs', 'albums', or 'artists'
+               and rows is a list of dictionaries like fetch_all_top_*() returns
 
-def insert_top_albums_to_db(stats_id: int, albums: list) -> None:
+    Returns:
+        stats_id: The uniqueID of the created Stats record
     """
-    Insert top albums data into the TopAlbum table.
+    inserters = {
+        'songs': ('song', _insert_top_songs),
+        'albums': ('album', _insert_top_albums),
+        'artists': ('artist', _insert_top_artists),
+    }
+    # Spotify ID -> row for each item type, for the catalog update at the end
+    catalog_items = {item_type: {} for item_type in CATALOG_KEYS}
 
-    Args:
-        stats_id: The statsID foreign key from the Stats table
-        albums: List of album dictionaries from fetch_all_top_albums()
-    """
     conn = get_db()
     cursor = conn.cursor()
 
     try:
-        for album in albums:
-            cursor.execute("""
-                INSERT INTO TopAlbum (statsID, albumName, artistName, spotifyAlbumId, `rank`, playCount, imageUrl)
-                VALUES (%s, %s, %s, %s, %s, %s, %s)
-            """, (
-                stats_id,
-                album['albumName'],
-                album['artistName'],
-                album['spotifyAlbumId'],
-                album['rank'],
-                album['playCount'],
-                album['imageUrl']
-            ))
+        stats_id = _insert_stats_record(cursor, userName, timeframe)
+        for kind, rows in pages:
+            item_type, insert = inserters[kind]
+            insert(cursor, stats_id, rows)
+            id_key = CATALOG_KEYS[item_type][0]
+            for row in rows:
+                if row.get(id_key):
+                    catalog_items[item_type].setdefault(row[id_key], row)
 
+        for item_type in sorted(catalog_items):
+            index_catalog_items(cursor, userName, item_type, list(catalog_items[item_type].values()),
+                                *CATALOG_KEYS[item_type])
+        update_cooccurrence(cursor, userName)
+        update_leaderboards(cursor, userName, timeframe, stats_id)
         conn.commit()
+        return stats_id
     except Exception as e:
         conn.rollback()
         raise e
@@ -108,32 +220,57 @@ def insert_top_albums_to_db(stats_id: int, albums: list) -> None:
         conn.close()
 
 
-def insert_top_artists_to_db(stats_id: int, artists: list) -> None:
+def insert_recently_played_to_db(userName: str, plays: list) -> int:
     """
-    Insert top artists data into the TopArtist table.
+    Batch insert plays into the RecentlyPlayed table, skipping ones already stored.
 
     Args:
-        stats_id: The statsID foreign key from the Stats table
-        artists: List of artist dictionaries from fetch_all_top_artists()
+        userName: The userName (Spotify ID)
+        plays: List of play dictionaries:
+        {
+            'songName': str,
+            'artistName': str,
+            'albumName': str,
+            'spotifyTrackId': str or None,
+            'playedAt': datetime (UTC),
+            'msPlayed': int or None
+        }
+
+    Returns:
+        int: Number of plays that were new
     """
+    if not plays:
+        return 0
+
     conn = get_db()
     cursor = conn.cursor()
 
     try:
-        for artist in artists:
+        # INSERT IGNORE + unique_play dedupes against plays already in the table
+        cursor.executemany("""
+            INSERT IGNORE INTO RecentlyPlayed (userName, songName, artistName, albumName, spotifyTrackId, playedAt, msPlayed)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+        """, [(
+            userName,
+            play['songName'],
+            play['artistName'],
+            play.get('albumName'),
+            play.get('spotifyTrackId'),
+            play['playedAt'],
+            play.get('msPlayed')
+        ) for play in plays])
+        inserted = cursor.rowcount
+
+        # Tells caches built from this user's plays that they are out of date
+        if inserted:
             cursor.execute("""
-                INSERT INTO TopArtist (statsID, artistName, spotifyArtistId, `rank`, playCount, imageUrl)
-                VALUES (%s, %s, %s, %s, %s, %s)
-            """, (
-                stats_id,
-                artist['artistName'],
-                artist['spotifyArtistId'],
-                artist['rank'],
-                artist['playCount'],
-                artist['imageUrl']
-            ))
+                INSERT INTO RecentlyPlayedVersion (userName, version)
+                VALUES (%s, 1)
+                ON DUPLICATE KEY UPDATE version = version + 1
+            """, (userName,))
 
         conn.commit()
+        return inserted
     except Exception as e:
         conn.rollback()
         raise e
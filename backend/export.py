@@ -0,0 +1,273 @@
+"""
+Streaming export of everything stored for a user, as NDJSON or CSV.
+
+Rows are read in fixed-size keyset chunks from unbuffered cursors. Each chunk
+gets its own short-lived connection, which is closed before the rows are
+yielded to the response. Memory stays bounded by the chunk size however much
+history exists, and a client that reads slowly never pins a database
+connection while it drains the response.
+"""
+import csv
+import io
+import json
+from datetime import datetime
+from decimal import Decimal
+from flask import Blueprint, Response, session, request, jsonify
+from db import get_db
+
+export_bp = Blueprint('export', __name__)
+
+EXPORT_CHUNK_SIZE = 500
+SNAPSHOT_CHUNK_SIZE = 20
+EXPORT_TIMEFRAMES = ['short_term', 'medium_term', 'long_term']
+
+# Union of every field any record type can have, in CSV column order
+CSV_FIELDS = [
+    'recordType', 'userName', 'displayName', 'profilePicture',
+    'statsId', 'timeframe', 'totalMinutes', 'createdAt', 'updatedAt',
+    'rank', 'songName', 'albumName', 'artistName',
+    'spotifyTrackId', 'spotifyAlbumId', 'spotifyArtistId',
+    'playCount', 'imageUrl', 'rating', 'comment', 'playedAt', 'msPlayed',
+]
+
+# Table, selected columns and record type for each kind of snapshot item
+SNAPSHOT_ITEM_EXPORTS = [
+    ('TopSong', 'top_song', 'songName, artistName, spotifyTrackId, `rank`, playCount, imageUrl'),
+    ('TopAlbum', 'top_album', 'albumName, artistName, spotifyAlbumId, `rank`, playCount, imageUrl'),
+    ('TopArtist', 'top_artist', 'artistName, spotifyArtistId, `rank`, playCount, imageUrl'),
+]
+
+
+def _iter_keyset_chunks(build_query, key_of, chunk_size: int = EXPORT_CHUNK_SIZE):
+    """
+    Yield a keyset-paginated query as lists of rows, one chunk per connection.
+
+    Args:
+        build_query: Function (after_key, limit) -> (sql, params); after_key is
+                     None for the first chunk
+        key_of: Function row -> sort key of that row
+        chunk_size: Rows per chunk
+
+    Yields:
+        list: Up to chunk_size rows; the connection is closed before each yield
+    """
+    after = None
+    while True:
+        sql, params = build_query(after, chunk_size)
+
+        conn = get_db()
+        # Unbuffered: rows come off the socket as the cursor is iterated
+        cursor = conn.cursor(dictionary=True, buffered=False)
+        try:
+            cursor.execute(sql, params)
+            rows = [row for row in cursor]
+        finally:
+            cursor.close()
+            conn.close()
+
+        if rows:
+            yield rows
+        if len(rows) < chunk_size:
+            return
+        after = key_of(rows[-1])
+
+
+def _iter_keyset(build_query, key_of, chunk_size: int = EXPORT_CHUNK_SIZE):
+    """Yield every row of a keyset-paginated query (see _iter_keyset_chunks)."""
+    for rows in _iter_keyset_chunks(build_query, key_of, chunk_size):
+        yield from rows
+
+
+def _iter_user(userName: str):
+    """Yield the User row."""
+    conn = get_db()
+    cursor = conn.cursor(dictionary=True)
+
+    try:
+        cursor.execute("""
+            SELECT userName, displayName, profilePicture
+            FROM User
+            WHERE userName = %s
+        """, (userName,))
+        user = cursor.fetchone()
+    finally:
+        cursor.close()
+        conn.close()
+
+    if user:
+        yield 'user', user
+
+
+def _iter_snapshot_items(stats_ids: list):
+    """Yield the TopSong/TopAlbum/TopArtist rows of a chunk of snapshots."""
+    placeholders = ', '.join(['%s'] * len(stats_ids))
+
+    for table, record_type, columns in SNAPSHOT_ITEM_EXPORTS:
+        def build_query(after, limit, table=table, columns=columns):
+            keyset = ""
+            params = list(stats_ids)
+            if after:
+                keyset = "AND (statsID > %s OR (statsID = %s AND `rank` > %s))"
+                params += [after[0], after[0], after[1]]
+            return f"""
+                SELECT statsID AS statsId, {columns}
+                FROM {table}
+                WHERE statsID IN ({placeholders})
+                {keyset}
+                ORDER BY statsID, `rank`
+                LIMIT %s
+            """, (*params, limit)
+
+        for row in _iter_keyset(build_query, key_of=lambda row: (row['statsId'], row['rank'])):
+            yield record_type, row
+
+
+def _iter_snapshots(userName: str):
+    """Yield every Stats snapshot, each chunk followed by its Top* rows."""
+    for timeframe in EXPORT_TIMEFRAMES:
+        def build_query(after, limit, timeframe=timeframe):
+            if after:
+                return """
+                    SELECT uniqueID AS statsId, timeframe, totalMinutes, createdAt
+                    FROM Stats
+                    WHERE userName = %s
+                    AND timeframe = %s
+                    AND (createdAt > %s OR (createdAt = %s AND uniqueID > %s))
+                    ORDER BY createdAt, uniqueID
+                    LIMIT %s
+                """, (userName, timeframe, after[0], after[0], after[1], limit)
+            return """
+                SELECT uniqueID AS statsId, timeframe, totalMinutes, createdAt
+                FROM Stats
+                WHERE userName = %s
+                AND timeframe = %s
+                ORDER BY createdAt, uniqueID
+                LIMIT %s
+            """, (userName, timeframe, limit)
+
+        # Snapshots carry hundreds of items each, so take them a few at a time
+        for snapshots in _iter_keyset_chunks(build_query,
+                                             key_of=lambda row: (row['createdAt'], row['statsId']),
+                                             chunk_size=SNAPSHOT_CHUNK_SIZE):
+            for snapshot in snapshots:
+                yield 'stats', snapshot
+            yield from _iter_snapshot_items([snapshot['statsId'] for snapshot in snapshots])
+
+
+def _iter_ratings(userName: str):
+    """Yield the user's album and song ratings."""
+    for table, record_type, id_column, name_column in [
+        ('RatedAlbum', 'rated_album', 'spotifyAlbumId', 'albumName'),
+        ('RatedSong', 'rated_song', 'spotifyTrackId', 'songName'),
+    ]:
+        # Keyed on uniqueID, since the Spotify ID may be NULL
+        def build_query(after, limit, table=table, id_column=id_column, name_column=name_column):
+            return f"""
+                SELECT uniqueID, {name_column}, artistName, {id_column}, rating, comment, createdAt, updatedAt
+                FROM {table}
+                WHERE userName = %s
+                AND uniqueID > %s
+                ORDER BY uniqueID
+                LIMIT %s
+            """, (userName, after or 0, limit)
+
+        for row in _iter_keyset(build_query, key_of=lambda row: row['uniqueID']):
+            yield record_type, {key: value for key, value in row.items() if key != 'uniqueID'}
+
+
+def _iter_recently_played(userName: str):
+    """Yield the user's stored plays, oldest first."""
+    # (playedAt, songName) is unique per user and follows the unique_play index order
+    def build_query(after, limit):
+        if after:
+            return """
+                SELECT songName, artistName, albumName, spotifyTrackId, playedAt, msPlayed
+                FROM RecentlyPlayed
+                WHERE userName = %s
+                AND (playedAt > %s OR (playedAt = %s AND songName > %s))
+                ORDER BY playedAt, songName
+                LIMIT %s
+            """, (userName, after[0], after[0], after[1], limit)
+        return """
+            SELECT songName, artistName, albumName, spotifyTrackId, playedAt, msPlayed
+            FROM RecentlyPlayed
+            WHERE userName = %s
+            ORDER BY playedAt, songName
+            LIMIT %s
+        """, (userName, limit)
+
+    for row in _iter_keyset(build_query, key_of=lambda row: (row['playedAt'], row['songName'])):
+        yield 'recently_played', row
+
+
+def iter_user_export(userName: str):
+    """
+    Yield (recordType, row) for everything stored about a user.
+
+    Order: user, stats snapshots (each chunk followed by its top songs, albums
+    and artists), ratings, then recently played tracks.
+    """
+    yield from _iter_user(userName)
+    yield from _iter_snapshots(userName)
+    yield from _iter_ratings(userName)
+    yield from _iter_recently_played(userName)
+
+
+def _json_default(value):
+    """Serialize the datetime and Decimal values MySQL hands back."""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def generate_ndjson(userName: str):
+    """Yield the export as newline-delimited JSON, one record per line."""
+    for record_type, row in iter_user_export(userName):
+        yield json.dumps({'recordType': record_type, **row}, default=_json_default) + '\n'
+
+
+def generate_csv(userName: str):
+    """Yield the export as CSV with one column per field of any record type."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=CSV_FIELDS, extrasaction='ignore')
+
+    writer.writeheader()
+    for record_type, row in iter_user_export(userName):
+        row = {key: _json_default(value) if isinstance(value, (datetime, Decimal)) else value
+               for key, value in row.items()}
+        writer.writerow({'recordType': record_type, **row})
+
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+
+    yield buffer.getvalue()
+
+
+@export_bp.route('/api/export')
+def export_user_data():
+    """
+    Download everything stored for the logged in user.
+
+    Query params:
+        format: 'ndjson' (default) or 'csv'
+    """
+    userName = session.get('userName')
+    if not userName:
+        return jsonify({'error': 'Not authenticated'}), 401
+
+    export_format = request.args.get('format', 'ndjson')
+    if export_format == 'ndjson':
+        body, mimetype = generate_ndjson(userName), 'application/x-ndjson'
+    elif export_format == 'csv':
+        body, mimetype = generate_csv(userName), 'text/csv'
+    else:
+        return jsonify({'error': f'Invalid format: {export_format}'}), 400
+
+    return Response(body, mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename="reverb-export-{userName}.{export_format}"',
+        # Ask reverse proxies not to buffer the whole stream before sending it on
+        'X-Accel-Buffering': 'no',
+    })
@@ -0,0 +1,266 @@
+"""
+Local stand-in for the Spotify accounts service and Web API, for load testing.
+
+Serves just what the app's login, stats and recently played flows call:
+
+    POST /api/token                      authorization_code and refresh_token grants
+    GET  /v1/me                          profile
+    GET  /v1/me/top/tracks               paged top tracks
+    GET  /v1/me/top/artists              paged top artists
+    GET  /v1/me/player/recently-played   last 50 plays
+
+An authorization code is taken as the user's ID, and access tokens are
+"token-<userName>", so any number of users can log in without any setup.
+Every user's top lists are drawn deterministically from a shared catalog, so
+users overlap the way real ones do. Responses can be delayed and a share of
+them answered with 429 + Retry-After to see how the app behaves when Spotify
+is slow or rate limiting.
+
+Usage:
+    python fake_spotify.py [--port 8900] [--latency-ms 80] [--rate-limit 0.02] [--pages 2]
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+CATALOG_TRACKS = 5000
+CATALOG_ARTISTS = 800
+CATALOG_ALBUMS = 1500
+TOP_PAGE_SIZE = 50
+
+
+class FakeSpotifySettings:
+    """Knobs for the fake server; changeable while it runs."""
+
+    def __init__(self, latency_ms: float = 80, jitter_ms: float = 40, rate_limit: float = 0.0,
+                 retry_after: int = 1, pages: int = 2):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.pages = pages
+
+
+class FakeSpotifyStats:
+    """Thread-safe request counters, read by the load test report."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.rate_limited = 0
+
+    def record(self, rate_limited: bool) -> None:
+        with self._lock:
+            self.requests += 1
+            if rate_limited:
+                self.rate_limited += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {'requests': self.requests, 'rateLimited': self.rate_limited}
+
+
+def _artist(index: int) -> dict:
+    return {
+        'id': f'artist{index:05d}',
+        'name': f'Artist {index}',
+        'images': [{'url': f'https://i.example/artist{index}.jpg', 'width': 640, 'height': 640}],
+        'genres': [f'genre {index % 40}'],
+        'popularity': 100 - index % 100,
+    }
+
+
+def _track(index: int) -> dict:
+    artist_index = index % CATALOG_ARTISTS
+    album_index = index % CATALOG_ALBUMS
+    artist = {'id': f'artist{artist_index:05d}', 'name': f'Artist {artist_index}'}
+    return {
+        'id': f'track{index:05d}',
+        'name': f'Track {index}',
+        'artists': [artist],
+        'album': {
+            'id': f'album{album_index:05d}',
+            'name': f'Album {album_index}',
+            'artists': [artist],
+            'images': [{'url': f'https://i.example/album{album_index}.jpg', 'width': 640, 'height': 640}],
+        },
+        'duration_ms': 150000 + (index * 7919) % 150000,
+        'popularity': 100 - index % 100,
+    }
+
+
+def _top_indexes(userName: str, kind: str, time_range: str, count: int, catalog_size: int) -> list:
+    """A user's top list: popular catalog items are more likely, and it is stable per user."""
+    rng = random.Random(f'{userName}:{kind}:{time_range}')
+    picked = []
+    seen = set()
+    while len(picked) < min(count, catalog_size):
+        index = int(rng.paretovariate(1.2)) % catalog_size
+        if index not in seen:
+            seen.add(index)
+            picked.append(index)
+    return picked
+
+
+class FakeSpotifyHandler(BaseHTTPRequestHandler):
+    """Request handler; settings and stats live on the server object."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload, headers=None) -> None:
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _delay_or_rate_limit(self) -> bool:
+        """Simulate network/server latency; returns True if a 429 was sent instead."""
+        settings = self.server.settings
+        delay = settings.latency_ms + random.uniform(-settings.jitter_ms, settings.jitter_ms)
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+        rate_limited = random.random() < settings.rate_limit
+        self.server.stats.record(rate_limited)
+        if rate_limited:
+            self._send_json(429, {'error': {'status': 429, 'message': 'API rate limit exceeded'}},
+                            {'Retry-After': str(settings.retry_after)})
+        return rate_limited
+
+    def _user(self):
+        auth = self.headers.get('Authorization', '')
+        if not auth.startswith('Bearer token-'):
+            self._send_json(401, {'error': {'status': 401, 'message': 'Invalid access token'}})
+            return None
+        return auth[len('Bearer token-'):]
+
+    def do_POST(self):
+        if self._delay_or_rate_limit():
+            return
+        if urlparse(self.path).path != '/api/token':
+            self._send_json(404, {'error': 'not found'})
+            return
+
+        length = int(self.headers.get('Content-Length') or 0)
+        form = parse_qs(self.rfile.read(length).decode('utf-8'))
+        grant_type = form.get('grant_type', [''])[0]
+        if grant_type == 'authorization_code':
+            userName = form.get('code', [''])[0]
+        elif grant_type == 'refresh_token':
+            userName = form.get('refresh_token', [''])[0].removeprefix('refresh-')
+        else:
+            self._send_json(400, {'error': 'unsupported_grant_type'})
+            return
+
+        if not userName:
+            self._send_json(400, {'error': 'invalid_grant'})
+            return
+
+        self._send_json(200, {
+            'access_token': f'token-{userName}',
+            'token_type': 'Bearer',
+            'expires_in': 3600,
+            'refresh_token': f'refresh-{userName}',
+            'scope': form.get('scope', [''])[0],
+        })
+
+    def do_GET(self):
+        if self._delay_or_rate_limit():
+            return
+        userName = self._user()
+        if userName is None:
+            return
+
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        limit = int(query.get('limit', ['20'])[0])
+        offset = int(query.get('offset', ['0'])[0])
+        time_range = query.get('time_range', ['medium_term'])[0]
+        total = self.server.settings.pages * TOP_PAGE_SIZE
+
+        if url.path == '/v1/me':
+            self._send_json(200, {
+                'id': userName,
+                'display_name': f'Load Test {userName}',
+                'images': [],
+                'followers': {'total': 0},
+                'external_urls': {'spotify': f'https://open.spotify.com/user/{userName}'},
+            })
+        elif url.path in ('/v1/me/top/tracks', '/v1/me/top/artists'):
+            is_tracks = url.path.endswith('tracks')
+            kind, catalog_size, build = ('tracks', CATALOG_TRACKS, _track) if is_tracks else ('artists', CATALOG_ARTISTS, _artist)
+            indexes = _top_indexes(userName, kind, time_range, total, catalog_size)
+            self._send_json(200, {
+                'items': [build(index) for index in indexes[offset:offset + limit]],
+                'total': len(indexes),
+                'limit': limit,
+                'offset': offset,
+            })
+        elif url.path == '/v1/me/player/recently-played':
+            # A new play every ~3 minutes, so repeat visits see fresh plays now and then
+            now = datetime.now(timezone.utc).replace(microsecond=0)
+            newest = now - timedelta(seconds=now.timestamp() % 180)
+            indexes = _top_indexes(userName, 'tracks', 'short_term', 100, CATALOG_TRACKS)
+            items = []
+            for position in range(min(limit, 50)):
+                played_at = newest - timedelta(minutes=3 * position)
+                slot = int(played_at.timestamp() // 180)
+                items.append({
+                    'track': _track(indexes[slot % len(indexes)]),
+                    'played_at': played_at.strftime('%Y-%m-%dT%H:%M:%S.000Z'),
+                })
+            self._send_json(200, {'items': items, 'limit': limit})
+        else:
+            self._send_json(404, {'error': {'status': 404, 'message': 'Service not found'}})
+
+
+def start_fake_spotify(port: int, settings: FakeSpotifySettings):
+    """
+    Start the fake server on a daemon thread.
+
+    Args:
+        port: Port to listen on (127.0.0.1); 0 picks a free one
+        settings: Latency / rate limit / page count knobs
+
+    Returns:
+        ThreadingHTTPServer: The running server; .stats has its counters,
+        .server_address[1] its port, and .shutdown() stops it
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', port), FakeSpotifyHandler)
+    server.daemon_threads = True
+    server.settings = settings
+    server.stats = FakeSpotifyStats()
+    threading.Thread(target=server.serve_forever, name='fake-spotify', daemon=True).start()
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run a local stand-in for the Spotify API.')
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--latency-ms', type=float, default=80, help='Mean delay per request')
+    parser.add_argument('--jitter-ms', type=float, default=40, help='Uniform +/- jitter on the delay')
+    parser.add_argument('--rate-limit', type=float, default=0.0, help='Share of requests answered with 429')
+    parser.add_argument('--retry-after', type=int, default=1, help='Retry-After seconds sent with 429s')
+    parser.add_argument('--pages', type=int, default=2, help='Pages of 50 top tracks/artists per user')
+    args = parser.parse_args()
+
+    server = start_fake_spotify(args.port, FakeSpotifySettings(
+        args.latency_ms, args.jitter_ms, args.rate_limit, args.retry_after, args.pages))
+    print(f"Fake Spotify listening on http://127.0.0.1:{server.server_address[1]}", flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
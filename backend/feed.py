@@ -0,0 +1,361 @@
+"""
+Friend activity feed: what the people you follow listened to and rated.
+
+Activity is fanned out on write: when a user's plays are stored or a rating
+is saved, a FeedItem row is written for each user who has them as a friend.
+Each owner's feed is trimmed to FEED_MAX_ITEMS rows. Reading a feed is then a
+single indexed, keyset-paginated query on (ownerUserName, occurredAt, id).
+
+Users followed by more than FANOUT_FOLLOWER_LIMIT people are not fanned out,
+because one play would turn into thousands of writes. Their activity is merged
+in on read from RecentlyPlayed/RatedAlbum/RatedSong instead. Writers and
+readers both take that set from get_popular_users(), so an actor crossing the
+limit moves from one path to the other at the same moment on both sides.
+
+Fan-out runs on a background thread after the writer has committed, so the
+request that produced the activity does not wait on the feed writes.
+"""
+import heapq
+import threading
+import time
+from datetime import datetime
+from flask import Blueprint, session, request, jsonify
+from db import get_db
+from pagination import encode_cursor, decode_cursor, parse_page_size
+
+feed_bp = Blueprint('feed', __name__)
+
+FEED_MAX_ITEMS = 500
+FANOUT_FOLLOWER_LIMIT = 1000
+
+# How long the set of users above FANOUT_FOLLOWER_LIMIT is reused, in seconds.
+# Every process refreshes it on the same wall-clock boundaries.
+POPULAR_USERS_TTL = 300
+
+_popular_users = {'users': frozenset(), 'expires': 0.0}
+_popular_users_lock = threading.Lock()
+
+FEED_COLUMNS = ['actorUserName', 'activityType', 'itemName', 'artistName', 'spotifyId', 'rating', 'occurredAt']
+
+# Feed pages are ordered by (occurredAt, source, id), newest first. Rows from
+# different tables can share an occurredAt and even an id, so the source is
+# part of the key (and of the cursor) to give every row one fixed position.
+SOURCE_FEED_ITEM = 0
+SOURCE_PLAY = 1
+SOURCE_ALBUM_RATING = 2
+SOURCE_SONG_RATING = 3
+
+
+def _trim_feed(cursor, owner: str) -> None:
+    """Delete an owner's feed rows beyond the newest FEED_MAX_ITEMS."""
+    cursor.execute("""
+        SELECT occurredAt, id
+        FROM FeedItem
+        WHERE ownerUserName = %s
+        ORDER BY occurredAt DESC, id DESC
+        LIMIT 1 OFFSET %s
+    """, (owner, FEED_MAX_ITEMS))
+    boundary = cursor.fetchone()
+    if not boundary:
+        return
+
+    occurred_at, item_id = boundary
+    cursor.execute("""
+        DELETE FROM FeedItem
+        WHERE ownerUserName = %s
+        AND (occurredAt < %s OR (occurredAt = %s AND id <= %s))
+    """, (owner, occurred_at, occurred_at, item_id))
+
+
+def fan_out_activities(cursor, actor: str, activities: list) -> int:
+    """
+    Write an actor's new activity into the feeds of everyone who follows them.
+
+    Args:
+        cursor: Open cursor on the connection that wrote the activity
+        actor: The userName who did something
+        activities: List of activity dictionaries:
+        {
+            'activityType': 'play', 'album_rating', or 'song_rating',
+            'itemName': str,
+            'artistName': str,
+            'spotifyId': str,
+            'rating': Decimal or None,
+            'occurredAt': datetime
+        }
+
+    Returns:
+        int: Number of feeds written to (0 if the actor is merged on read instead)
+    """
+    # Too popular to fan out: readers pick this actor up in _merge_popular_activity()
+    if not activities or actor in get_popular_users():
+        return 0
+
+    cursor.execute("""
+        SELECT userName
+        FROM UserFriends
+        WHERE friendUserName = %s
+    """, (actor,))
+    followers = [row[0] for row in cursor.fetchall()]
+    if not followers:
+        return 0
+
+    cursor.executemany("""
+        INSERT INTO FeedItem (ownerUserName, actorUserName, activityType, itemName, artistName, spotifyId, rating, occurredAt)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+    """, [
+        (owner, actor, activity['activityType'], activity.get('itemName'), activity.get('artistName'),
+         activity.get('spotifyId'), activity.get('rating'), activity['occurredAt'])
+        for owner in followers
+        for activity in activities[-FEED_MAX_ITEMS:]
+    ])
+
+    for owner in followers:
+        _trim_feed(cursor, owner)
+
+    return len(followers)
+
+
+def publish_activities(actor: str, activities: list) -> int:
+    """
+    Fan out activity in its own transaction, for writers that have already committed.
+
+    Args:
+        actor: The userName who did something
+        activities: List of activity dictionaries (see fan_out_activities())
+
+    Returns:
+        int: Number of feeds written to
+    """
+    conn = get_db()
+    cursor = conn.cursor()
+
+    try:
+        feeds = fan_out_activities(cursor, actor, activities)
+        conn.commit()
+        return feeds
+    except Exception as e:
+        conn.rollback()
+        raise e
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def publish_activities_in_background(actor: str, activities: list) -> None:
+    """
+    Fan out activity on a background thread, for request handlers that have already committed.
+
+    Args:
+        actor: The userName who did something
+        activities: List of activity dictionaries (see fan_out_activities())
+    """
+    if not activities:
+        return
+
+    def publish():
+        try:
+            publish_activities(actor, activities)
+        except Exception as e:
+            print(f"Error publishing activity to feeds for {actor}: {e}", flush=True)
+
+    threading.Thread(target=publish, name=f'feed-fanout-{actor}', daemon=True).start()
+
+
+def get_popular_users() -> frozenset:
+    """
+    Users with more than FANOUT_FOLLOWER_LIMIT followers, cached until the next POPULAR_USERS_TTL boundary.
+
+    This is the only place that decides whether an actor is fanned out on write
+    or merged on read, so the two never disagree within a process.
+    """
+    with _popular_users_lock:
+        if time.time() < _popular_users['expires']:
+            return _popular_users['users']
+
+    conn = get_db()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute("""
+            SELECT friendUserName
+            FROM UserFriends
+            GROUP BY friendUserName
+            HAVING COUNT(*) > %s
+        """, (FANOUT_FOLLOWER_LIMIT,))
+        users = frozenset(row[0] for row in cursor.fetchall())
+    finally:
+        cursor.close()
+        conn.close()
+
+    with _popular_users_lock:
+        _popular_users['users'] = users
+        _popular_users['expires'] = (time.time() // POPULAR_USERS_TTL + 1) * POPULAR_USERS_TTL
+    return users
+
+
+def _older_than(source: int, time_column: str, id_column: str, before) -> tuple:
+    """
+    Condition selecting one source's rows that sort after a cursor, newest first.
+
+    Args:
+        source: SOURCE_* constant of the table being read
+        time_column: Column holding occurredAt for that table
+        id_column: Column holding the row id for that table
+        before: (occurredAt, source, id) of the last item on the previous page, or None
+
+    Returns:
+        tuple: (SQL fragment starting with AND, params)
+    """
+    if not before:
+        return "", ()
+
+    occurred_at, before_source, before_id = before
+    if source < before_source:
+        return f"AND {time_column} <= %s", (occurred_at,)
+    if source > before_source:
+        return f"AND {time_column} < %s", (occurred_at,)
+    return (f"AND ({time_column} < %s OR ({time_column} = %s AND {id_column} < %s))",
+            (occurred_at, occurred_at, before_id))
+
+
+def fetch_feed_items(owner: str, limit: int, before=None) -> list:
+    """
+    Fetch one page of an owner's materialized feed, newest first.
+
+    Args:
+        owner: The userName whose feed to read
+        limit: Maximum number of items
+        before: Optional (occurredAt, source, id) key of the last item on the previous page
+
+    Returns:
+        List of feed item dictionaries (FEED_COLUMNS plus 'source' and 'id')
+    """
+    conn = get_db()
+    cursor = conn.cursor(dictionary=True)
+
+    try:
+        condition, params = _older_than(SOURCE_FEED_ITEM, 'occurredAt', 'id', before)
+        cursor.execute(f"""
+            SELECT id, actorUserName, activityType, itemName, artistName, spotifyId, rating, occurredAt
+            FROM FeedItem
+            WHERE ownerUserName = %s
+            {condition}
+            ORDER BY occurredAt DESC, id DESC
+            LIMIT %s
+        """, (owner, *params, limit))
+        items = cursor.fetchall()
+        for item in items:
+            item['source'] = SOURCE_FEED_ITEM
+        return items
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def _merge_popular_activity(owner: str, limit: int, before=None) -> list:
+    """
+    Read recent activity of popular friends straight from the source tables.
+
+    Args:
+        owner: The userName whose feed is being read
+        limit: Maximum number of items per source
+        before: Optional (occurredAt, source, id) cursor; only items after it are returned
+
+    Returns:
+        List of feed item dictionaries (FEED_COLUMNS plus 'source' and 'id'), newest first
+    """
+    popular = get_popular_users()
+    if not popular:
+        return []
+
+    conn = get_db()
+    cursor = conn.cursor(dictionary=True)
+
+    try:
+        cursor.execute("""
+            SELECT friendUserName
+            FROM UserFriends
+            WHERE userName = %s
+        """, (owner,))
+        friends = [row['friendUserName'] for row in cursor.fetchall() if row['friendUserName'] in popular]
+        if not friends:
+            return []
+
+        placeholders = ', '.join(['%s'] * len(friends))
+        sources = [
+            ("""SELECT id, userName AS actorUserName, 'play' AS activityType, songName AS itemName, artistName,
+                       spotifyTrackId AS spotifyId, NULL AS rating, playedAt AS occurredAt
+                FROM RecentlyPlayed""", SOURCE_PLAY, 'playedAt', 'id'),
+            ("""SELECT uniqueID AS id, userName AS actorUserName, 'album_rating' AS activityType, albumName AS itemName,
+                       artistName, spotifyAlbumId AS spotifyId, rating, updatedAt AS occurredAt
+                FROM RatedAlbum""", SOURCE_ALBUM_RATING, 'updatedAt', 'uniqueID'),
+            ("""SELECT uniqueID AS id, userName AS actorUserName, 'song_rating' AS activityType, songName AS itemName,
+                       artistName, spotifyTrackId AS spotifyId, rating, updatedAt AS occurredAt
+                FROM RatedSong""", SOURCE_SONG_RATING, 'updatedAt', 'uniqueID'),
+        ]
+
+        items = []
+        for query, source, time_column, id_column in sources:
+            condition, params = _older_than(source, time_column, id_column, before)
+            cursor.execute(f"""
+                {query}
+                WHERE userName IN ({placeholders})
+                {condition}
+                ORDER BY {time_column} DESC, {id_column} DESC
+                LIMIT %s
+            """, (*friends, *params, limit))
+            for row in cursor.fetchall():
+                row['source'] = source
+                items.append(row)
+
+        items.sort(key=feed_sort_key, reverse=True)
+        return items[:limit]
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def feed_sort_key(item: dict) -> tuple:
+    """The (occurredAt, source, id) key feed pages are ordered and paginated by."""
+    return item['occurredAt'], item['source'], item['id']
+
+
+@feed_bp.route('/api/feed')
+def friend_feed():
+    """
+    Recent plays and ratings from the logged in user's friends, newest first.
+
+    Query params:
+        limit: Page size (default 20, max 100)
+        cursor: next_cursor from the previous page
+    """
+    userName = session.get('userName')
+    if not userName:
+        return jsonify({'error': 'Not authenticated'}), 401
+
+    limit = parse_page_size(request.args.get('limit'))
+    try:
+        before = decode_cursor(request.args.get('cursor'), datetime, int, int)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    materialized = fetch_feed_items(userName, limit + 1, before)
+    merged = _merge_popular_activity(userName, limit + 1, before)
+
+    # Both lists are newest first; interleave them and keep one page
+    items = list(heapq.merge(materialized, merged, key=feed_sort_key, reverse=True))
+
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_cursor(*feed_sort_key(items[-1]))
+
+    feed = []
+    for item in items:
+        entry = {column: item[column] for column in FEED_COLUMNS}
+        entry['occurredAt'] = entry['occurredAt'].isoformat()
+        entry['rating'] = float(entry['rating']) if entry['rating'] is not None else None
+        feed.append(entry)
+
+    return jsonify({'items': feed, 'next_cursor': next_cursor})
@@ -0,0 +1,342 @@
+"""
+Read API for historical Stats snapshots.
+
+Every visit to /stats/<timeframe> can write a new Stats row plus its
+TopSong/TopAlbum/TopArtist rows. These routes let a user browse those
+snapshots. Both listings use keyset pagination backed by indexes:
+snapshots on (userName, timeframe, createdAt) and snapshot items on
+(statsID, rank). Rank trends for a single item are read from the
+RankHistory series that db_insert maintains as snapshots are written.
+Snapshots stored before RankHistory existed are backfilled with
+    python history.py --rebuild-rank-history
+"""
+import sys
+from datetime import datetime
+from flask import Blueprint, session, request, jsonify
+from db import get_db
+from pagination import encode_cursor, decode_cursor, parse_page_size
+
+history_bp = Blueprint('history', __name__)
+
+VALID_TIMEFRAMES = ['short_term', 'medium_term', 'long_term']
+
+# Column lists for each kind of snapshot item, keyed by the URL segment
+SNAPSHOT_ITEM_TABLES = {
+    'songs': ('TopSong', ['songName', 'artistName', 'spotifyTrackId', 'rank', 'playCount', 'imageUrl']),
+    'albums': ('TopAlbum', ['albumName', 'artistName', 'spotifyAlbumId', 'rank', 'playCount', 'imageUrl']),
+    'artists': ('TopArtist', ['artistName', 'spotifyArtistId', 'rank', 'playCount', 'imageUrl']),
+}
+
+# RankHistory.itemType for each URL segment
+RANK_HISTORY_ITEM_TYPES = {
+    'songs': 'song',
+    'albums': 'album',
+    'artists': 'artist',
+}
+
+# Item table and ID column for each RankHistory.itemType
+RANK_HISTORY_SOURCES = {
+    'song': ('TopSong', 'spotifyTrackId'),
+    'album': ('TopAlbum', 'spotifyAlbumId'),
+    'artist': ('TopArtist', 'spotifyArtistId'),
+}
+
+
+def fetch_stats_snapshots(userName: str, timeframe: str, limit: int, before=None) -> list:
+    """
+    Fetch one page of a user's Stats snapshots for a timeframe, newest first.
+
+    Args:
+        userName: The user's Spotify ID (userName)
+        timeframe: 'short_term', 'medium_term', or 'long_term'
+        limit: Maximum number of snapshots to return
+        before: Optional (createdAt, uniqueID) key of the last snapshot on the previous page
+
+    Returns:
+        List of snapshot dictionaries:
+        {
+            'statsId': int,
+            'timeframe': str,
+            'totalMinutes': int,
+            'createdAt': datetime
+        }
+    """
+    conn = get_db()
+    cursor = conn.cursor(dictionary=True)
+
+    try:
+        if before:
+            created_at, stats_id = before
+            cursor.execute("""
+                SELECT uniqueID AS statsId, timeframe, totalMinutes, createdAt
+                FROM Stats
+                WHERE userName = %s
+                AND timeframe = %s
+                AND (createdAt < %s OR (createdAt = %s AND uniqueID < %s))
+                ORDER BY createdAt DESC, uniqueID DESC
+                LIMIT %s
+            """, (userName, timeframe, created_at, created_at, stats_id, limit))
+        else:
+            cursor.execute("""
+                SELECT uniqueID AS statsId, timeframe, totalMinutes, createdAt
+                FROM Stats
+                WHERE userName = %s
+                AND timeframe = %s
+                ORDER BY createdAt DESC, uniqueID DESC
+                LIMIT %s
+            """, (userName, timeframe, limit))
+
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def get_stats_snapshot(stats_id: int):
+    """
+    Look up a single Stats snapshot by its ID.
+
+    Args:
+        stats_id: The uniqueID of the Stats record
+
+    Returns:
+        dict: Snapshot with 'statsId', 'userName', 'timeframe', 'totalMinutes', 'createdAt'
+        None: If the snapshot does not exist
+    """
+    conn = get_db()
+    cursor = conn.cursor(dictionary=True)
+
+    try:
+        cursor.execute("""
+            SELECT uniqueID AS statsId, userName, timeframe, totalMinutes, createdAt
+            FROM Stats
+            WHERE uniqueID = %s
+        """, (stats_id,))
+        return cursor.fetchone()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def fetch_snapshot_items(stats_id: int, kind: str, limit: int, after_rank: int = 0) -> list:
+    """
+    Fetch one page of TopSong/TopAlbum/TopArtist rows for a snapshot, ordered by rank.
+
+    Args:
+        stats_id: The statsID of the snapshot
+        kind: 'songs', 'albums', or 'artists'
+        limit: Maximum number of rows to return
+        after_rank: Only return rows ranked below this one (0 for the first page)
+
+    Returns:
+        List of item dictionaries with the same keys the fetch_all_top_* functions produce
+    """
+    table, columns = SNAPSHOT_ITEM_TABLES[kind]
+    column_sql = ', '.join(f'`{column}`' for column in columns)
+
+    conn = get_db()
+    cursor = conn.cursor(dictionary=True)
+
+    try:
+        cursor.execute(f"""
+            SELECT {column_sql}
+            FROM {table}
+            WHERE statsID = %s
+            AND `rank` > %s
+            ORDER BY `rank`
+            LIMIT %s
+        """, (stats_id, after_rank, limit))
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def fetch_rank_history(userName: str, timeframe: str, item_type: str, spotify_id: str) -> list:
+    """
+    Fetch the rank series for one item, oldest point first.
+
+    Args:
+        userName: The user's Spotify ID (userName)
+        timeframe: 'short_term', 'medium_term', or 'long_term'
+        item_type: 'song', 'album', or 'artist'
+        spotify_id: Spotify ID of the track, album, or artist
+
+    Returns:
+        List of points: {'recordedAt': datetime, 'statsId': int, 'rank': int}
+    """
+    conn = get_db()
+    cursor = conn.cursor(dictionary=True)
+
+    try:
+        cursor.execute("""
+            SELECT recordedAt, statsID AS statsId, `rank`
+            FROM RankHistory
+            WHERE userName = %s
+            AND timeframe = %s
+            AND itemType = %s
+            AND spotifyId = %s
+            ORDER BY recordedAt, statsID
+        """, (userName, timeframe, item_type, spotify_id))
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def rebuild_rank_history() -> None:
+    """
+    Backfill RankHistory from every stored TopSong/TopAlbum/TopArtist snapshot.
+
+    New snapshots append their points as they are written, so this only needs to
+    run once for snapshots that existed before RankHistory did. Points that are
+    already stored are left as they are, so it is safe to run again.
+    """
+    conn = get_db()
+    cursor = conn.cursor()
+
+    try:
+        for item_type, (table, id_column) in RANK_HISTORY_SOURCES.items():
+            cursor.execute(f"""
+                INSERT IGNORE INTO RankHistory (userName, timeframe, itemType, spotifyId, recordedAt, statsID, `rank`)
+                SELECT s.userName, s.timeframe, %s, t.{id_column}, s.createdAt, s.uniqueID, MIN(t.`rank`)
+                FROM {table} t
+                JOIN Stats s ON s.uniqueID = t.statsID
+                WHERE t.{id_column} IS NOT NULL
+                AND t.`rank` IS NOT NULL
+                GROUP BY s.uniqueID, t.{id_column}
+            """, (item_type,))
+
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        raise e
+    finally:
+        cursor.close()
+        conn.close()
+
+
+@history_bp.route('/api/history/stats')
+def list_stats_snapshots():
+    """
+    List the logged in user's Stats snapshots for a timeframe, newest first.
+
+    Query params:
+        timeframe: 'short_term' (default), 'medium_term', or 'long_term'
+        limit: Page size (default 20, max 100)
+        cursor: next_cursor from the previous page
+    """
+    userName = session.get('userName')
+    if not userName:
+        return jsonify({'error': 'Not authenticated'}), 401
+
+    timeframe = request.args.get('timeframe', 'short_term')
+    if timeframe not in VALID_TIMEFRAMES:
+        return jsonify({'error': f'Invalid timeframe: {timeframe}'}), 400
+
+    limit = parse_page_size(request.args.get('limit'))
+    try:
+        before = decode_cursor(request.args.get('cursor'), datetime, int)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Fetch one extra row to know whether another page exists
+    snapshots = fetch_stats_snapshots(userName, timeframe, limit + 1, before)
+    next_cursor = None
+    if len(snapshots) > limit:
+        snapshots = snapshots[:limit]
+        last = snapshots[-1]
+        next_cursor = encode_cursor(last['createdAt'], last['statsId'])
+
+    for snapshot in snapshots:
+        snapshot['createdAt'] = snapshot['createdAt'].isoformat()
+
+    return jsonify({'snapshots': snapshots, 'next_cursor': next_cursor})
+
+
+@history_bp.route('/api/history/stats/<int:stats_id>/<kind>')
+def list_snapshot_items(stats_id, kind):
+    """
+    List the ranked songs, albums, or artists stored in one of the user's snapshots.
+
+    Args:
+        stats_id: The statsID of the snapshot
+        kind: 'songs', 'albums', or 'artists'
+
+    Query params:
+        limit: Page size (default 20, max 100)
+        cursor: next_cursor from the previous page
+    """
+    userName = session.get('userName')
+    if not userName:
+        return jsonify({'error': 'Not authenticated'}), 401
+
+    if kind not in SNAPSHOT_ITEM_TABLES:
+        return jsonify({'error': f'Invalid item kind: {kind}'}), 400
+
+    snapshot = get_stats_snapshot(stats_id)
+    if not snapshot or snapshot['userName'] != userName:
+        return jsonify({'error': 'Snapshot not found'}), 404
+
+    limit = parse_page_size(request.args.get('limit'))
+    try:
+        after = decode_cursor(request.args.get('cursor'), int)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    after_rank = after[0] if after else 0
+
+    items = fetch_snapshot_items(stats_id, kind, limit + 1, after_rank)
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_cursor(items[-1]['rank'])
+
+    return jsonify({
+        'statsId': stats_id,
+        'timeframe': snapshot['timeframe'],
+        'createdAt': snapshot['createdAt'].isoformat(),
+        'items': items,
+        'next_cursor': next_cursor
+    })
+
+
+@history_bp.route('/api/history/trend/<kind>/<spotify_id>')
+def rank_trend(kind, spotify_id):
+    """
+    Show how a song, album, or artist has moved in the user's rankings over time.
+
+    Args:
+        kind: 'songs', 'albums', or 'artists'
+        spotify_id: Spotify ID of the item
+
+    Query params:
+        timeframe: 'short_term' (default), 'medium_term', or 'long_term'
+    """
+    userName = session.get('userName')
+    if not userName:
+        return jsonify({'error': 'Not authenticated'}), 401
+
+    if kind not in RANK_HISTORY_ITEM_TYPES:
+        return jsonify({'error': f'Invalid item kind: {kind}'}), 400
+
+    timeframe = request.args.get('timeframe', 'short_term')
+    if timeframe not in VALID_TIMEFRAMES:
+        return jsonify({'error': f'Invalid timeframe: {timeframe}'}), 400
+
+    points = fetch_rank_history(userName, timeframe, RANK_HISTORY_ITEM_TYPES[kind], spotify_id)
+    for point in points:
+        point['recordedAt'] = point['recordedAt'].isoformat()
+
+    return jsonify({
+        'spotifyId': spotify_id,
+        'timeframe': timeframe,
+        'points': points
+    })
+
+
+if __name__ == '__main__':
+    if '--rebuild-rank-history' in sys.argv:
+        rebuild_rank_history()
+        print("Rank history rebuilt", flush=True)
+    else:
+        print("Usage: python history.py --rebuild-rank-history", flush=True)
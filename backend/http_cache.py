@@ -0,0 +1,37 @@
+"""
+Conditional GET helpers for pages built from stored data.
+
+A page tagged with an ETag that only changes when its underlying data does
+(a snapshot ID, the newest stored play) can be revalidated with a cheap
+database lookup: if the browser already holds that version, a bodiless 304
+is sent instead of fetching, aggregating and rendering the page again.
+"""
+from flask import request, make_response
+
+
+def client_has_etag(etag: str) -> bool:
+    """Whether the request's If-None-Match already names this ETag."""
+    return request.if_none_match.contains_weak(etag)
+
+
+def with_etag(response, etag: str):
+    """
+    Tag a response so browsers revalidate it on every visit.
+
+    Pages depend on the logged in user, so they are private to the browser
+    and vary on the session cookie.
+
+    Args:
+        response: Anything a view may return (HTML string, Response, ...)
+        etag: Opaque version string for the page (unquoted)
+    """
+    response = make_response(response)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Cookie')
+    return response
+
+
+def not_modified(etag: str):
+    """A 304 Not Modified response for a page the client already has."""
+    return with_etag(make_response('', 304), etag)
@@ -0,0 +1,184 @@
+"""
+Platform-wide charts of the most common top songs, albums and artists.
+
+Each user's latest snapshot per timeframe contributes a rank-weighted score
+to every item in its top LEADERBOARD_DEPTH ranks. GlobalLeaderboard holds the
+running totals; when a user's snapshot is replaced, the old snapshot's scores
+are subtracted and the new one's added in the same transaction, so a chart is
+just the top-N of the (timeframe, itemType, score) index.
+"""
+from flask import Blueprint, request, jsonify
+from db import get_db
+from history import VALID_TIMEFRAMES
+from pagination import parse_page_size
+
+leaderboards_bp = Blueprint('leaderboards', __name__)
+
+# Ranks of a snapshot that count towards the leaderboards
+LEADERBOARD_DEPTH = 50
+
+# Item table and ID column for each GlobalLeaderboard.itemType
+LEADERBOARD_SOURCES = {
+    'song': ('TopSong', 'spotifyTrackId'),
+    'album': ('TopAlbum', 'spotifyAlbumId'),
+    'artist': ('TopArtist', 'spotifyArtistId'),
+}
+
+# GlobalLeaderboard.itemType for each URL segment
+LEADERBOARD_KINDS = {
+    'songs': 'song',
+    'albums': 'album',
+    'artists': 'artist',
+}
+
+
+def _snapshot_scores(cursor, stats_id, table: str, id_column: str) -> dict:
+    """Map each Spotify ID in a snapshot's top ranks to its score (rank 1 scores LEADERBOARD_DEPTH)."""
+    if stats_id is None:
+        return {}
+
+    cursor.execute(f"""
+        SELECT {id_column}, MIN(`rank`)
+        FROM {table}
+        WHERE statsID = %s
+        AND `rank` <= %s
+        AND {id_column} IS NOT NULL
+        GROUP BY {id_column}
+    """, (stats_id, LEADERBOARD_DEPTH))
+    return {spotify_id: LEADERBOARD_DEPTH + 1 - rank for spotify_id, rank in cursor.fetchall()}
+
+
+def leaderboard_deltas(old_scores: dict, new_scores: dict) -> list:
+    """
+    Score and user count changes for a user's contribution going from old_scores to new_scores.
+
+    Returns:
+        list: (spotify_id, score_delta, user_delta) for every item that changed,
+              sorted by Spotify ID so concurrent updates lock shared rows in the same order
+    """
+    deltas = []
+    for spotify_id in sorted(old_scores.keys() | new_scores.keys()):
+        score_delta = new_scores.get(spotify_id, 0) - old_scores.get(spotify_id, 0)
+        user_delta = (spotify_id in new_scores) - (spotify_id in old_scores)
+        if score_delta or user_delta:
+            deltas.append((spotify_id, score_delta, user_delta))
+    return deltas
+
+
+def update_leaderboards(cursor, userName: str, timeframe: str, stats_id: int) -> None:
+    """
+    Swap a user's contribution to the timeframe's leaderboards to a new snapshot.
+
+    Args:
+        cursor: Open cursor on the connection that wrote the snapshot
+        userName: The userName (Spotify ID)
+        timeframe: 'short_term', 'medium_term', or 'long_term'
+        stats_id: The statsID of the new snapshot
+    """
+    # Lock the user's contribution so concurrent snapshots apply one after another
+    cursor.execute("""
+        SELECT statsID
+        FROM LeaderboardContribution
+        WHERE userName = %s
+        AND timeframe = %s
+        FOR UPDATE
+    """, (userName, timeframe))
+    row = cursor.fetchone()
+    old_stats_id = row[0] if row else None
+    if old_stats_id == stats_id:
+        return
+
+    for item_type, (table, id_column) in LEADERBOARD_SOURCES.items():
+        old_scores = _snapshot_scores(cursor, old_stats_id, table, id_column)
+        new_scores = _snapshot_scores(cursor, stats_id, table, id_column)
+
+        deltas = [(timeframe, item_type, spotify_id, score_delta, user_delta)
+                  for spotify_id, score_delta, user_delta in leaderboard_deltas(old_scores, new_scores)]
+        if deltas:
+            cursor.executemany("""
+                INSERT INTO GlobalLeaderboard (timeframe, itemType, spotifyId, score, userCount)
+                VALUES (%s, %s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE
+                    score = score + VALUES(score),
+                    userCount = userCount + VALUES(userCount)
+            """, deltas)
+
+        dropped = sorted(old_scores.keys() - new_scores.keys())
+        if dropped:
+            cursor.executemany("""
+                DELETE FROM GlobalLeaderboard
+                WHERE timeframe = %s
+                AND itemType = %s
+                AND spotifyId = %s
+                AND userCount <= 0
+            """, [(timeframe, item_type, spotify_id) for spotify_id in dropped])
+
+    cursor.execute("""
+        INSERT INTO LeaderboardContribution (userName, timeframe, statsID)
+        VALUES (%s, %s, %s)
+        ON DUPLICATE KEY UPDATE statsID = VALUES(statsID)
+    """, (userName, timeframe, stats_id))
+
+
+def fetch_leaderboard(timeframe: str, item_type: str, limit: int = 50) -> list:
+    """
+    Fetch the top of a global leaderboard.
+
+    Args:
+        timeframe: 'short_term', 'medium_term', or 'long_term'
+        item_type: 'song', 'album', or 'artist'
+        limit: Number of entries to return
+
+    Returns:
+        List of dictionaries, highest score first:
+        {
+            'spotifyId': str,
+            'name': str or None,
+            'artistName': str or None,
+            'imageUrl': str or None,
+            'score': int,
+            'userCount': int
+        }
+    """
+    conn = get_db()
+    cursor = conn.cursor(dictionary=True)
+
+    try:
+        cursor.execute("""
+            SELECT l.spotifyId, s.name, s.artistName, s.imageUrl, l.score, l.userCount
+            FROM GlobalLeaderboard l
+            LEFT JOIN SearchCatalog s ON s.itemType = l.itemType AND s.spotifyId = l.spotifyId
+            WHERE l.timeframe = %s
+            AND l.itemType = %s
+            ORDER BY l.score DESC
+            LIMIT %s
+        """, (timeframe, item_type, limit))
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+@leaderboards_bp.route('/api/leaderboards/<timeframe>/<kind>')
+def leaderboard(timeframe, kind):
+    """
+    Most common top songs, albums or artists across all users.
+
+    Args:
+        timeframe: 'short_term', 'medium_term', or 'long_term'
+        kind: 'songs', 'albums', or 'artists'
+
+    Query params:
+        limit: Number of entries (default 50, max 100)
+    """
+    if timeframe not in VALID_TIMEFRAMES:
+        return jsonify({'error': f'Invalid timeframe: {timeframe}'}), 400
+    if kind not in LEADERBOARD_KINDS:
+        return jsonify({'error': f'Invalid item kind: {kind}'}), 400
+
+    limit = parse_page_size(request.args.get('limit'), default=50)
+    return jsonify({
+        'timeframe': timeframe,
+        'kind': kind,
+        'entries': fetch_leaderboard(timeframe, LEADERBOARD_KINDS[kind], limit)
+    })
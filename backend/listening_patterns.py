@@ -0,0 +1,268 @@
+"""
+Listening-pattern analytics over a user's stored RecentlyPlayed history.
+
+Plays are loaded into NumPy arrays and bucketed in bulk: an hour-of-day x
+weekday heatmap, listening sessions split on gaps, and day streaks. One
+query can load many users at once for batch jobs. Results are cached per user
+and reused until the user's RecentlyPlayedVersion changes (it is bumped on every
+insert and retention drop) or the viewer's local day rolls over, which can end
+a streak without any new plays. A dashboard reload costs one primary key lookup
+instead of a recompute.
+
+Only raw plays are included; months already rolled up by retention.py are not.
+"""
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from flask import Blueprint, session, request, jsonify
+from db import get_db
+
+listening_patterns_bp = Blueprint('listening_patterns', __name__)
+
+# A gap longer than this between plays starts a new listening session
+SESSION_GAP_SECONDS = 30 * 60
+
+SECONDS_PER_DAY = 86400
+WEEKDAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+LOAD_CHUNK_SIZE = 10000
+PATTERN_CACHE_SIZE = 1024
+
+_pattern_cache = OrderedDict()
+_pattern_cache_lock = threading.Lock()
+
+
+def load_play_arrays(userNames: list) -> dict:
+    """
+    Load the stored plays of one or more users into NumPy arrays.
+
+    Args:
+        userNames: List of userNames to load
+
+    Returns:
+        dict: userName -> (played_at, ms_played), both int64 arrays sorted by
+              played_at (unix seconds); users with no plays are omitted
+    """
+    if not userNames:
+        return {}
+
+    placeholders = ', '.join(['%s'] * len(userNames))
+    user_codes = {userName: code for code, userName in enumerate(userNames)}
+    codes, played_at, ms_played = [], [], []
+
+    conn = get_db()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute(f"""
+            SELECT userName, CAST(UNIX_TIMESTAMP(playedAt) AS SIGNED), COALESCE(msPlayed, 0)
+            FROM RecentlyPlayed
+            WHERE userName IN ({placeholders})
+            ORDER BY userName, playedAt
+        """, tuple(userNames))
+
+        while True:
+            rows = cursor.fetchmany(LOAD_CHUNK_SIZE)
+            if not rows:
+                break
+            names, timestamps, durations = zip(*rows)
+            codes.append(np.fromiter((user_codes[name] for name in names), dtype=np.int32, count=len(names)))
+            played_at.append(np.array(timestamps, dtype=np.int64))
+            ms_played.append(np.array(durations, dtype=np.int64))
+    finally:
+        cursor.close()
+        conn.close()
+
+    if not codes:
+        return {}
+
+    codes = np.concatenate(codes)
+    played_at = np.concatenate(played_at)
+    ms_played = np.concatenate(ms_played)
+
+    # Rows are ordered by user, so each user is one contiguous slice
+    starts = np.flatnonzero(np.r_[True, np.diff(codes) != 0])
+    ends = np.r_[starts[1:], len(codes)]
+    return {
+        userNames[codes[start]]: (played_at[start:end], ms_played[start:end])
+        for start, end in zip(starts, ends)
+    }
+
+
+def compute_listening_patterns(played_at: np.ndarray, ms_played: np.ndarray, tz_offset_minutes: int = 0) -> dict:
+    """
+    Compute heatmap, session and streak statistics from play arrays.
+
+    Args:
+        played_at: Sorted unix timestamps (seconds) of each play
+        ms_played: Milliseconds listened for each play
+        tz_offset_minutes: Viewer's offset from UTC (e.g. -300 for UTC-5) used
+                           to place plays on local hours and days
+
+    Returns:
+        Dictionary of listening statistics:
+        {
+            'total_plays': int,
+            'total_minutes': float,
+            'heatmap_plays': 7x24 list (weekday rows starting Monday, hour columns),
+            'heatmap_minutes': 7x24 list,
+            'sessions': {'count', 'avg_minutes', 'longest_minutes', 'avg_plays'},
+            'streaks': {'longest_days', 'current_days', 'active_days'}
+        }
+    """
+    result = {
+        'total_plays': int(len(played_at)),
+        'total_minutes': round(float(ms_played.sum()) / 60000, 2),
+        'heatmap_plays': np.zeros((7, 24), dtype=np.int64).tolist(),
+        'heatmap_minutes': np.zeros((7, 24)).tolist(),
+        'sessions': {'count': 0, 'avg_minutes': 0, 'longest_minutes': 0, 'avg_plays': 0},
+        'streaks': {'longest_days': 0, 'current_days': 0, 'active_days': 0},
+    }
+    if len(played_at) == 0:
+        return result
+
+    minutes = ms_played / 60000
+    local = played_at + tz_offset_minutes * 60
+    days = local // SECONDS_PER_DAY
+
+    # ========== HEATMAP ==========
+    # 1970-01-01 was a Thursday, so shift by 3 to make Monday weekday 0
+    weekday = (days + 3) % 7
+    hour = (local % SECONDS_PER_DAY) // 3600
+    bucket = weekday * 24 + hour
+    result['heatmap_plays'] = np.bincount(bucket, minlength=168).reshape(7, 24).tolist()
+    result['heatmap_minutes'] = np.round(np.bincount(bucket, weights=minutes, minlength=168), 2).reshape(7, 24).tolist()
+
+    # ========== SESSIONS ==========
+    # playedAt marks the end of a play, so a session starts when its first track began
+    new_session = np.r_[True, np.diff(played_at) > SESSION_GAP_SECONDS]
+    session_starts = np.flatnonzero(new_session)
+    session_ends = np.r_[session_starts[1:] - 1, len(played_at) - 1]
+    session_minutes = (played_at[session_ends] - played_at[session_starts]) / 60 + minutes[session_starts]
+    session_plays = session_ends - session_starts + 1
+    result['sessions'] = {
+        'count': int(len(session_starts)),
+        'avg_minutes': round(float(session_minutes.mean()), 2),
+        'longest_minutes': round(float(session_minutes.max()), 2),
+        'avg_plays': round(float(session_plays.mean()), 2),
+    }
+
+    # ========== STREAKS ==========
+    active_days = np.unique(days)
+    breaks = np.flatnonzero(np.diff(active_days) != 1)
+    run_starts = np.r_[0, breaks + 1]
+    run_ends = np.r_[breaks, len(active_days) - 1]
+    run_lengths = run_ends - run_starts + 1
+
+    today = (int(time.time()) + tz_offset_minutes * 60) // SECONDS_PER_DAY
+    # The streak is still current if the user listened today or yesterday
+    current = int(run_lengths[-1]) if active_days[-1] >= today - 1 else 0
+    result['streaks'] = {
+        'longest_days': int(run_lengths.max()),
+        'current_days': current,
+        'active_days': int(len(active_days)),
+    }
+
+    return result
+
+
+def _get_play_versions(userNames: list) -> dict:
+    """
+    Cheap cache validator per user: their RecentlyPlayedVersion (0 if they have never had plays).
+    """
+    placeholders = ', '.join(['%s'] * len(userNames))
+
+    conn = get_db()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute(f"""
+            SELECT userName, version
+            FROM RecentlyPlayedVersion
+            WHERE userName IN ({placeholders})
+        """, tuple(userNames))
+        versions = dict(cursor.fetchall())
+    finally:
+        cursor.close()
+        conn.close()
+
+    return {userName: versions.get(userName, 0) for userName in userNames}
+
+
+def get_listening_patterns_batch(userNames: list, tz_offset_minutes: int = 0) -> dict:
+    """
+    Listening patterns for many users, recomputing only those with new plays.
+
+    Args:
+        userNames: List of userNames
+        tz_offset_minutes: Viewer's offset from UTC in minutes
+
+    Returns:
+        dict: userName -> result of compute_listening_patterns()
+    """
+    if not userNames:
+        return {}
+
+    versions = _get_play_versions(userNames)
+    # The current streak depends on today's date as well as the plays
+    today = (int(time.time()) + tz_offset_minutes * 60) // SECONDS_PER_DAY
+    results = {}
+    stale = []
+
+    with _pattern_cache_lock:
+        for userName in userNames:
+            cached = _pattern_cache.get((userName, tz_offset_minutes))
+            if cached and cached[0] == (versions[userName], today):
+                _pattern_cache.move_to_end((userName, tz_offset_minutes))
+                results[userName] = cached[1]
+            else:
+                stale.append(userName)
+
+    if stale:
+        arrays = load_play_arrays(stale)
+        empty = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64))
+        computed = {
+            userName: compute_listening_patterns(*arrays.get(userName, empty), tz_offset_minutes)
+            for userName in stale
+        }
+
+        with _pattern_cache_lock:
+            for userName, patterns in computed.items():
+                _pattern_cache[(userName, tz_offset_minutes)] = ((versions[userName], today), patterns)
+                _pattern_cache.move_to_end((userName, tz_offset_minutes))
+            while len(_pattern_cache) > PATTERN_CACHE_SIZE:
+                _pattern_cache.popitem(last=False)
+
+        results.update(computed)
+
+    return results
+
+
+def get_listening_patterns(userName: str, tz_offset_minutes: int = 0) -> dict:
+    """Listening patterns for a single user (see get_listening_patterns_batch())."""
+    return get_listening_patterns_batch([userName], tz_offset_minutes)[userName]
+
+
+@listening_patterns_bp.route('/api/listening-patterns')
+def listening_patterns():
+    """
+    Hour-of-day x weekday heatmap, sessions and streaks for the logged in user.
+
+    Query params:
+        tz_offset: Minutes east of UTC to bucket hours and days in (default 0)
+    """
+    userName = session.get('userName')
+    if not userName:
+        return jsonify({'error': 'Not authenticated'}), 401
+
+    try:
+        tz_offset_minutes = int(request.args.get('tz_offset', 0))
+    except ValueError:
+        return jsonify({'error': 'tz_offset must be an integer number of minutes'}), 400
+    if not -14 * 60 <= tz_offset_minutes <= 14 * 60:
+        return jsonify({'error': 'tz_offset out of range'}), 400
+
+    patterns = get_listening_patterns(userName, tz_offset_minutes)
+    patterns['weekdays'] = WEEKDAY_NAMES
+    return jsonify(patterns)
@@ -0,0 +1,309 @@
+"""
+End-to-end load test: the real app against a fake Spotify and a local MySQL.
+
+Starts fake_spotify.py in-process, launches app.py as a subprocess pointed at
+it (SPOTIFY_API_BASE_URL / SPOTIFY_ACCOUNTS_BASE_URL) and at the given MySQL
+database, then runs each scenario with many simulated users, each with its own
+cookie session:
+
+    login            GET /callback?code=<user> (token exchange + profile + user upsert)
+    stats            GET /stats/<timeframe>, cycling through the timeframes
+    recently-played  GET /stats/recently-played
+
+Users keep the ETags they are sent and revalidate with If-None-Match like a
+browser would, so repeat visits exercise the 304 path (--no-revalidate turns
+that off). Per scenario it reports throughput, p50/p95/p99 latency, error rate,
+status codes, the app process's peak RSS and CPU, and how many calls reached
+the fake Spotify (and how many it rate limited).
+
+The database must already exist; --load-schema applies schema.sql to it first.
+Use a throwaway database, as the test writes users, snapshots and plays.
+
+Usage:
+    python loadtest.py --users 200 --concurrency 50 --rounds 3 --mysql-database spotify_loadtest --load-schema
+"""
+import argparse
+import json
+import math
+import os
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import mysql.connector
+import requests
+from config import Config
+from fake_spotify import start_fake_spotify, FakeSpotifySettings
+
+SCENARIOS = ['login', 'stats', 'recently-played']
+STATS_TIMEFRAMES = ['short_term', 'medium_term', 'long_term']
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class ProcessMonitor:
+    """Samples a process's RSS and CPU time from /proc while a scenario runs."""
+
+    def __init__(self, pid: int, interval: float = 0.25):
+        self.pid = pid
+        self.interval = interval
+        self.peak_rss_kb = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._start_cpu = 0.0
+        self._start_time = 0.0
+
+    def _cpu_seconds(self) -> float:
+        with open(f'/proc/{self.pid}/stat') as f:
+            # Fields after the ")" of the command name; utime and stime are 14 and 15 overall
+            fields = f.read().rsplit(')', 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+
+    def _rss_kb(self) -> int:
+        with open(f'/proc/{self.pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+        return 0
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.peak_rss_kb = max(self.peak_rss_kb, self._rss_kb())
+
+    def __enter__(self):
+        self.peak_rss_kb = self._rss_kb()
+        self._start_cpu = self._cpu_seconds()
+        self._start_time = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name='loadtest-monitor', daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak_rss_kb = max(self.peak_rss_kb, self._rss_kb())
+        elapsed = time.monotonic() - self._start_time
+        self.cpu_percent = 100 * (self._cpu_seconds() - self._start_cpu) / elapsed if elapsed else 0.0
+        return False
+
+
+class VirtualUser:
+    """One simulated browser: a cookie session plus the ETags it has been sent."""
+
+    def __init__(self, base_url: str, userName: str, revalidate: bool, timeout: float):
+        self.base_url = base_url
+        self.userName = userName
+        self.revalidate = revalidate
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.etags = {}
+
+    def get(self, path: str, **kwargs):
+        """GET a page; returns (latency seconds, status code or None, error or None)."""
+        headers = {}
+        if self.revalidate and path in self.etags:
+            headers['If-None-Match'] = self.etags[path]
+
+        start = time.perf_counter()
+        try:
+            response = self.session.get(self.base_url + path, headers=headers, timeout=self.timeout,
+                                        allow_redirects=False, **kwargs)
+        except requests.RequestException as e:
+            return time.perf_counter() - start, None, type(e).__name__
+        latency = time.perf_counter() - start
+
+        if response.headers.get('ETag'):
+            self.etags[path] = response.headers['ETag']
+        error = f'HTTP {response.status_code}' if response.status_code >= 400 else None
+        return latency, response.status_code, error
+
+
+def scenario_requests(scenario: str, user: VirtualUser, round_number: int) -> list:
+    """Paths one user visits in one round of a scenario."""
+    if scenario == 'login':
+        return [f'/callback?code={user.userName}']
+    if scenario == 'stats':
+        return [f'/stats/{STATS_TIMEFRAMES[round_number % len(STATS_TIMEFRAMES)]}']
+    return ['/stats/recently-played']
+
+
+def run_scenario(scenario: str, users: list, rounds: int, concurrency: int, app_pid: int, fake_spotify) -> dict:
+    """
+    Run one scenario: every user makes its requests `rounds` times, `concurrency` at a time.
+
+    Returns:
+        dict: Summary for the report
+    """
+    results = []
+    results_lock = threading.Lock()
+
+    def visit(user, round_number):
+        for path in scenario_requests(scenario, user, round_number):
+            outcome = user.get(path)
+            with results_lock:
+                results.append(outcome)
+
+    spotify_before = fake_spotify.stats.snapshot()
+    with ProcessMonitor(app_pid) as monitor:
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            # One round at a time, so a user never has two requests in flight
+            for round_number in range(rounds):
+                list(pool.map(lambda user: visit(user, round_number), users))
+        elapsed = time.monotonic() - start
+    spotify_after = fake_spotify.stats.snapshot()
+
+    latencies = sorted(latency for latency, _, _ in results)
+    errors = Counter(error for _, _, error in results if error)
+    statuses = Counter(str(status) for _, status, _ in results if status is not None)
+    return {
+        'scenario': scenario,
+        'requests': len(results),
+        'seconds': round(elapsed, 2),
+        'throughput': round(len(results) / elapsed, 2) if elapsed else 0.0,
+        'p50Ms': round(percentile(latencies, 50) * 1000, 1),
+        'p95Ms': round(percentile(latencies, 95) * 1000, 1),
+        'p99Ms': round(percentile(latencies, 99) * 1000, 1),
+        'maxMs': round(latencies[-1] * 1000, 1) if latencies else 0.0,
+        'errorRate': round(sum(errors.values()) / len(results), 4) if results else 0.0,
+        'errors': dict(errors),
+        'statuses': dict(statuses),
+        'peakRssMb': round(monitor.peak_rss_kb / 1024, 1),
+        'cpuPercent': round(monitor.cpu_percent, 1),
+        'spotifyCalls': spotify_after['requests'] - spotify_before['requests'],
+        'spotifyRateLimited': spotify_after['rateLimited'] - spotify_before['rateLimited'],
+    }
+
+
+def load_schema(args) -> None:
+    """Apply schema.sql to the load test database."""
+    conn = mysql.connector.connect(host=args.mysql_host, port=args.mysql_port, user=args.mysql_user,
+                                   password=args.mysql_password, database=args.mysql_database)
+    cursor = conn.cursor()
+    try:
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'schema.sql')) as f:
+            for _ in cursor.execute(f.read(), multi=True):
+                pass
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def start_app(args, spotify_port: int) -> subprocess.Popen:
+    """Launch app.py against the fake Spotify and wait until it answers."""
+    env = dict(os.environ)
+    env.update({
+        'SPOTIFY_API_BASE_URL': f'http://127.0.0.1:{spotify_port}/v1/',
+        'SPOTIFY_ACCOUNTS_BASE_URL': f'http://127.0.0.1:{spotify_port}',
+        'SPOTIFY_CLIENT_ID': 'loadtest',
+        'SPOTIFY_CLIENT_SECRET': 'loadtest',
+        'SPOTIPY_REDIRECT_URI': f'http://127.0.0.1:{args.app_port}/callback',
+        'MYSQL_HOST': args.mysql_host,
+        'MYSQL_PORT': str(args.mysql_port),
+        'MYSQL_USER': args.mysql_user,
+        'MYSQL_PASSWORD': args.mysql_password,
+        'MYSQL_DATABASE': args.mysql_database,
+        'PORT': str(args.app_port),
+        'FLASK_ENV': 'production',
+    })
+    backend_dir = os.path.dirname(os.path.abspath(__file__))
+    app = subprocess.Popen([sys.executable, 'app.py'], cwd=backend_dir, env=env,
+                           stdout=subprocess.DEVNULL if args.quiet_app else None,
+                           stderr=subprocess.DEVNULL if args.quiet_app else None)
+
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if app.poll() is not None:
+            raise RuntimeError(f"app.py exited with code {app.returncode} during startup")
+        try:
+            requests.get(f'http://127.0.0.1:{args.app_port}/', timeout=1)
+            return app
+        except requests.RequestException:
+            time.sleep(0.2)
+
+    app.terminate()
+    raise RuntimeError("app.py did not start answering within 30 seconds")
+
+
+def print_report(summaries: list) -> None:
+    columns = [
+        ('scenario', 16), ('requests', 9), ('throughput', 11), ('p50Ms', 9), ('p95Ms', 9),
+        ('p99Ms', 9), ('errorRate', 10), ('peakRssMb', 10), ('cpuPercent', 11), ('spotifyCalls', 13),
+        ('spotifyRateLimited', 19),
+    ]
+    print(''.join(name.ljust(width) for name, width in columns))
+    for summary in summaries:
+        print(''.join(str(summary[name]).ljust(width) for name, width in columns))
+    for summary in summaries:
+        print(f"{summary['scenario']}: statuses {summary['statuses']}"
+              + (f", errors {summary['errors']}" if summary['errors'] else ''))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load test the app against a fake Spotify and a local MySQL.')
+    parser.add_argument('--users', type=int, default=100, help='Simulated users')
+    parser.add_argument('--concurrency', type=int, default=20, help='Requests in flight at once')
+    parser.add_argument('--rounds', type=int, default=3, help='Visits per user in the stats and recently-played scenarios')
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=SCENARIOS,
+                        help='Scenarios to run, in order (login runs first if listed)')
+    parser.add_argument('--no-revalidate', dest='revalidate', action='store_false',
+                        help="Don't send If-None-Match with stored ETags")
+    parser.add_argument('--timeout', type=float, default=60, help='Per-request timeout in seconds')
+    parser.add_argument('--app-port', type=int, default=5055)
+    parser.add_argument('--spotify-port', type=int, default=0, help='Fake Spotify port (0 = any free port)')
+    parser.add_argument('--latency-ms', type=float, default=80, help='Fake Spotify mean latency')
+    parser.add_argument('--jitter-ms', type=float, default=40, help='Fake Spotify latency jitter')
+    parser.add_argument('--rate-limit', type=float, default=0.0, help='Share of fake Spotify calls answered with 429')
+    parser.add_argument('--retry-after', type=int, default=1, help='Retry-After seconds on 429s')
+    parser.add_argument('--pages', type=int, default=2, help='Pages of 50 top tracks/artists per user')
+    parser.add_argument('--mysql-host', default='127.0.0.1')
+    parser.add_argument('--mysql-port', type=int, default=Config.MYSQL_PORT)
+    parser.add_argument('--mysql-user', default=Config.MYSQL_USER)
+    parser.add_argument('--mysql-password', default=Config.MYSQL_PASSWORD)
+    parser.add_argument('--mysql-database', default='spotify_loadtest')
+    parser.add_argument('--load-schema', action='store_true', help='Apply schema.sql before starting')
+    parser.add_argument('--quiet-app', action='store_true', help="Discard the app's stdout/stderr")
+    parser.add_argument('--json', help='Also write the summaries to this file')
+    args = parser.parse_args()
+
+    if args.load_schema:
+        load_schema(args)
+
+    fake_spotify = start_fake_spotify(args.spotify_port, FakeSpotifySettings(
+        args.latency_ms, args.jitter_ms, args.rate_limit, args.retry_after, args.pages))
+    app = start_app(args, fake_spotify.server_address[1])
+
+    try:
+        base_url = f'http://127.0.0.1:{args.app_port}'
+        users = [VirtualUser(base_url, f'loadtest-user-{i}', args.revalidate, args.timeout) for i in range(args.users)]
+
+        # Every other flow needs a logged in session
+        scenarios = args.scenarios if 'login' in args.scenarios else ['login'] + args.scenarios
+        summaries = []
+        for scenario in SCENARIOS:
+            if scenario not in scenarios:
+                continue
+            rounds = 1 if scenario == 'login' else args.rounds
+            summary = run_scenario(scenario, users, rounds, args.concurrency, app.pid, fake_spotify)
+            if scenario in args.scenarios:
+                summaries.append(summary)
+            print(f"Finished {scenario}: {summary['requests']} requests in {summary['seconds']}s", flush=True)
+
+        print_report(summaries)
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(summaries, f, indent=2)
+    finally:
+        app.terminate()
+        app.wait(timeout=10)
+        fake_spotify.shutdown()
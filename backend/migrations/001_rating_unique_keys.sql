@@ -0,0 +1,27 @@
+-- Adds the one-rating-per-user-and-item keys to databases created before them.
+-- schema.sql only creates them for new tables, and without them the rating
+-- upserts in ratings.py would insert a second row instead of updating the first.
+--
+-- Duplicate ratings are removed first, keeping each user's newest one. Run
+--     python ratings.py --rebuild-aggregates
+-- afterwards so the rating aggregates count the ratings that remain.
+
+DELETE older
+FROM RatedAlbum older
+JOIN RatedAlbum newer
+    ON newer.userName = older.userName
+    AND newer.spotifyAlbumId = older.spotifyAlbumId
+    AND newer.uniqueID > older.uniqueID;
+
+ALTER TABLE RatedAlbum
+    ADD UNIQUE KEY unique_album_rating (userName, spotifyAlbumId);
+
+DELETE older
+FROM RatedSong older
+JOIN RatedSong newer
+    ON newer.userName = older.userName
+    AND newer.spotifyTrackId = older.spotifyTrackId
+    AND newer.uniqueID > older.uniqueID;
+
+ALTER TABLE RatedSong
+    ADD UNIQUE KEY unique_song_rating (userName, spotifyTrackId);
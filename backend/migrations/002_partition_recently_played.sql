@@ -0,0 +1,43 @@
+-- Converts a RecentlyPlayed table created before it was partitioned by month.
+-- schema.sql only partitions new tables, and retention.py refuses to run
+-- against an unpartitioned one.
+--
+-- Run schema.sql first so RecentlyPlayedVersion, RecentlyPlayedMonthly and
+-- RecentlyPlayedRollup exist, and stop the app while this runs: plays stored
+-- between the copy and the rename would be lost. Afterwards run
+--     python retention.py
+-- to split p_future into monthly partitions.
+--
+-- Partitioned tables cannot have foreign keys, so the copy drops the one to
+-- User (retention.py purges the plays of deleted users instead). Plays without
+-- a song name or time are dropped, since both columns are now NOT NULL, and
+-- repeated plays collapse onto the unique_play key, keeping the first stored.
+
+CREATE TABLE RecentlyPlayed_partitioned (
+    id INT AUTO_INCREMENT,
+    userName VARCHAR(255) NOT NULL,
+    songName VARCHAR(255) NOT NULL,
+    artistName VARCHAR(255),
+    albumName VARCHAR(255),
+    spotifyTrackId VARCHAR(255),
+    playedAt TIMESTAMP NOT NULL,
+    msPlayed INT,
+    PRIMARY KEY (id, playedAt),
+    UNIQUE KEY unique_play (userName, playedAt, songName)
+)
+PARTITION BY RANGE (UNIX_TIMESTAMP(playedAt)) (
+    PARTITION p_start VALUES LESS THAN (UNIX_TIMESTAMP('2020-01-01 00:00:00')),
+    PARTITION p_future VALUES LESS THAN MAXVALUE
+);
+
+INSERT IGNORE INTO RecentlyPlayed_partitioned (userName, songName, artistName, albumName, spotifyTrackId, playedAt)
+SELECT userName, songName, artistName, albumName, spotifyTrackId, playedAt
+FROM RecentlyPlayed
+WHERE songName IS NOT NULL
+AND playedAt IS NOT NULL
+ORDER BY id;
+
+RENAME TABLE RecentlyPlayed TO RecentlyPlayed_unpartitioned,
+             RecentlyPlayed_partitioned TO RecentlyPlayed;
+
+DROP TABLE RecentlyPlayed_unpartitioned;
@@ -0,0 +1,245 @@
+"""
+Shared "now playing" poller with server-sent events.
+
+Each user with at least one open tab gets exactly one background poller
+thread. The poller calls Spotify's playback endpoint at an adaptive interval:
+it wakes just after the current track should end, polls slowly while playback
+is paused or idle, and backs off on errors. It pushes a state only when it
+changes, to every subscribed tab over /api/now-playing/stream. The poller
+stops once its last tab disconnects.
+"""
+import json
+import queue
+import threading
+import time
+from flask import Blueprint, Response, session, jsonify
+from auth import get_authenticated_spotify_client, get_spotify_client_for_token
+
+now_playing_bp = Blueprint('now_playing', __name__)
+
+# Poll intervals in seconds
+POLL_INTERVAL_MIN = 2
+POLL_INTERVAL_MAX_PLAYING = 30   # Still re-check long tracks for skips and seeks
+POLL_INTERVAL_PAUSED = 15
+POLL_INTERVAL_IDLE = 30          # Nothing playing on any device
+POLL_INTERVAL_MAX_BACKOFF = 120
+
+# Seconds between SSE comments that keep proxies from closing idle streams
+SSE_KEEPALIVE_SECONDS = 15
+
+# A progress jump bigger than this (ms) means the user seeked
+SEEK_TOLERANCE_MS = 5000
+
+# Events buffered per tab before the oldest are dropped for a slow client
+SUBSCRIBER_QUEUE_SIZE = 10
+
+_pollers = {}
+_pollers_lock = threading.Lock()
+
+
+def normalize_playback(playback) -> dict:
+    """
+    Reduce Spotify's current playback response to what the widget needs.
+
+    Args:
+        playback: Response from sp.current_playback(), None when nothing is playing
+
+    Returns:
+        dict: {'isPlaying', 'progressMs', 'durationMs', 'songName', 'artistName',
+               'albumName', 'spotifyTrackId', 'imageUrl', 'fetchedAt'}
+    """
+    state = {
+        'isPlaying': False,
+        'progressMs': None,
+        'durationMs': None,
+        'songName': None,
+        'artistName': None,
+        'albumName': None,
+        'spotifyTrackId': None,
+        'imageUrl': None,
+        'fetchedAt': time.time(),
+    }
+
+    track = playback.get('item') if playback else None
+    if not track:
+        return state
+
+    state.update({
+        'isPlaying': bool(playback.get('is_playing')),
+        'progressMs': playback.get('progress_ms'),
+        'durationMs': track.get('duration_ms'),
+        'songName': track.get('name'),
+        'artistName': track['artists'][0]['name'] if track.get('artists') else 'Unknown Artist',
+        'albumName': track.get('album', {}).get('name'),
+        'spotifyTrackId': track.get('id'),
+        'imageUrl': track['album']['images'][0]['url'] if track.get('album', {}).get('images') else None,
+    })
+    return state
+
+
+def playback_changed(previous, current) -> bool:
+    """
+    Decide whether a new playback state is worth pushing to subscribers.
+
+    Progress advancing normally is not a change (tabs interpolate it locally);
+    a different track, play/pause, or a seek is.
+    """
+    if previous is None:
+        return True
+    if (previous['spotifyTrackId'], previous['isPlaying']) != (current['spotifyTrackId'], current['isPlaying']):
+        return True
+    if previous['progressMs'] is None or current['progressMs'] is None:
+        return previous['progressMs'] != current['progressMs']
+
+    elapsed_ms = (current['fetchedAt'] - previous['fetchedAt']) * 1000 if current['isPlaying'] else 0
+    expected_ms = previous['progressMs'] + elapsed_ms
+    return abs(current['progressMs'] - expected_ms) > SEEK_TOLERANCE_MS
+
+
+def next_poll_interval(state: dict) -> float:
+    """
+    Seconds to wait before the next poll for a playback state.
+
+    While playing, wake up just after the current track should finish.
+    """
+    if not state['spotifyTrackId']:
+        return POLL_INTERVAL_IDLE
+    if not state['isPlaying']:
+        return POLL_INTERVAL_PAUSED
+    if state['durationMs'] is None or state['progressMs'] is None:
+        return POLL_INTERVAL_MIN
+
+    remaining = (state['durationMs'] - state['progressMs']) / 1000 + 1
+    return max(POLL_INTERVAL_MIN, min(remaining, POLL_INTERVAL_MAX_PLAYING))
+
+
+class NowPlayingPoller(threading.Thread):
+    """Background thread that polls one user's playback and fans it out to their tabs."""
+
+    def __init__(self, userName: str, token_info: dict):
+        super().__init__(name=f'now-playing-{userName}', daemon=True)
+        self.userName = userName
+        self.token_info = token_info
+        self.latest = None
+        self._subscribers = set()
+        self._wake = threading.Event()
+
+    def add_subscriber(self) -> queue.Queue:
+        """Register a tab. Must be called with _pollers_lock held."""
+        subscriber = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        if self.latest is not None:
+            subscriber.put_nowait(self.latest)
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    def remove_subscriber(self, subscriber: queue.Queue) -> None:
+        """Unregister a tab. Must be called with _pollers_lock held."""
+        self._subscribers.discard(subscriber)
+        if not self._subscribers:
+            self._wake.set()
+
+    def _publish(self, state: dict) -> None:
+        with _pollers_lock:
+            self.latest = state
+            subscribers = list(self._subscribers)
+
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(state)
+            except queue.Full:
+                # Slow tab: drop its oldest event so it still gets the newest one
+                try:
+                    subscriber.get_nowait()
+                except queue.Empty:
+                    pass
+                subscriber.put_nowait(state)
+
+    def _poll(self) -> dict:
+        sp, self.token_info = get_spotify_client_for_token(self.token_info)
+        return normalize_playback(sp.current_playback())
+
+    def run(self):
+        backoff = POLL_INTERVAL_MIN
+
+        while True:
+            with _pollers_lock:
+                if not self._subscribers:
+                    if _pollers.get(self.userName) is self:
+                        del _pollers[self.userName]
+                    return
+
+            try:
+                state = self._poll()
+                backoff = POLL_INTERVAL_MIN
+                if playback_changed(self.latest, state):
+                    self._publish(state)
+                else:
+                    self.latest = state
+                interval = next_poll_interval(state)
+            except Exception as e:
+                print(f"Error polling now playing for {self.userName}: {e}", flush=True)
+                backoff = min(backoff * 2, POLL_INTERVAL_MAX_BACKOFF)
+                interval = backoff
+
+            self._wake.wait(interval)
+            self._wake.clear()
+
+
+def subscribe_now_playing(userName: str, token_info: dict):
+    """
+    Subscribe to a user's now playing updates, starting their poller if needed.
+
+    Args:
+        userName: The user's Spotify ID (userName)
+        token_info: The user's current OAuth token
+
+    Returns:
+        tuple: (poller, queue of playback state dictionaries)
+    """
+    with _pollers_lock:
+        poller = _pollers.get(userName)
+        if poller is None:
+            poller = NowPlayingPoller(userName, token_info)
+            _pollers[userName] = poller
+            subscriber = poller.add_subscriber()
+            poller.start()
+        else:
+            poller.token_info = token_info
+            subscriber = poller.add_subscriber()
+
+    return poller, subscriber
+
+
+def unsubscribe_now_playing(poller: NowPlayingPoller, subscriber: queue.Queue) -> None:
+    """Remove a tab's subscription; the poller exits when none are left."""
+    with _pollers_lock:
+        poller.remove_subscriber(subscriber)
+
+
+@now_playing_bp.route('/api/now-playing/stream')
+def now_playing_stream():
+    """Server-sent event stream of the logged in user's playback state."""
+    userName = session.get('userName')
+    sp, token_info = get_authenticated_spotify_client()
+    if not sp or not userName:
+        return jsonify({'error': 'Not authenticated'}), 401
+
+    poller, subscriber = subscribe_now_playing(userName, token_info)
+
+    def stream():
+        try:
+            while True:
+                try:
+                    state = subscriber.get(timeout=SSE_KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: now-playing\ndata: {json.dumps(state)}\n\n"
+        finally:
+            # Runs when the client disconnects and the server closes the generator
+            unsubscribe_now_playing(poller, subscriber)
+
+    return Response(stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
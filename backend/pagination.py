@@ -0,0 +1,85 @@
+"""
+Keyset (cursor) pagination helpers shared by the JSON API blueprints.
+
+A cursor is the sort key of the last row on the previous page, encoded as an
+opaque url-safe string. Queries then seek past that key with an indexed range
+condition instead of using OFFSET, so every page costs the same no matter how
+deep into the history the client has scrolled.
+"""
+import base64
+import json
+from datetime import datetime
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(*values) -> str:
+    """
+    Encode the sort key of the last returned row into an opaque cursor string.
+
+    Args:
+        *values: Sort key values (datetimes are stored as ISO strings)
+
+    Returns:
+        str: url-safe cursor to hand back to the client as next_cursor
+    """
+    payload = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str, *types) -> tuple:
+    """
+    Decode a cursor produced by encode_cursor().
+
+    Args:
+        cursor: The cursor string from the request, may be None or empty
+        *types: Expected type of each key value (datetime, int or str)
+
+    Returns:
+        tuple: The decoded key values, or None if no cursor was given
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    if not cursor:
+        return None
+
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
+    if not isinstance(payload, list) or len(payload) != len(types):
+        raise ValueError("Invalid cursor: wrong number of values")
+
+    values = []
+    for value, value_type in zip(payload, types):
+        try:
+            if value_type is datetime:
+                values.append(datetime.fromisoformat(value))
+            else:
+                values.append(value_type(value))
+        except (ValueError, TypeError) as e:
+            raise ValueError(f"Invalid cursor: {e}")
+    return tuple(values)
+
+
+def parse_page_size(value, default: int = DEFAULT_PAGE_SIZE) -> int:
+    """
+    Parse a ?limit= query parameter, clamped to 1..MAX_PAGE_SIZE.
+
+    Args:
+        value: Raw query string value (may be None)
+        default: Page size to use when the parameter is missing or invalid
+
+    Returns:
+        int: The page size to use
+    """
+    try:
+        limit = int(value) if value is not None else default
+    except ValueError:
+        limit = default
+    return max(1, min(limit, MAX_PAGE_SIZE))
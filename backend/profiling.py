@@ -0,0 +1,187 @@
+"""
+Opt-in sampling profiler for individual requests.
+
+A request is profiled when PROFILING_HEADER_TOKEN is set and the request
+sends it in an X-Profile header, or when the logged in user is listed in
+PROFILING_USERS. While such a request runs, a sampler thread snapshots the
+handler thread's stack every PROFILING_SAMPLE_INTERVAL_MS. It records:
+  - a time breakdown: Spotify calls (spotipy/requests/urllib3 frames), DB
+    calls (mysql.connector frames) and everything else as Python, returned in
+    the X-Profile-Breakdown response header
+  - collapsed stacks ("frame;frame;frame count" per line) written to
+    PROFILING_OUTPUT_DIR, ready for flamegraph.pl or speedscope
+
+Work a handler hands off to a helper thread (e.g. the Spotify fetches behind
+stream_stats_snapshot()) is covered by wrapping the wait in waiting_on(): the
+sampler follows the helper's stack for as long as the handler is blocked on it.
+
+With neither option configured the request hooks are never registered, so
+the profiler adds no overhead when it is off.
+"""
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from flask import g, has_request_context, request, session
+from config import Config
+
+PROFILE_HEADER = 'X-Profile'
+
+# Module prefixes that decide which bucket a sample's time is charged to
+DB_MODULES = ('mysql',)
+SPOTIFY_MODULES = ('spotipy', 'requests', 'urllib3')
+
+
+def _classify(module_names: list) -> str:
+    """Charge a sample to 'db', 'spotify' or 'python' based on the modules on its stack."""
+    if any(name.startswith(DB_MODULES) for name in module_names):
+        return 'db'
+    if any(name.startswith(SPOTIFY_MODULES) for name in module_names):
+        return 'spotify'
+    return 'python'
+
+
+class RequestSampler(threading.Thread):
+    """Samples one thread's stack at a fixed interval until stopped."""
+
+    def __init__(self, target_thread_id: int, interval_ms: float):
+        super().__init__(name=f'profiler-{target_thread_id}', daemon=True)
+        self.target_thread_id = target_thread_id
+        # Set while the target thread is blocked on another one (see waiting_on())
+        self.delegate_thread_id = None
+        self.interval = interval_ms / 1000
+        self.stacks = Counter()
+        self.categories = Counter()
+        self.started_at = None
+        self.elapsed = 0.0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        self.started_at = time.perf_counter()
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.delegate_thread_id or self.target_thread_id)
+            if frame is None:
+                continue
+
+            frames = []
+            module_names = []
+            while frame is not None:
+                code = frame.f_code
+                module = frame.f_globals.get('__name__', '?')
+                frames.append(f"{module}:{code.co_name}:{frame.f_lineno}")
+                module_names.append(module)
+                frame = frame.f_back
+
+            # Collapsed stack format lists the root frame first
+            self.stacks[';'.join(reversed(frames))] += 1
+            self.categories[_classify(module_names)] += 1
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+        self.elapsed = time.perf_counter() - self.started_at if self.started_at else 0.0
+
+    def breakdown_ms(self) -> dict:
+        """Milliseconds per category, scaled so the buckets add up to the measured wall time."""
+        total_samples = sum(self.categories.values())
+        wall_ms = self.elapsed * 1000
+        breakdown = {
+            category: round(wall_ms * self.categories[category] / total_samples, 1) if total_samples else 0.0
+            for category in ('spotify', 'db', 'python')
+        }
+        breakdown['wall'] = round(wall_ms, 1)
+        breakdown['samples'] = total_samples
+        return breakdown
+
+
+@contextmanager
+def waiting_on(thread: threading.Thread):
+    """
+    Charge the current request's samples to `thread` while the request blocks on it.
+
+    Does nothing outside a profiled request, so callers can use it unconditionally.
+    """
+    sampler = g.get('profiler') if has_request_context() else None
+    if sampler is None:
+        yield
+        return
+
+    sampler.delegate_thread_id = thread.ident
+    try:
+        yield
+    finally:
+        sampler.delegate_thread_id = None
+
+
+def _should_profile() -> bool:
+    if Config.PROFILING_HEADER_TOKEN and request.headers.get(PROFILE_HEADER) == Config.PROFILING_HEADER_TOKEN:
+        return True
+    return bool(Config.PROFILING_USERS) and session.get('userName') in Config.PROFILING_USERS
+
+
+def _start_profiling():
+    if not _should_profile():
+        return
+    sampler = RequestSampler(threading.get_ident(), Config.PROFILING_SAMPLE_INTERVAL_MS)
+    sampler.start()
+    g.profiler = sampler
+
+
+def _write_collapsed_stacks(sampler: RequestSampler) -> str:
+    """Write the sampled stacks to PROFILING_OUTPUT_DIR and return the file path."""
+    os.makedirs(Config.PROFILING_OUTPUT_DIR, exist_ok=True)
+    user = session.get('userName') or 'anonymous'
+    endpoint = re.sub(r'[^A-Za-z0-9_-]+', '_', request.path).strip('_') or 'root'
+    path = os.path.join(
+        Config.PROFILING_OUTPUT_DIR,
+        f"{time.strftime('%Y%m%d-%H%M%S')}-{user}-{endpoint}-{os.getpid()}-{threading.get_ident()}.folded"
+    )
+    with open(path, 'w') as f:
+        for stack, count in sampler.stacks.most_common():
+            f.write(f"{stack} {count}\n")
+    return path
+
+
+def _finish_profiling(response):
+    sampler = g.pop('profiler', None)
+    if sampler is None:
+        return response
+
+    sampler.stop()
+    breakdown = sampler.breakdown_ms()
+    response.headers['X-Profile-Breakdown'] = ';'.join(f"{key}={value}" for key, value in breakdown.items())
+
+    try:
+        path = _write_collapsed_stacks(sampler)
+        response.headers['X-Profile-File'] = os.path.basename(path)
+        print(f"Profiled {request.method} {request.path}: {breakdown} -> {path}", flush=True)
+    except OSError as e:
+        print(f"Error writing profile for {request.path}: {e}", flush=True)
+
+    return response
+
+
+def _abort_profiling(exc):
+    # Requests that raised never reach after_request; make sure their sampler stops
+    sampler = g.pop('profiler', None)
+    if sampler is not None:
+        sampler.stop()
+
+
+def init_profiling(app) -> None:
+    """
+    Register the profiling hooks on the app if profiling is configured.
+
+    Args:
+        app: The Flask application
+    """
+    if not Config.PROFILING_HEADER_TOKEN and not Config.PROFILING_USERS:
+        return
+
+    app.before_request(_start_profiling)
+    app.after_request(_finish_profiling)
+    app.teardown_request(_abort_profiling)
+    print(f"Request profiling enabled, writing stacks to {Config.PROFILING_OUTPUT_DIR}", flush=True)
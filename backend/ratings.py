@@ -0,0 +1,497 @@
+"""
+Album and song ratings with incrementally maintained community aggregates.
+
+Each write to RatedAlbum/RatedSong adjusts the matching row in
+AlbumRatingAggregate/SongRatingAggregate (count, sum and per-bucket
+distribution) inside the same transaction, so averages and top-rated
+leaderboards never need an AVG() over the ratings tables. Ratings stored before
+the aggregate tables existed are folded in once with
+    python ratings.py --rebuild-aggregates
+"""
+import json
+import math
+import sys
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from flask import Blueprint, session, request, jsonify
+from db import get_db
+from pagination import parse_page_size
+from search import index_catalog_items
+from feed import publish_activities_in_background
+
+ratings_bp = Blueprint('ratings', __name__)
+
+RATING_MIN = Decimal('0')
+RATING_MAX = Decimal('10')
+RATING_STEP = Decimal('0.1')
+
+# Table and column names for each kind of rating, keyed by the URL segment
+RATING_TABLES = {
+    'albums': {
+        'table': 'RatedAlbum',
+        'aggregate': 'AlbumRatingAggregate',
+        'id': 'spotifyAlbumId',
+        'name': 'albumName',
+    },
+    'songs': {
+        'table': 'RatedSong',
+        'aggregate': 'SongRatingAggregate',
+        'id': 'spotifyTrackId',
+        'name': 'songName',
+    },
+}
+
+# SearchCatalog.itemType for each kind of rating
+SEARCH_ITEM_TYPE = {
+    'albums': 'album',
+    'songs': 'song',
+}
+
+# FeedItem.activityType for each kind of rating
+FEED_ACTIVITY_TYPE = {
+    'albums': 'album_rating',
+    'songs': 'song_rating',
+}
+
+
+def _rating_bucket(rating) -> str:
+    """Distribution bucket for a rating: its whole-number part, as a JSON key."""
+    return str(math.floor(rating))
+
+
+def _adjust_aggregate(rating_count: int, rating_sum, distribution: dict, old_rating=None, new_rating=None) -> tuple:
+    """
+    Apply one rating change to an item's totals.
+
+    Args:
+        rating_count: Number of ratings counted so far
+        rating_sum: Sum of those ratings
+        distribution: Bucket -> vote count (not modified)
+        old_rating: Rating being replaced or removed (None if this is a new rating)
+        new_rating: Rating being added (None if the rating was deleted)
+
+    Returns:
+        tuple: (rating_count, rating_sum, distribution) after the change
+    """
+    rating_sum = Decimal(rating_sum)
+    distribution = dict(distribution)
+
+    if old_rating is not None:
+        rating_count -= 1
+        rating_sum -= Decimal(old_rating)
+        bucket = _rating_bucket(old_rating)
+        distribution[bucket] = distribution.get(bucket, 0) - 1
+        if distribution[bucket] <= 0:
+            del distribution[bucket]
+
+    if new_rating is not None:
+        rating_count += 1
+        rating_sum += Decimal(new_rating)
+        bucket = _rating_bucket(new_rating)
+        distribution[bucket] = distribution.get(bucket, 0) + 1
+
+    return rating_count, rating_sum, distribution
+
+
+def summarize_ratings(rows) -> dict:
+    """
+    Build aggregate totals from scratch out of stored ratings.
+
+    Args:
+        rows: (spotifyId, name, artistName, rating) tuples
+
+    Returns:
+        dict: spotifyId -> (name, artistName, ratingCount, ratingSum, distribution)
+    """
+    totals = {}
+    for spotify_id, name, artist_name, rating in rows:
+        old_name, old_artist, rating_count, rating_sum, distribution = totals.get(
+            spotify_id, (None, None, 0, Decimal(0), {}))
+        totals[spotify_id] = (
+            old_name or name,
+            old_artist or artist_name,
+            *_adjust_aggregate(rating_count, rating_sum, distribution, new_rating=rating)
+        )
+    return totals
+
+
+def _apply_rating_delta(cursor, kind: str, spotify_id: str, old_rating=None, new_rating=None,
+                        name=None, artist_name=None) -> None:
+    """
+    Adjust the aggregate row for an item after a rating is added, changed or removed.
+
+    The aggregate row is locked with SELECT ... FOR UPDATE so concurrent ratings of
+    the same item serialize instead of losing updates.
+
+    Args:
+        cursor: Open cursor on the connection doing the rating write
+        kind: 'albums' or 'songs'
+        spotify_id: Spotify ID of the rated album or track
+        old_rating: Previous rating (None if this is a new rating)
+        new_rating: New rating (None if the rating was deleted)
+        name: Album or song name to display on leaderboards
+        artist_name: Artist name to display on leaderboards
+    """
+    tables = RATING_TABLES[kind]
+    aggregate, id_column, name_column = tables['aggregate'], tables['id'], tables['name']
+
+    # Make sure the row exists so it can be locked, even for the very first rating
+    cursor.execute(f"""
+        INSERT IGNORE INTO {aggregate} ({id_column}, ratingCount, ratingSum, distribution)
+        VALUES (%s, 0, 0, '{{}}')
+    """, (spotify_id,))
+
+    cursor.execute(f"""
+        SELECT ratingCount, ratingSum, distribution
+        FROM {aggregate}
+        WHERE {id_column} = %s
+        FOR UPDATE
+    """, (spotify_id,))
+    rating_count, rating_sum, distribution = cursor.fetchone()
+    rating_count, rating_sum, distribution = _adjust_aggregate(
+        rating_count, rating_sum, json.loads(distribution) if distribution else {}, old_rating, new_rating)
+
+    cursor.execute(f"""
+        UPDATE {aggregate}
+        SET ratingCount = %s,
+            ratingSum = %s,
+            distribution = %s,
+            {name_column} = COALESCE(%s, {name_column}),
+            artistName = COALESCE(%s, artistName)
+        WHERE {id_column} = %s
+    """, (rating_count, rating_sum, json.dumps(distribution), name, artist_name, spotify_id))
+
+
+def upsert_rating(userName: str, kind: str, item: dict, rating, comment=None) -> None:
+    """
+    Create or update a user's rating for an album or song.
+
+    Args:
+        userName: The user's Spotify ID (userName)
+        kind: 'albums' or 'songs'
+        item: Dictionary with the Spotify ID key ('spotifyAlbumId' or 'spotifyTrackId'),
+              the name key ('albumName' or 'songName') and 'artistName'
+        rating: Rating between RATING_MIN and RATING_MAX
+        comment: Optional review text
+    """
+    tables = RATING_TABLES[kind]
+    table, id_column, name_column = tables['table'], tables['id'], tables['name']
+    spotify_id = item[id_column]
+    rating = Decimal(str(rating)).quantize(RATING_STEP, rounding=ROUND_HALF_UP)
+
+    conn = get_db()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute(f"""
+            SELECT rating
+            FROM {table}
+            WHERE userName = %s
+            AND {id_column} = %s
+            FOR UPDATE
+        """, (userName, spotify_id))
+        existing = cursor.fetchone()
+
+        if existing:
+            old_rating = existing[0]
+            cursor.execute(f"""
+                UPDATE {table}
+                SET rating = %s, comment = %s
+                WHERE userName = %s
+                AND {id_column} = %s
+            """, (rating, comment, userName, spotify_id))
+        else:
+            old_rating = None
+            cursor.execute(f"""
+                INSERT INTO {table} (userName, {name_column}, artistName, {id_column}, rating, comment)
+                VALUES (%s, %s, %s, %s, %s, %s)
+            """, (userName, item.get(name_column), item.get('artistName'), spotify_id, rating, comment))
+
+        _apply_rating_delta(cursor, kind, spotify_id, old_rating=old_rating, new_rating=rating,
+                            name=item.get(name_column), artist_name=item.get('artistName'))
+        index_catalog_items(cursor, userName, SEARCH_ITEM_TYPE[kind], [item], id_column, name_column)
+
+        cursor.execute(f"""
+            SELECT updatedAt
+            FROM {table}
+            WHERE userName = %s
+            AND {id_column} = %s
+        """, (userName, spotify_id))
+        rated_at = cursor.fetchone()[0]
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        raise e
+    finally:
+        cursor.close()
+        conn.close()
+
+    # Fanned out after the commit, so the aggregate row lock is not held for
+    # up to FANOUT_FOLLOWER_LIMIT feed writes
+    publish_activities_in_background(userName, [{
+        'activityType': FEED_ACTIVITY_TYPE[kind],
+        'itemName': item.get(name_column),
+        'artistName': item.get('artistName'),
+        'spotifyId': spotify_id,
+        'rating': rating,
+        'occurredAt': rated_at
+    }])
+
+
+def delete_rating(userName: str, kind: str, spotify_id: str) -> bool:
+    """
+    Delete a user's rating for an album or song.
+
+    Args:
+        userName: The user's Spotify ID (userName)
+        kind: 'albums' or 'songs'
+        spotify_id: Spotify ID of the rated album or track
+
+    Returns:
+        bool: True if a rating was deleted, False if the user had not rated the item
+    """
+    tables = RATING_TABLES[kind]
+    table, id_column = tables['table'], tables['id']
+
+    conn = get_db()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute(f"""
+            SELECT rating
+            FROM {table}
+            WHERE userName = %s
+            AND {id_column} = %s
+            FOR UPDATE
+        """, (userName, spotify_id))
+        existing = cursor.fetchone()
+        if not existing:
+            conn.rollback()
+            return False
+
+        cursor.execute(f"""
+            DELETE FROM {table}
+            WHERE userName = %s
+            AND {id_column} = %s
+        """, (userName, spotify_id))
+
+        _apply_rating_delta(cursor, kind, spotify_id, old_rating=existing[0])
+        conn.commit()
+        return True
+    except Exception as e:
+        conn.rollback()
+        raise e
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def rebuild_rating_aggregates() -> None:
+    """
+    Recompute AlbumRatingAggregate and SongRatingAggregate from RatedAlbum and RatedSong.
+
+    Ratings are folded into the aggregates as they are written, so this only needs
+    to run once for ratings stored before the aggregates existed (after
+    migrations/001_rating_unique_keys.sql has removed duplicate ratings). The
+    ratings are read with a shared lock, so ratings written meanwhile wait for
+    the rebuild to commit instead of being lost.
+    """
+    conn = get_db()
+    cursor = conn.cursor()
+
+    try:
+        for tables in RATING_TABLES.values():
+            table, aggregate = tables['table'], tables['aggregate']
+            id_column, name_column = tables['id'], tables['name']
+
+            cursor.execute(f"""
+                SELECT {id_column}, {name_column}, artistName, rating
+                FROM {table}
+                WHERE {id_column} IS NOT NULL
+                AND rating IS NOT NULL
+                FOR SHARE
+            """)
+            totals = summarize_ratings(cursor.fetchall())
+
+            cursor.execute(f"DELETE FROM {aggregate}")
+            if totals:
+                cursor.executemany(f"""
+                    INSERT INTO {aggregate} ({id_column}, {name_column}, artistName, ratingCount, ratingSum, distribution)
+                    VALUES (%s, %s, %s, %s, %s, %s)
+                """, [
+                    (spotify_id, name, artist_name, rating_count, rating_sum, json.dumps(distribution))
+                    for spotify_id, (name, artist_name, rating_count, rating_sum, distribution) in sorted(totals.items())
+                ])
+
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        raise e
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def _format_aggregate(row: dict) -> dict:
+    """Convert an aggregate row from the database into a JSON-friendly dictionary."""
+    distribution = row.pop('distribution', None)
+    row['distribution'] = json.loads(distribution) if distribution else {}
+    row['ratingSum'] = float(row['ratingSum'])
+    row['avgRating'] = float(row['avgRating']) if row['avgRating'] is not None else None
+    return row
+
+
+def get_rating_aggregate(kind: str, spotify_id: str):
+    """
+    Get the community rating aggregate for an album or song.
+
+    Args:
+        kind: 'albums' or 'songs'
+        spotify_id: Spotify ID of the album or track
+
+    Returns:
+        dict: Aggregate with name, artistName, ratingCount, ratingSum, avgRating and distribution
+        None: If nobody has rated the item
+    """
+    tables = RATING_TABLES[kind]
+    aggregate, id_column, name_column = tables['aggregate'], tables['id'], tables['name']
+
+    conn = get_db()
+    cursor = conn.cursor(dictionary=True)
+
+    try:
+        cursor.execute(f"""
+            SELECT {id_column}, {name_column}, artistName, ratingCount, ratingSum, avgRating, distribution
+            FROM {aggregate}
+            WHERE {id_column} = %s
+            AND ratingCount > 0
+        """, (spotify_id,))
+        row = cursor.fetchone()
+        return _format_aggregate(row) if row else None
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def fetch_top_rated(kind: str, min_votes: int = 1, limit: int = 20) -> list:
+    """
+    Fetch the highest rated albums or songs with at least min_votes ratings.
+
+    Walks the (avgRating, ratingCount) index from the top and stops after
+    limit qualifying rows, so the cost does not grow with the number of ratings.
+
+    Args:
+        kind: 'albums' or 'songs'
+        min_votes: Minimum number of ratings an item needs to qualify
+        limit: Maximum number of items to return
+
+    Returns:
+        List of aggregate dictionaries, best rated first
+    """
+    tables = RATING_TABLES[kind]
+    aggregate, id_column, name_column = tables['aggregate'], tables['id'], tables['name']
+
+    conn = get_db()
+    cursor = conn.cursor(dictionary=True)
+
+    try:
+        cursor.execute(f"""
+            SELECT {id_column}, {name_column}, artistName, ratingCount, ratingSum, avgRating
+            FROM {aggregate}
+            WHERE avgRating IS NOT NULL
+            AND ratingCount >= %s
+            ORDER BY avgRating DESC, ratingCount DESC
+            LIMIT %s
+        """, (max(min_votes, 1), limit))
+        return [_format_aggregate(row) for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+        conn.close()
+
+
+@ratings_bp.route('/api/ratings/<kind>', methods=['POST'])
+def rate_item(kind):
+    """
+    Rate an album or song as the logged in user.
+
+    JSON body: {spotifyAlbumId|spotifyTrackId, albumName|songName, artistName, rating, comment}
+    """
+    userName = session.get('userName')
+    if not userName:
+        return jsonify({'error': 'Not authenticated'}), 401
+
+    if kind not in RATING_TABLES:
+        return jsonify({'error': f'Invalid rating kind: {kind}'}), 400
+
+    data = request.get_json(silent=True) or {}
+    if not data.get(RATING_TABLES[kind]['id']):
+        return jsonify({'error': f"Missing {RATING_TABLES[kind]['id']}"}), 400
+
+    try:
+        rating = Decimal(str(data.get('rating')))
+    except InvalidOperation:
+        return jsonify({'error': 'Invalid rating'}), 400
+    if not rating.is_finite():
+        return jsonify({'error': 'Invalid rating'}), 400
+    if not (RATING_MIN <= rating <= RATING_MAX):
+        return jsonify({'error': f'Rating must be between {RATING_MIN} and {RATING_MAX}'}), 400
+    # Stored as DECIMAL(3,1); round here so the aggregates see the stored value
+    rating = rating.quantize(RATING_STEP, rounding=ROUND_HALF_UP)
+
+    upsert_rating(userName, kind, data, rating, data.get('comment'))
+    return jsonify({'aggregate': get_rating_aggregate(kind, data[RATING_TABLES[kind]['id']])})
+
+
+@ratings_bp.route('/api/ratings/<kind>/<spotify_id>', methods=['DELETE'])
+def unrate_item(kind, spotify_id):
+    """Remove the logged in user's rating for an album or song."""
+    userName = session.get('userName')
+    if not userName:
+        return jsonify({'error': 'Not authenticated'}), 401
+
+    if kind not in RATING_TABLES:
+        return jsonify({'error': f'Invalid rating kind: {kind}'}), 400
+
+    if not delete_rating(userName, kind, spotify_id):
+        return jsonify({'error': 'Rating not found'}), 404
+    return jsonify({'aggregate': get_rating_aggregate(kind, spotify_id)})
+
+
+@ratings_bp.route('/api/ratings/<kind>/<spotify_id>', methods=['GET'])
+def rating_summary(kind, spotify_id):
+    """Community rating count, average and distribution for an album or song."""
+    if kind not in RATING_TABLES:
+        return jsonify({'error': f'Invalid rating kind: {kind}'}), 400
+
+    aggregate = get_rating_aggregate(kind, spotify_id)
+    if not aggregate:
+        return jsonify({'error': 'No ratings found'}), 404
+    return jsonify({'aggregate': aggregate})
+
+
+@ratings_bp.route('/api/ratings/top/<kind>')
+def top_rated(kind):
+    """
+    Top-rated leaderboard for albums or songs.
+
+    Query params:
+        min_votes: Minimum number of ratings an item needs (default 3)
+        limit: Number of items to return (default 20, max 100)
+    """
+    if kind not in RATING_TABLES:
+        return jsonify({'error': f'Invalid rating kind: {kind}'}), 400
+
+    try:
+        min_votes = int(request.args.get('min_votes', 3))
+    except ValueError:
+        return jsonify({'error': 'min_votes must be an integer'}), 400
+    limit = parse_page_size(request.args.get('limit'))
+
+    return jsonify({'items': fetch_top_rated(kind, min_votes, limit)})
+
+
+if __name__ == '__main__':
+    if '--rebuild-aggregates' in sys.argv:
+        rebuild_rating_aggregates()
+        print("Rating aggregates rebuilt", flush=True)
+    else:
+        print("Usage: python ratings.py --rebuild-aggregates", flush=True)
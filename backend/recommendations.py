@@ -0,0 +1,225 @@
+"""
+"People who have X in their top list also have Y" recommendations.
+
+Each user contributes a basket: the top BASKET_DEPTH songs and artists of
+their latest snapshot in every timeframe. ItemCooccurrence stores, for every
+ordered pair of items, how many users have both in their basket. The counts
+are updated incrementally whenever a snapshot is written: only pairs that
+involve items entering or leaving that user's basket change, so nothing is
+ever recomputed across all users. The (itemType, spotifyId, pairCount) index
+serves an item's top-k neighbors as one short range read.
+
+The full pair matrix is kept, not a precomputed top-k neighbor table. A
+top-k table cannot be maintained from deltas: once a pair drops out of an
+item's top k, the pair that replaces it is only known from the full counts.
+The index read above gives the same top-k answer without that rebuild.
+"""
+from flask import Blueprint, request, jsonify
+from db import get_db
+from pagination import parse_page_size
+
+recommendations_bp = Blueprint('recommendations', __name__)
+
+# How many of the top ranks of each timeframe's snapshot go into a user's basket
+BASKET_DEPTH = 25
+
+# Item table, ID column and ItemCooccurrence.itemType for each item kind
+COOCCURRENCE_SOURCES = {
+    'song': ('TopSong', 'spotifyTrackId'),
+    'artist': ('TopArtist', 'spotifyArtistId'),
+}
+
+# ItemCooccurrence.itemType for each URL segment
+RECOMMENDATION_KINDS = {
+    'songs': 'song',
+    'artists': 'artist',
+}
+
+
+def _latest_snapshot_ids(cursor, userName: str) -> list:
+    """
+    statsIDs of the user's newest snapshot in each timeframe.
+
+    A locking read, so it sees snapshots other transactions committed after
+    this one started rather than the transaction's read view.
+    """
+    stats_ids = []
+    for timeframe in ('short_term', 'medium_term', 'long_term'):
+        cursor.execute("""
+            SELECT uniqueID
+            FROM Stats
+            WHERE userName = %s
+            AND timeframe = %s
+            ORDER BY createdAt DESC, uniqueID DESC
+            LIMIT 1
+            FOR SHARE
+        """, (userName, timeframe))
+        row = cursor.fetchone()
+        if row:
+            stats_ids.append(row[0])
+    return stats_ids
+
+
+def _pairs_involving(changed: set, basket: set) -> set:
+    """All ordered pairs of distinct basket items where at least one side is in `changed`."""
+    pairs = set()
+    for item in changed:
+        for other in basket:
+            if other != item:
+                pairs.add((item, other))
+                pairs.add((other, item))
+    return pairs
+
+
+def cooccurrence_deltas(old_basket: set, new_basket: set) -> tuple:
+    """
+    Pair count changes for a user's basket going from old_basket to new_basket.
+
+    Only pairs touching an item that entered or left the basket change: +1 for
+    new pairs, -1 for pairs that no longer exist. Both directions are included.
+
+    Returns:
+        tuple: (deltas, decremented) where deltas is a list of ((item, neighbor), +1 or -1)
+               and decremented lists the pairs that may have reached zero, both sorted
+               so concurrent updates lock shared rows in the same order
+    """
+    increments = _pairs_involving(new_basket - old_basket, new_basket)
+    decrements = _pairs_involving(old_basket - new_basket, old_basket)
+    deltas = sorted([(pair, 1) for pair in increments] + [(pair, -1) for pair in decrements])
+    return deltas, sorted(decrements)
+
+
+def update_cooccurrence(cursor, userName: str) -> None:
+    """
+    Bring ItemCooccurrence in line with the user's current basket.
+
+    The user's stored baskets are locked before the new basket is read, so
+    concurrent snapshots of one user apply one after the other, and the later
+    one always diffs against what the earlier one stored.
+
+    Args:
+        cursor: Open cursor on the connection that wrote the snapshot
+        userName: The user whose snapshot changed
+    """
+    cursor.execute("""
+        SELECT itemType, spotifyId
+        FROM CooccurrenceBasket
+        WHERE userName = %s
+        FOR UPDATE
+    """, (userName,))
+    old_baskets = {item_type: set() for item_type in COOCCURRENCE_SOURCES}
+    for item_type, spotify_id in cursor.fetchall():
+        old_baskets[item_type].add(spotify_id)
+
+    stats_ids = _latest_snapshot_ids(cursor, userName)
+
+    for item_type, (table, id_column) in COOCCURRENCE_SOURCES.items():
+        new_basket = set()
+        if stats_ids:
+            placeholders = ', '.join(['%s'] * len(stats_ids))
+            cursor.execute(f"""
+                SELECT DISTINCT {id_column}
+                FROM {table}
+                WHERE statsID IN ({placeholders})
+                AND `rank` <= %s
+                AND {id_column} IS NOT NULL
+                FOR SHARE
+            """, (*stats_ids, BASKET_DEPTH))
+            new_basket = {row[0] for row in cursor.fetchall()}
+
+        old_basket = old_baskets[item_type]
+        added = new_basket - old_basket
+        removed = old_basket - new_basket
+        if not added and not removed:
+            continue
+
+        deltas, decrements = cooccurrence_deltas(old_basket, new_basket)
+        if deltas:
+            cursor.executemany("""
+                INSERT INTO ItemCooccurrence (itemType, spotifyId, neighborId, pairCount)
+                VALUES (%s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE pairCount = pairCount + VALUES(pairCount)
+            """, [(item_type, item, neighbor, delta) for (item, neighbor), delta in deltas])
+
+        if decrements:
+            cursor.executemany("""
+                DELETE FROM ItemCooccurrence
+                WHERE itemType = %s
+                AND spotifyId = %s
+                AND neighborId = %s
+                AND pairCount <= 0
+            """, [(item_type, item, neighbor) for item, neighbor in decrements])
+
+        if removed:
+            cursor.executemany("""
+                DELETE FROM CooccurrenceBasket
+                WHERE userName = %s
+                AND itemType = %s
+                AND spotifyId = %s
+            """, [(userName, item_type, spotify_id) for spotify_id in sorted(removed)])
+
+        if added:
+            cursor.executemany("""
+                INSERT INTO CooccurrenceBasket (userName, itemType, spotifyId)
+                VALUES (%s, %s, %s)
+            """, [(userName, item_type, spotify_id) for spotify_id in sorted(added)])
+
+
+def fetch_neighbors(item_type: str, spotify_id: str, limit: int = 10) -> list:
+    """
+    Fetch the items most often found alongside an item in users' top lists.
+
+    Args:
+        item_type: 'song' or 'artist'
+        spotify_id: Spotify ID of the track or artist
+        limit: Number of neighbors to return
+
+    Returns:
+        List of dictionaries, strongest first:
+        {
+            'spotifyId': str,
+            'name': str or None,
+            'artistName': str or None,
+            'imageUrl': str or None,
+            'sharedUsers': int
+        }
+    """
+    conn = get_db()
+    cursor = conn.cursor(dictionary=True)
+
+    try:
+        cursor.execute("""
+            SELECT c.neighborId AS spotifyId, s.name, s.artistName, s.imageUrl, c.pairCount AS sharedUsers
+            FROM ItemCooccurrence c
+            LEFT JOIN SearchCatalog s ON s.itemType = c.itemType AND s.spotifyId = c.neighborId
+            WHERE c.itemType = %s
+            AND c.spotifyId = %s
+            ORDER BY c.pairCount DESC
+            LIMIT %s
+        """, (item_type, spotify_id, limit))
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+@recommendations_bp.route('/api/recommendations/<kind>/<spotify_id>')
+def item_recommendations(kind, spotify_id):
+    """
+    Songs or artists that users with this one in their top lists also have.
+
+    Args:
+        kind: 'songs' or 'artists'
+        spotify_id: Spotify ID of the track or artist
+
+    Query params:
+        limit: Number of recommendations (default 10, max 100)
+    """
+    if kind not in RECOMMENDATION_KINDS:
+        return jsonify({'error': f'Invalid item kind: {kind}'}), 400
+
+    limit = parse_page_size(request.args.get('limit'), default=10)
+    return jsonify({
+        'spotifyId': spotify_id,
+        'recommendations': fetch_neighbors(RECOMMENDATION_KINDS[kind], spotify_id, limit)
+    })
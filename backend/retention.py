@@ -0,0 +1,268 @@
+"""
+Partition maintenance and retention for the RecentlyPlayed table.
+
+RecentlyPlayed is range-partitioned by month on playedAt. This module:
+  - splits p_future into monthly partitions (pYYYYMM) ahead of time, so new
+    plays always land in their own month
+  - rolls partitions that have aged out of the retention window up into
+    RecentlyPlayedMonthly, then drops them (p_start is truncated instead,
+    since it must stay as the catch-all for old imported history)
+
+Dropping a partition is a metadata operation, so retention never rewrites or
+row-by-row deletes the rest of the table. Run it daily, e.g. from cron:
+    python retention.py
+"""
+import re
+from datetime import date
+from db import get_db
+from config import Config
+
+MONTHLY_PARTITION = re.compile(r'^p(\d{4})(\d{2})$')
+
+
+def _add_months(day: date, months: int) -> date:
+    """First day of the month `months` after the month containing `day`."""
+    month_index = day.year * 12 + (day.month - 1) + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def get_partitions(cursor) -> list:
+    """
+    List RecentlyPlayed's partitions in order.
+
+    Returns:
+        List of (partitionName, upperBound) tuples; upperBound is the first
+        date the partition does NOT contain, or None for p_future (MAXVALUE)
+    """
+    cursor.execute("""
+        SELECT PARTITION_NAME,
+               IF(PARTITION_DESCRIPTION = 'MAXVALUE', NULL, DATE(FROM_UNIXTIME(PARTITION_DESCRIPTION)))
+        FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE()
+        AND TABLE_NAME = 'RecentlyPlayed'
+        ORDER BY PARTITION_ORDINAL_POSITION
+    """)
+    return cursor.fetchall()
+
+
+def check_partitioned(partitions: list) -> None:
+    """
+    Raise unless RecentlyPlayed has the p_start/p_future layout retention expects.
+
+    An unpartitioned table has a single information_schema row with a NULL
+    partition name, so it fails this check too.
+    """
+    names = {name for name, _ in partitions}
+    if 'p_start' not in names or 'p_future' not in names:
+        raise RuntimeError(
+            "RecentlyPlayed is not partitioned by month; "
+            "run migrations/002_partition_recently_played.sql first"
+        )
+
+
+def plan_future_partitions(partitions: list, until: date) -> list:
+    """
+    Monthly partitions to split out of p_future so that every month before `until` has one.
+
+    Args:
+        partitions: (partitionName, upperBound) tuples from get_partitions()
+        until: First day of the first month that does not need a partition yet
+
+    Returns:
+        list: (partitionName, upperBound) tuples for the new partitions, in order
+    """
+    next_start = max(upper for _, upper in partitions if upper is not None)
+
+    new_partitions = []
+    while next_start < until:
+        upper = _add_months(next_start, 1)
+        new_partitions.append((f"p{next_start:%Y%m}", upper))
+        next_start = upper
+    return new_partitions
+
+
+def expired_partitions(partitions: list, cutoff: date) -> list:
+    """
+    Names of the partitions that lie entirely before `cutoff` and may be rolled up.
+
+    Only p_start and the monthly pYYYYMM partitions qualify; p_future never does.
+    """
+    return [
+        name for name, upper in partitions
+        if upper is not None and upper <= cutoff
+        and (name == 'p_start' or MONTHLY_PARTITION.match(name))
+    ]
+
+
+def ensure_future_partitions(months_ahead: int = Config.RECENTLY_PLAYED_PARTITIONS_AHEAD) -> list:
+    """
+    Split p_future so every month up to `months_ahead` from now has its own partition.
+
+    Args:
+        months_ahead: How many months past the current one to prepare
+
+    Returns:
+        list: Names of the partitions that were created
+    """
+    conn = get_db()
+    cursor = conn.cursor()
+
+    try:
+        partitions = get_partitions(cursor)
+        check_partitioned(partitions)
+        new_partitions = plan_future_partitions(partitions, _add_months(date.today(), months_ahead + 1))
+
+        if not new_partitions:
+            return []
+
+        definitions = ',\n'.join(
+            f"PARTITION {name} VALUES LESS THAN (UNIX_TIMESTAMP('{upper:%Y-%m-%d} 00:00:00'))"
+            for name, upper in new_partitions
+        )
+        cursor.execute(f"""
+            ALTER TABLE RecentlyPlayed
+            REORGANIZE PARTITION p_future INTO (
+                {definitions},
+                PARTITION p_future VALUES LESS THAN MAXVALUE
+            )
+        """)
+
+        return [name for name, _ in new_partitions]
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def _rollup_partition(cursor, partition_name: str) -> None:
+    """Add one partition's plays to RecentlyPlayedMonthly and mark it as rolled up."""
+    cursor.execute(f"""
+        INSERT INTO RecentlyPlayedMonthly (userName, month, songName, artistName, albumName, spotifyTrackId, playCount, msPlayed)
+        SELECT userName,
+               DATE_FORMAT(playedAt, '%Y-%m-01'),
+               songName,
+               COALESCE(artistName, ''),
+               MAX(albumName),
+               MAX(spotifyTrackId),
+               COUNT(*),
+               COALESCE(SUM(msPlayed), 0)
+        FROM RecentlyPlayed PARTITION ({partition_name})
+        GROUP BY userName, DATE_FORMAT(playedAt, '%Y-%m-01'), songName, COALESCE(artistName, '')
+        ON DUPLICATE KEY UPDATE
+            playCount = playCount + VALUES(playCount),
+            msPlayed = msPlayed + VALUES(msPlayed),
+            albumName = COALESCE(albumName, VALUES(albumName)),
+            spotifyTrackId = COALESCE(spotifyTrackId, VALUES(spotifyTrackId))
+    """)
+    cursor.execute(f"""
+        INSERT INTO RecentlyPlayedRollup (partitionName)
+        VALUES ('{partition_name}')
+    """)
+
+
+def rollup_expired_partitions(retention_months: int = Config.RECENTLY_PLAYED_RETENTION_MONTHS) -> list:
+    """
+    Roll up and remove every partition that lies entirely before the retention window.
+
+    Each partition's rollup commits together with a RecentlyPlayedRollup marker
+    before the partition is dropped. If a run dies in between, the next run
+    sees the marker and only finishes the drop, so no month is counted twice.
+
+    Args:
+        retention_months: How many months of raw plays to keep (current month included)
+
+    Returns:
+        list: Names of the partitions that were rolled up
+    """
+    cutoff = _add_months(date.today(), -retention_months + 1)
+
+    conn = get_db()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute("SELECT partitionName FROM RecentlyPlayedRollup")
+        already_rolled_up = {row[0] for row in cursor.fetchall()}
+
+        partitions = get_partitions(cursor)
+        check_partitioned(partitions)
+
+        removed = []
+        for name in expired_partitions(partitions, cutoff):
+            if name not in already_rolled_up:
+                try:
+                    _rollup_partition(cursor, name)
+                    conn.commit()
+                except Exception as e:
+                    conn.rollback()
+                    raise e
+
+            # DDL commits implicitly; the catch-all p_start is emptied rather than dropped
+            if name == 'p_start':
+                cursor.execute("ALTER TABLE RecentlyPlayed TRUNCATE PARTITION p_start")
+            else:
+                cursor.execute(f"ALTER TABLE RecentlyPlayed DROP PARTITION {name}")
+
+            cursor.execute("DELETE FROM RecentlyPlayedRollup WHERE partitionName = %s", (name,))
+            # Any user may have had plays in the partition
+            cursor.execute("UPDATE RecentlyPlayedVersion SET version = version + 1")
+            conn.commit()
+            removed.append(name)
+
+        return removed
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def delete_user_plays(cursor, userName: str) -> None:
+    """
+    Delete a user's plays, monthly rollups and play version row.
+
+    Uses the caller's cursor, so it commits together with the user's own delete.
+    """
+    for table in ['RecentlyPlayed', 'RecentlyPlayedMonthly', 'RecentlyPlayedVersion']:
+        cursor.execute(f"DELETE FROM {table} WHERE userName = %s", (userName,))
+
+
+def purge_deleted_users() -> list:
+    """
+    Delete the play history of every user that no longer has a User row.
+
+    Returns:
+        list: userNames whose plays were deleted
+    """
+    conn = get_db()
+    cursor = conn.cursor()
+
+    try:
+        # unique_play leads with userName, so this reads one index entry per user
+        cursor.execute("""
+            SELECT DISTINCT rp.userName
+            FROM RecentlyPlayed rp
+            LEFT JOIN User u ON u.userName = rp.userName
+            WHERE u.userName IS NULL
+        """)
+        deleted = [row[0] for row in cursor.fetchall()]
+
+        for userName in deleted:
+            try:
+                delete_user_plays(cursor, userName)
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                raise e
+
+        return deleted
+    finally:
+        cursor.close()
+        conn.close()
+
+
+if __name__ == '__main__':
+    created = ensure_future_partitions()
+    print(f"Created partitions: {', '.join(created) or 'none'}", flush=True)
+
+    removed = rollup_expired_partitions()
+    print(f"Rolled up partitions: {', '.join(removed) or 'none'}", flush=True)
+
+    purged = purge_deleted_users()
+    print(f"Purged plays of deleted users: {', '.join(purged) or 'none'}", flush=True)
@@ -24,7 +24,9 @@ CREATE TABLE IF NOT EXISTS Stats (
     timeframe ENUM('short_term', 'medium_term', 'long_term') NOT NULL,
     totalMinutes INT DEFAULT 0,
     createdAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    FOREIGN KEY (userName) REFERENCES User(userName) ON DELETE CASCADE
+    FOREIGN KEY (userName) REFERENCES User(userName) ON DELETE CASCADE,
+    -- Keyset pagination over a user's snapshot history (see history.py)
+    INDEX idx_stats_user_timeframe_created (userName, timeframe, createdAt, uniqueID)
 );
 
 -- TopArtist table
@@ -36,7 +38,8 @@ CREATE TABLE IF NOT EXISTS TopArtist (
     `rank` INT,
     playCount INT DEFAULT 0,
     imageUrl VARCHAR(512),
-    FOREIGN KEY (statsID) REFERENCES Stats(uniqueID) ON DELETE CASCADE
+    FOREIGN KEY (statsID) REFERENCES Stats(uniqueID) ON DELETE CASCADE,
+    INDEX idx_topartist_stats_rank (statsID, `rank`)
 );
 
 -- TopAlbum table
@@ -49,7 +52,8 @@ CREATE TABLE IF NOT EXISTS TopAlbum (
     `rank` INT,
     playCount INT DEFAULT 0,
     imageUrl VARCHAR(512),
-    FOREIGN KEY (statsID) REFERENCES Stats(uniqueID) ON DELETE CASCADE
+    FOREIGN KEY (statsID) REFERENCES Stats(uniqueID) ON DELETE CASCADE,
+    INDEX idx_topalbum_stats_rank (statsID, `rank`)
 );
 
 -- TopSong table
@@ -62,6 +66,24 @@ CREATE TABLE IF NOT EXISTS TopSong (
     `rank` INT,
     playCount INT DEFAULT 0,
     imageUrl VARCHAR(512),
+    FOREIGN KEY (statsID) REFERENCES Stats(uniqueID) ON DELETE CASCADE,
+    INDEX idx_topsong_stats_rank (statsID, `rank`)
+);
+
+-- RankHistory table
+-- One compact series per (user, timeframe, item), appended whenever a snapshot
+-- is written. The primary key clusters each series so a trend chart reads a
+-- single contiguous range instead of joining every TopSong/TopAlbum/TopArtist row.
+CREATE TABLE IF NOT EXISTS RankHistory (
+    userName VARCHAR(255) NOT NULL,
+    timeframe ENUM('short_term', 'medium_term', 'long_term') NOT NULL,
+    itemType ENUM('song', 'album', 'artist') NOT NULL,
+    spotifyId VARCHAR(255) NOT NULL,
+    recordedAt TIMESTAMP NOT NULL,
+    statsID INT NOT NULL,
+    `rank` INT NOT NULL,
+    PRIMARY KEY (userName, timeframe, itemType, spotifyId, recordedAt, statsID),
+    FOREIGN KEY (userName) REFERENCES User(userName) ON DELETE CASCADE,
     FOREIGN KEY (statsID) REFERENCES Stats(uniqueID) ON DELETE CASCADE
 );
 
@@ -76,7 +98,9 @@ CREATE TABLE IF NOT EXISTS RatedAlbum (
     comment TEXT,
     createdAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updatedAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-    FOREIGN KEY (userName) REFERENCES User(userName) ON DELETE CASCADE
+    FOREIGN KEY (userName) REFERENCES User(userName) ON DELETE CASCADE,
+    UNIQUE KEY unique_album_rating (userName, spotifyAlbumId),
+    INDEX idx_ratedalbum_user_updated (userName, updatedAt)
 );
 
 -- RatedSong table
@@ -90,21 +114,95 @@ CREATE TABLE IF NOT EXISTS RatedSong (
     comment TEXT,
     createdAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updatedAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-    FOREIGN KEY (userName) REFERENCES User(userName) ON DELETE CASCADE
+    FOREIGN KEY (userName) REFERENCES User(userName) ON DELETE CASCADE,
+    UNIQUE KEY unique_song_rating (userName, spotifyTrackId),
+    INDEX idx_ratedsong_user_updated (userName, updatedAt)
+);
+
+-- AlbumRatingAggregate table
+-- Community rating totals per album, updated in the same transaction as every
+-- RatedAlbum insert, update or delete (see ratings.py). distribution maps the
+-- whole-number part of each rating to its vote count.
+CREATE TABLE IF NOT EXISTS AlbumRatingAggregate (
+    spotifyAlbumId VARCHAR(255) PRIMARY KEY,
+    albumName VARCHAR(255),
+    artistName VARCHAR(255),
+    ratingCount INT NOT NULL DEFAULT 0,
+    ratingSum DECIMAL(12,1) NOT NULL DEFAULT 0,
+    distribution JSON NOT NULL,
+    avgRating DECIMAL(5,3) AS (IF(ratingCount > 0, ratingSum / ratingCount, NULL)) STORED,
+    INDEX idx_album_rating_leaderboard (avgRating, ratingCount)
+);
+
+-- SongRatingAggregate table
+CREATE TABLE IF NOT EXISTS SongRatingAggregate (
+    spotifyTrackId VARCHAR(255) PRIMARY KEY,
+    songName VARCHAR(255),
+    artistName VARCHAR(255),
+    ratingCount INT NOT NULL DEFAULT 0,
+    ratingSum DECIMAL(12,1) NOT NULL DEFAULT 0,
+    distribution JSON NOT NULL,
+    avgRating DECIMAL(5,3) AS (IF(ratingCount > 0, ratingSum / ratingCount, NULL)) STORED,
+    INDEX idx_song_rating_leaderboard (avgRating, ratingCount)
 );
 
 -- RecentlyPlayed table
+-- Partitioned by month on playedAt so range queries only touch the months they
+-- need. Old months are rolled up into RecentlyPlayedMonthly and then dropped
+-- as whole partitions (see retention.py). retention.py also splits
+-- p_future into monthly partitions ahead of time.
+-- MySQL does not allow foreign keys on partitioned tables (retention.py deletes
+-- the plays of deleted users instead), and every unique key must include playedAt. unique_play also serves as the (userName, playedAt) index.
 CREATE TABLE IF NOT EXISTS RecentlyPlayed (
-    id INT AUTO_INCREMENT PRIMARY KEY,
+    id INT AUTO_INCREMENT,
     userName VARCHAR(255) NOT NULL,
-    songName VARCHAR(255),
+    songName VARCHAR(255) NOT NULL,
     artistName VARCHAR(255),
     albumName VARCHAR(255),
     spotifyTrackId VARCHAR(255),
-    playedAt TIMESTAMP,
+    playedAt TIMESTAMP NOT NULL,
+    msPlayed INT,
+    PRIMARY KEY (id, playedAt),
+    -- Lets repeated imports and API syncs skip plays that are already stored
+    UNIQUE KEY unique_play (userName, playedAt, songName)
+)
+PARTITION BY RANGE (UNIX_TIMESTAMP(playedAt)) (
+    PARTITION p_start VALUES LESS THAN (UNIX_TIMESTAMP('2020-01-01 00:00:00')),
+    PARTITION p_future VALUES LESS THAN MAXVALUE
+);
+
+-- RecentlyPlayedVersion table
+-- Bumped whenever a user's RecentlyPlayed rows change, so caches built from a
+-- user's plays (see listening_patterns.py) are validated by a primary key read
+CREATE TABLE IF NOT EXISTS RecentlyPlayedVersion (
+    userName VARCHAR(255) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0,
+    FOREIGN KEY (userName) REFERENCES User(userName) ON DELETE CASCADE
+);
+
+-- RecentlyPlayedMonthly table
+-- Compact per-month play counts for RecentlyPlayed partitions past the retention window
+CREATE TABLE IF NOT EXISTS RecentlyPlayedMonthly (
+    userName VARCHAR(255) NOT NULL,
+    month DATE NOT NULL,
+    songName VARCHAR(255) NOT NULL,
+    artistName VARCHAR(255) NOT NULL DEFAULT '',
+    albumName VARCHAR(255),
+    spotifyTrackId VARCHAR(255),
+    playCount INT NOT NULL DEFAULT 0,
+    msPlayed BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (userName, month, songName, artistName),
     FOREIGN KEY (userName) REFERENCES User(userName) ON DELETE CASCADE
 );
 
+-- RecentlyPlayedRollup table
+-- Partitions whose rows have been rolled up but not yet dropped/truncated,
+-- so an interrupted retention run never counts a month twice
+CREATE TABLE IF NOT EXISTS RecentlyPlayedRollup (
+    partitionName VARCHAR(64) PRIMARY KEY,
+    rolledUpAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
 -- FeaturedSong table
 CREATE TABLE IF NOT EXISTS FeaturedSong (
     id INT AUTO_INCREMENT PRIMARY KEY,
@@ -116,3 +214,93 @@ CREATE TABLE IF NOT EXISTS FeaturedSong (
     imageUrl VARCHAR(512),
     FOREIGN KEY (userName) REFERENCES User(userName) ON DELETE CASCADE
 );
+
+-- SearchCatalog table
+-- One row per distinct song, album or artist seen in Top*, Rated* or FeaturedSong
+-- rows, maintained incrementally as those rows are written (see search.py).
+-- popularity is the number of distinct users who have the item.
+CREATE TABLE IF NOT EXISTS SearchCatalog (
+    itemType ENUM('song', 'album', 'artist') NOT NULL,
+    spotifyId VARCHAR(255) NOT NULL,
+    name VARCHAR(255) NOT NULL,
+    artistName VARCHAR(255),
+    imageUrl VARCHAR(512),
+    popularity INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (itemType, spotifyId),
+    FULLTEXT INDEX ft_search_catalog (name, artistName) WITH PARSER ngram
+);
+
+-- SearchCatalogUser table (which users have counted towards SearchCatalog.popularity)
+CREATE TABLE IF NOT EXISTS SearchCatalogUser (
+    itemType ENUM('song', 'album', 'artist') NOT NULL,
+    spotifyId VARCHAR(255) NOT NULL,
+    userName VARCHAR(255) NOT NULL,
+    PRIMARY KEY (itemType, spotifyId, userName),
+    INDEX idx_search_catalog_user (userName, itemType, spotifyId),
+    FOREIGN KEY (userName) REFERENCES User(userName) ON DELETE CASCADE
+);
+
+-- FeedItem table
+-- Friend activity fanned out on write: one row per (feed owner, activity),
+-- trimmed to the newest 500 per owner (see feed.py). Users with very many
+-- followers are not fanned out and are merged in on read instead.
+CREATE TABLE IF NOT EXISTS FeedItem (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    ownerUserName VARCHAR(255) NOT NULL,
+    actorUserName VARCHAR(255) NOT NULL,
+    activityType ENUM('play', 'album_rating', 'song_rating') NOT NULL,
+    itemName VARCHAR(255),
+    artistName VARCHAR(255),
+    spotifyId VARCHAR(255),
+    rating DECIMAL(3,1),
+    occurredAt TIMESTAMP NOT NULL,
+    INDEX idx_feed_owner_time (ownerUserName, occurredAt, id),
+    FOREIGN KEY (ownerUserName) REFERENCES User(userName) ON DELETE CASCADE,
+    FOREIGN KEY (actorUserName) REFERENCES User(userName) ON DELETE CASCADE
+);
+
+-- CooccurrenceBasket table
+-- The songs/artists each user currently contributes to ItemCooccurrence
+-- (top ranks of their latest snapshot per timeframe, see recommendations.py)
+CREATE TABLE IF NOT EXISTS CooccurrenceBasket (
+    userName VARCHAR(255) NOT NULL,
+    itemType ENUM('song', 'artist') NOT NULL,
+    spotifyId VARCHAR(255) NOT NULL,
+    PRIMARY KEY (userName, itemType, spotifyId),
+    FOREIGN KEY (userName) REFERENCES User(userName) ON DELETE CASCADE
+);
+
+-- ItemCooccurrence table
+-- Sparse item x item matrix: number of users whose basket holds both items.
+-- Stored in both directions so an item's top-k neighbors are one index range.
+CREATE TABLE IF NOT EXISTS ItemCooccurrence (
+    itemType ENUM('song', 'artist') NOT NULL,
+    spotifyId VARCHAR(255) NOT NULL,
+    neighborId VARCHAR(255) NOT NULL,
+    pairCount INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (itemType, spotifyId, neighborId),
+    INDEX idx_cooccurrence_top (itemType, spotifyId, pairCount)
+);
+
+-- GlobalLeaderboard table
+-- Rank-weighted totals over every user's latest snapshot per timeframe
+-- (see leaderboards.py); charts are read straight off idx_leaderboard_score
+CREATE TABLE IF NOT EXISTS GlobalLeaderboard (
+    timeframe ENUM('short_term', 'medium_term', 'long_term') NOT NULL,
+    itemType ENUM('song', 'album', 'artist') NOT NULL,
+    spotifyId VARCHAR(255) NOT NULL,
+    score INT NOT NULL DEFAULT 0,
+    userCount INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (timeframe, itemType, spotifyId),
+    INDEX idx_leaderboard_score (timeframe, itemType, score)
+);
+
+-- LeaderboardContribution table
+-- Which snapshot each user currently contributes to GlobalLeaderboard
+CREATE TABLE IF NOT EXISTS LeaderboardContribution (
+    userName VARCHAR(255) NOT NULL,
+    timeframe ENUM('short_term', 'medium_term', 'long_term') NOT NULL,
+    statsID INT NOT NULL,
+    PRIMARY KEY (userName, timeframe),
+    FOREIGN KEY (userName) REFERENCES User(userName) ON DELETE CASCADE
+);
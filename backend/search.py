@@ -0,0 +1,240 @@
+"""
+Type-ahead search over every song, album and artist the app has stored.
+
+SearchCatalog holds one row per distinct Spotify item with an n-gram FULLTEXT
+index on its name and artist. It is filled incrementally from the same
+transactions that write TopSong/TopAlbum/TopArtist and RatedAlbum/RatedSong
+rows. popularity counts the distinct users who have the item, so results can
+be ranked without calling Spotify.
+"""
+import sys
+from flask import Blueprint, request, jsonify
+from db import get_db
+from pagination import parse_page_size
+
+search_bp = Blueprint('search', __name__)
+
+SEARCH_ITEM_TYPES = ['song', 'album', 'artist']
+
+# InnoDB's ngram parser splits text into tokens of this many characters
+# (ngram_token_size), so shorter queries cannot match anything
+MIN_QUERY_LENGTH = 2
+
+
+def index_catalog_items(cursor, userName: str, item_type: str, items: list, id_key: str, name_key: str) -> None:
+    """
+    Add items to the search catalog and count this user towards their popularity.
+
+    Args:
+        cursor: Open cursor on the connection doing the insert
+        userName: The user the items belong to
+        item_type: 'song', 'album', or 'artist'
+        items: Item dictionaries (e.g. from fetch_all_top_songs())
+        id_key: Dictionary key holding the Spotify ID ('spotifyTrackId', ...)
+        name_key: Dictionary key holding the display name ('songName', ...)
+    """
+    unique_items = {}
+    for item in items:
+        if item.get(id_key) and item.get(name_key):
+            unique_items.setdefault(item[id_key], item)
+    if not unique_items:
+        return
+
+    # Catalog rows are shared between users; touching them in key order keeps
+    # concurrent writers from locking the same rows in opposite orders
+    unique_items = dict(sorted(unique_items.items()))
+
+    cursor.executemany("""
+        INSERT INTO SearchCatalog (itemType, spotifyId, name, artistName, imageUrl)
+        VALUES (%s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            name = VALUES(name),
+            artistName = COALESCE(VALUES(artistName), artistName),
+            imageUrl = COALESCE(VALUES(imageUrl), imageUrl)
+    """, [
+        (item_type, spotify_id, item[name_key], item.get('artistName'), item.get('imageUrl'))
+        for spotify_id, item in unique_items.items()
+    ])
+
+    # Only items this user did not already have raise the popularity count
+    placeholders = ', '.join(['%s'] * len(unique_items))
+    cursor.execute(f"""
+        SELECT spotifyId
+        FROM SearchCatalogUser
+        WHERE itemType = %s
+        AND userName = %s
+        AND spotifyId IN ({placeholders})
+    """, (item_type, userName, *unique_items.keys()))
+    known_ids = {row[0] for row in cursor.fetchall()}
+    new_ids = [spotify_id for spotify_id in unique_items if spotify_id not in known_ids]
+    if not new_ids:
+        return
+
+    cursor.executemany("""
+        INSERT IGNORE INTO SearchCatalogUser (itemType, spotifyId, userName)
+        VALUES (%s, %s, %s)
+    """, [(item_type, spotify_id, userName) for spotify_id in new_ids])
+
+    cursor.executemany("""
+        UPDATE SearchCatalog
+        SET popularity = popularity + 1
+        WHERE itemType = %s
+        AND spotifyId = %s
+    """, [(item_type, spotify_id) for spotify_id in new_ids])
+
+
+def _boolean_mode_query(query: str) -> str:
+    """
+    Turn free text into a BOOLEAN MODE query that requires every word.
+
+    Each word is quoted so the ngram parser matches it as a phrase of n-grams,
+    which makes partial words ("radi" -> "Radiohead") match as well.
+    """
+    words = [word.replace('"', '') for word in query.split()]
+    return ' '.join(f'+"{word}"' for word in words if word)
+
+
+def search_catalog(query: str, item_type=None, limit: int = 10) -> list:
+    """
+    Search stored songs, albums and artists by name or artist name.
+
+    Args:
+        query: Text the user has typed so far
+        item_type: Optional 'song', 'album', or 'artist' filter
+        limit: Maximum number of results
+
+    Returns:
+        List of result dictionaries, most popular first:
+        {
+            'itemType': str,
+            'spotifyId': str,
+            'name': str,
+            'artistName': str,
+            'imageUrl': str,
+            'popularity': int
+        }
+    """
+    boolean_query = _boolean_mode_query(query)
+    if len(query.strip()) < MIN_QUERY_LENGTH or not boolean_query:
+        return []
+
+    conn = get_db()
+    cursor = conn.cursor(dictionary=True)
+
+    try:
+        type_filter = "AND itemType = %s" if item_type else ""
+        params = [boolean_query, boolean_query]
+        if item_type:
+            params.append(item_type)
+        params.append(limit)
+
+        cursor.execute(f"""
+            SELECT itemType, spotifyId, name, artistName, imageUrl, popularity,
+                   MATCH(name, artistName) AGAINST (%s IN BOOLEAN MODE) AS relevance
+            FROM SearchCatalog
+            WHERE MATCH(name, artistName) AGAINST (%s IN BOOLEAN MODE)
+            {type_filter}
+            ORDER BY popularity DESC, relevance DESC
+            LIMIT %s
+        """, params)
+
+        results = cursor.fetchall()
+        for result in results:
+            del result['relevance']
+        return results
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def rebuild_search_catalog() -> None:
+    """
+    Backfill SearchCatalog and SearchCatalogUser from every table that stores item names.
+
+    New rows are indexed as they are written, so this only needs to run once for
+    data that existed before the catalog did (FeaturedSong included).
+    """
+    # (itemType, source query yielding userName, spotifyId, name, artistName, imageUrl)
+    sources = [
+        ('song', """SELECT s.userName, t.spotifyTrackId, t.songName, t.artistName, t.imageUrl
+                    FROM TopSong t JOIN Stats s ON s.uniqueID = t.statsID"""),
+        ('album', """SELECT s.userName, t.spotifyAlbumId, t.albumName, t.artistName, t.imageUrl
+                     FROM TopAlbum t JOIN Stats s ON s.uniqueID = t.statsID"""),
+        ('artist', """SELECT s.userName, t.spotifyArtistId, t.artistName, NULL, t.imageUrl
+                      FROM TopArtist t JOIN Stats s ON s.uniqueID = t.statsID"""),
+        ('album', """SELECT userName, spotifyAlbumId, albumName, artistName, NULL
+                     FROM RatedAlbum"""),
+        ('song', """SELECT userName, spotifyTrackId, songName, artistName, NULL
+                    FROM RatedSong"""),
+        ('song', """SELECT userName, spotifyTrackId, songName, artistName, imageUrl
+                    FROM FeaturedSong"""),
+    ]
+
+    conn = get_db()
+    cursor = conn.cursor()
+
+    try:
+        for item_type, source in sources:
+            cursor.execute(f"""
+                INSERT INTO SearchCatalog (itemType, spotifyId, name, artistName, imageUrl)
+                SELECT %s, src.spotifyId, MAX(src.name), MAX(src.artistName), MAX(src.imageUrl)
+                FROM ({source}) AS src (userName, spotifyId, name, artistName, imageUrl)
+                WHERE src.spotifyId IS NOT NULL AND src.name IS NOT NULL
+                GROUP BY src.spotifyId
+                ON DUPLICATE KEY UPDATE
+                    name = VALUES(name),
+                    artistName = COALESCE(VALUES(artistName), SearchCatalog.artistName),
+                    imageUrl = COALESCE(VALUES(imageUrl), SearchCatalog.imageUrl)
+            """, (item_type,))
+
+            cursor.execute(f"""
+                INSERT IGNORE INTO SearchCatalogUser (itemType, spotifyId, userName)
+                SELECT DISTINCT %s, src.spotifyId, src.userName
+                FROM ({source}) AS src (userName, spotifyId, name, artistName, imageUrl)
+                WHERE src.spotifyId IS NOT NULL AND src.name IS NOT NULL
+            """, (item_type,))
+
+        cursor.execute("""
+            UPDATE SearchCatalog c
+            JOIN (
+                SELECT itemType, spotifyId, COUNT(*) AS users
+                FROM SearchCatalogUser
+                GROUP BY itemType, spotifyId
+            ) u ON u.itemType = c.itemType AND u.spotifyId = c.spotifyId
+            SET c.popularity = u.users
+        """)
+
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        raise e
+    finally:
+        cursor.close()
+        conn.close()
+
+
+@search_bp.route('/api/search')
+def search():
+    """
+    Type-ahead search across stored songs, albums and artists.
+
+    Query params:
+        q: Search text (at least 2 characters)
+        type: Optional 'song', 'album', or 'artist' filter
+        limit: Number of results (default 10, max 100)
+    """
+    query = request.args.get('q', '')
+    item_type = request.args.get('type')
+    if item_type and item_type not in SEARCH_ITEM_TYPES:
+        return jsonify({'error': f'Invalid type: {item_type}'}), 400
+
+    limit = parse_page_size(request.args.get('limit'), default=10)
+    return jsonify({'query': query, 'results': search_catalog(query, item_type, limit)})
+
+
+if __name__ == '__main__':
+    if '--rebuild' in sys.argv:
+        rebuild_search_catalog()
+        print("Search catalog rebuilt", flush=True)
+    else:
+        print("Usage: python search.py --rebuild", flush=True)
@@ -1,20 +1,67 @@
 from flask import Blueprint, session, redirect
+import queue
+import threading
 import spotipy
 from db import get_db
-from auth import get_authenticated_spotify_client
+from auth import get_authenticated_spotify_client, get_spotify_client_for_token
 from db_insert import *
+from history import fetch_snapshot_items, get_stats_snapshot
+from circuit_breaker import spotify_breaker, CircuitOpenError
+from config import Config
+from http_cache import client_has_etag, with_etag, not_modified
+from profiling import waiting_on
 
 stats_bp = Blueprint('stats', __name__)
 
-def fetch_all_top_songs(sp: spotipy.Spotify, time_range: str, batch_size: int = 50) -> list:
+# Timeframe display names
+TIMEFRAME_NAMES = {
+    'short_term': 'Last 4 Weeks',
+    'medium_term': 'Last 6 Months',
+    'long_term': 'All Time'
+}
+
+# Pages fetched ahead of the database writer in stream_stats_snapshot()
+SNAPSHOT_PIPELINE_DEPTH = 2
+
+# Served with a 503 when Spotify is down and there is no snapshot to fall back on
+SPOTIFY_UNAVAILABLE_HTML = "<p>Spotify is unavailable right now. Please try again in a minute.</p>"
+
+# (userName, timeframe) pairs with a background refresh in flight
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+def iter_top_track_pages(sp: spotipy.Spotify, time_range: str, batch_size: int = 50):
     """
-    Fetch all top songs for a given time range and extract data for TopSong table.
+    Page through the user's top tracks, yielding one page of raw track objects at a time.
 
     Args:
         sp: Authenticated Spotify client instance
         time_range: 'short_term' (4 weeks), 'medium_term' (6 months), or 'long_term' (several years)
         batch_size: Number of items to fetch per request (default 50, max 50)
 
+    Yields:
+        list: Raw track objects from one API response
+    """
+    offset = 0
+
+    while True:
+        batch = sp.current_user_top_tracks(limit=batch_size, offset=offset, time_range=time_range)
+        yield batch['items']
+
+        # Check to see if we got all available tracks
+        if len(batch['items']) < batch_size:
+            break
+
+        offset += batch_size
+
+def normalize_top_songs(tracks: list, first_rank: int) -> list:
+    """
+    Convert raw track objects into TopSong row dictionaries.
+
+    Args:
+        tracks: Raw track objects from one page of top tracks
+        first_rank: Rank of the first track on this page
+
     Returns:
         List of dictionaries containing song data formatted for database insertion:
         {
@@ -26,32 +73,91 @@ def fetch_all_top_songs(sp: spotipy.Spotify, time_range: str, batch_size: int =
             'playCount': int (defaults to 0 as Spotify doesn't provide this)
         }
     """
-    songs = []
-    offset = 0
+    return [{
+        'songName': track['name'],
+        'artistName': track['artists'][0]['name'] if track.get('artists') else 'Unknown Artist',
+        'spotifyTrackId': track['id'],
+        'rank': rank,
+        'imageUrl': track['album']['images'][0]['url'] if track.get('album', {}).get('images') else None,
+        'playCount': 0  # Spotify API doesn't provide play counts for top tracks
+    } for rank, track in enumerate(tracks, start=first_rank)]
+
+def iter_top_songs(sp: spotipy.Spotify, time_range: str, batch_size: int = 50):
+    """
+    Yield the user's top songs page by page, formatted for the TopSong table.
+
+    Yields:
+        list: Song dictionaries (see normalize_top_songs()) for one page
+    """
     rank = 1
+    for tracks in iter_top_track_pages(sp, time_range, batch_size):
+        yield normalize_top_songs(tracks, rank)
+        rank += len(tracks)
 
-    while True:
-        batch = sp.current_user_top_tracks(limit=batch_size, offset=offset, time_range=time_range)
+def fetch_all_top_songs(sp: spotipy.Spotify, time_range: str, batch_size: int = 50) -> list:
+    """
+    Fetch all top songs for a given time range and extract data for TopSong table.
 
-        for track in batch['items']:
-            song_data = {
-                'songName': track['name'],
-                'artistName': track['artists'][0]['name'] if track.get('artists') else 'Unknown Artist',
-                'spotifyTrackId': track['id'],
-                'rank': rank,
-                'imageUrl': track['album']['images'][0]['url'] if track.get('album', {}).get('images') else None,
-                'playCount': 0  # Spotify API doesn't provide play counts for top tracks
-            }
-            songs.append(song_data)
-            rank += 1
+    Args:
+        sp: Authenticated Spotify client instance
+        time_range: 'short_term' (4 weeks), 'medium_term' (6 months), or 'long_term' (several years)
+        batch_size: Number of items to fetch per request (default 50, max 50)
 
-        # Check to see if we got all available tracks
-        if len(batch['items']) < batch_size:
-            break
+    Returns:
+        List of song dictionaries (see normalize_top_songs())
+    """
+    songs = []
+    for page in iter_top_songs(sp, time_range, batch_size):
+        songs.extend(page)
+    return songs
 
-        offset += batch_size
+class AlbumRanking:
+    """
+    Incrementally ranks albums by how many of the user's top tracks they contain.
 
-    return songs
+    Only per-album counts and display info are kept, not the tracks themselves,
+    so pages of tracks can be discarded as soon as they have been added.
+    """
+
+    def __init__(self):
+        self.album_track_count = {}
+        self.album_info = {}
+
+    def add_tracks(self, tracks: list) -> None:
+        """Count one page of raw track objects towards their albums."""
+        for track in tracks:
+            album = track.get('album')
+            if not album:
+                continue  # Skip tracks without album data
+
+            album_id = album.get('id')
+            if not album_id:
+                continue
+
+            # Count tracks per album
+            self.album_track_count[album_id] = self.album_track_count.get(album_id, 0) + 1
+
+            # Store album info (only once per album)
+            if album_id not in self.album_info:
+                self.album_info[album_id] = {
+                    'albumName': album.get('name'),
+                    'artistName': album['artists'][0]['name'] if album.get('artists') else 'Unknown Artist',
+                    'spotifyAlbumId': album_id,
+                    'imageUrl': album['images'][0]['url'] if album.get('images') else None,
+                    'playCount': 0  # Spotify doesn't provide play counts
+                }
+
+    def ranked(self) -> list:
+        """Albums sorted by track count (descending), formatted for the TopAlbum table."""
+        sorted_album_ids = sorted(self.album_track_count.keys(), key=lambda aid: self.album_track_count[aid], reverse=True)
+
+        albums = []
+        for rank, album_id in enumerate(sorted_album_ids, start=1):
+            album_data = self.album_info[album_id].copy()
+            album_data['rank'] = rank
+            albums.append(album_data)
+
+        return albums
 
 def fetch_all_top_albums(sp: spotipy.Spotify, time_range: str, batch_size: int = 50) -> list:
     """
@@ -66,55 +172,10 @@ def fetch_all_top_albums(sp: spotipy.Spotify, time_range: str, batch_size: int =
     Returns:
        List of album dictionaries formatted for database insertion, ranked by track count
     """
-    # Fetch all top tracks using pagination
-    tracks = []
-    offset = 0
-
-    while True:
-        batch = sp.current_user_top_tracks(limit=batch_size, offset=offset, time_range=time_range)
-        tracks.extend(batch['items'])
-
-        if len(batch['items']) < batch_size:
-            break
-
-        offset += batch_size
-
-    # Count how many tracks come from each album
-    album_track_count = {}
-    album_info = {}
-
-    for track in tracks:
-        album = track.get('album')
-        if not album:
-            continue  # Skip tracks without album data
-
-        album_id = album.get('id')
-        if not album_id:
-            continue
-
-        # Count tracks per album
-        album_track_count[album_id] = album_track_count.get(album_id, 0) + 1
-
-        # Store album info (only once per album)
-        if album_id not in album_info:
-            album_info[album_id] = {
-                'albumName': album.get('name'),
-                'artistName': album['artists'][0]['name'] if album.get('artists') else 'Unknown Artist',
-                'spotifyAlbumId': album_id,
-                'imageUrl': album['images'][0]['url'] if album.get('images') else None,
-                'playCount': 0  # Spotify doesn't provide play counts
-            }
-
-    # Sort albums by track count (descending) and create ranked list
-    sorted_album_ids = sorted(album_track_count.keys(), key=lambda aid: album_track_count[aid], reverse=True)
-
-    albums = []
-    for rank, album_id in enumerate(sorted_album_ids, start=1):
-        album_data = album_info[album_id].copy()
-        album_data['rank'] = rank
-        albums.append(album_data)
-
-    return albums
+    ranking = AlbumRanking()
+    for tracks in iter_top_track_pages(sp, time_range, batch_size):
+        ranking.add_tracks(tracks)
+    return ranking.ranked()
 
 def get_cached_stats_id(userName: str, timeframe: str, max_age_hours: int = 24):
     """
@@ -155,133 +216,325 @@ def get_cached_stats_id(userName: str, timeframe: str, max_age_hours: int = 24):
         cursor.close()
         conn.close()
 
-def fetch_all_top_artists(sp: spotipy.Spotify, time_range: str, batch_size: int = 50) -> list:
+def iter_top_artists(sp: spotipy.Spotify, time_range: str, batch_size: int = 50):
     """
-    Fetch all top artists for a given time range and extract data for TopArtist table.
+    Yield the user's top artists page by page, formatted for the TopArtist table.
 
     Args:
         sp: Authenticated Spotify client instance
         time_range: 'short_term' (4 weeks), 'medium_term' (6 months), or 'long_term' (several years)
         batch_size: Number of items to fetch per request (default 50, max 50)
 
-    Returns:
-        List of dictionaries containing song data formatted for database insertion:
+    Yields:
+        List of dictionaries containing artist data formatted for database insertion:
         {
             'artistName': str,
-            'spotifyTrackId': str,
+            'spotifyArtistId': str,
             'rank': int,
             'imageUrl': str,
             'playCount': int (defaults to 0 as Spotify doesn't provide this)
         }
     """
-    artists = []
     offset = 0
     rank = 1
 
     while True:
         batch = sp.current_user_top_artists(limit=batch_size, offset=offset, time_range=time_range)
 
+        artists = []
         for artist in batch['items']:
-            song_data = {
+            artists.append({
                 'artistName': artist['name'],
                 'spotifyArtistId': artist['id'],
                 'rank': rank,
                 'imageUrl': artist['images'][0]['url'] if artist.get('images') else None,
-                'playCount': 0  # Spotify API doesn't provide play counts for top tracks
-            }
-            artists.append(song_data)
+                'playCount': 0  # Spotify API doesn't provide play counts for top artists
+            })
             rank += 1
+        yield artists
 
-        # Check to see if we got all available tracks
+        # Check to see if we got all available artists
         if len(batch['items']) < batch_size:
             break
 
         offset += batch_size
 
+def fetch_all_top_artists(sp: spotipy.Spotify, time_range: str, batch_size: int = 50) -> list:
+    """
+    Fetch all top artists for a given time range and extract data for TopArtist table.
+
+    Args:
+        sp: Authenticated Spotify client instance
+        time_range: 'short_term' (4 weeks), 'medium_term' (6 months), or 'long_term' (several years)
+        batch_size: Number of items to fetch per request (default 50, max 50)
+
+    Returns:
+        List of artist dictionaries (see iter_top_artists())
+    """
+    artists = []
+    for page in iter_top_artists(sp, time_range, batch_size):
+        artists.extend(page)
     return artists
 
+def iter_snapshot_pages(sp: spotipy.Spotify, time_range: str, batch_size: int = 50):
+    """
+    Yield everything a snapshot needs as (kind, rows) pages, straight from Spotify.
 
-@stats_bp.route('/stats')
-@stats_bp.route('/stats/<timeframe>')
-def stats(timeframe='short_term'):
+    Song and artist pages are yielded as soon as they are fetched. Albums are
+    ranked incrementally from the same track pages and yielded once at the end.
+    Every page request goes through the Spotify circuit breaker.
+
+    Yields:
+        tuple: ('songs' | 'artists' | 'albums', list of row dictionaries)
     """
-    Display stats for a given timeframe.
+    ranking = AlbumRanking()
+    rank = 1
+
+    track_pages = iter_top_track_pages(sp, time_range, batch_size)
+    while True:
+        tracks = spotify_breaker.call(next, track_pages, None)
+        if tracks is None:
+            break
+        ranking.add_tracks(tracks)
+        yield 'songs', normalize_top_songs(tracks, rank)
+        rank += len(tracks)
+
+    artist_pages = iter_top_artists(sp, time_range, batch_size)
+    while True:
+        artists = spotify_breaker.call(next, artist_pages, None)
+        if artists is None:
+            break
+        yield 'artists', artists
+
+    yield 'albums', ranking.ranked()
+
+def stream_stats_snapshot(sp: spotipy.Spotify, userName: str, timeframe: str) -> int:
+    """
+    Fetch a new snapshot from Spotify and write it to the database as pages arrive.
+
+    A producer thread fetches pages from Spotify into a small bounded queue
+    while this thread bulk-inserts the pages it has already received, so
+    fetching and writing overlap. At most SNAPSHOT_PIPELINE_DEPTH pages are
+    held in memory at once, however long the user's history is.
+
+    Spotify calls go through the shared circuit breaker, so while Spotify keeps
+    failing this raises CircuitOpenError right away instead of waiting on it.
 
     Args:
-        timeframe: 'short_term' (4 weeks), 'medium_term' (6 months), or 'long_term' (all time)
+        sp: Authenticated Spotify client instance
+        userName: The user's Spotify ID (userName)
+        timeframe: 'short_term', 'medium_term', or 'long_term'
+
+    Returns:
+        int: The stats_id of the new snapshot
     """
-    # Validate timeframe
-    valid_timeframes = ['short_term', 'medium_term', 'long_term']
-    if timeframe not in valid_timeframes:
-        timeframe = 'short_term'
+    pages = queue.Queue(maxsize=SNAPSHOT_PIPELINE_DEPTH)
+    done = object()
+    cancelled = threading.Event()
+
+    def put(item) -> bool:
+        # Give up if the writer has stopped (e.g. the DB insert failed)
+        while not cancelled.is_set():
+            try:
+                pages.put(item, timeout=1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for page in iter_snapshot_pages(sp, timeframe):
+                if not put(page):
+                    return
+            put(done)
+        except Exception as e:
+            put(e)
+
+    def consume():
+        while True:
+            # Time spent waiting here is the producer's Spotify fetches
+            with waiting_on(producer):
+                page = pages.get()
+            if page is done:
+                return
+            if isinstance(page, Exception):
+                raise page
+            yield page
+
+    producer = threading.Thread(target=produce, name=f'snapshot-fetch-{userName}-{timeframe}', daemon=True)
+    producer.start()
+    try:
+        stats_id = insert_snapshot_pages(userName, timeframe, consume())
+    finally:
+        cancelled.set()
+        producer.join()
 
-    sp, token_info = get_authenticated_spotify_client()
-    if not sp:
-        return redirect('/')
+    print(f"Stored snapshot {stats_id} for {userName} ({timeframe})", flush=True)
+    return stats_id
 
-    user_profile = sp.current_user()
-    userName = session.get('userName')
+def get_latest_stats_snapshot(userName: str, timeframe: str, max_age_hours: int = 24):
+    """
+    Get the newest Stats record for this user and timeframe, however old it is.
 
-    # ========== TOP ARTISTS AND TRACKS (LAST 4 WEEKS) ==========
-    # Fetch top 50 artists from the past ~4 weeks
-    top_artists_week = fetch_all_top_artists(sp, 'short_term')
-    
-    top_songs_week = fetch_all_top_songs(sp, 'short_term')
-
-    # Timeframe display names
-    timeframe_names = {
-        'short_term': 'Last 4 Weeks',
-        'medium_term': 'Last 6 Months',
-        'long_term': 'All Time'
-    }
-
-    # Fetch top artists for the selected timeframe
-    top_artists = sp.current_user_top_artists(limit=50, time_range=timeframe)
-
-    # Check if we have cached stats (within last 24 hours)
-    existing_stats_id = get_cached_stats_id(userName, timeframe=timeframe, max_age_hours=24)
-
-    if existing_stats_id:
-        print(f"Found recent stats (ID: {existing_stats_id}), skipping fetch and insert", flush=True)
-        stats_id = existing_stats_id
-        # Fetch fresh data for display
-        top_songs_display = fetch_all_top_songs(sp, timeframe)
-        top_albums_display = fetch_all_top_albums(sp, timeframe)
-    else:
-        print(f"No recent stats found, fetching new data from Spotify", flush=True)
-
-        # Fetch formatted song and album data for database
-        top_songs = fetch_all_top_songs(sp, timeframe)
-        top_albums = fetch_all_top_albums(sp, timeframe)
-
-        # Create a Stats record for this user and timeframe
+    Args:
+        userName: The user's Spotify ID (userName)
+        timeframe: The Spotify timeframe ('short_term', 'medium_term', 'long_term')
+        max_age_hours: Records older than this are reported as stale
+
+    Returns:
+        tuple: (stats_id, createdAt, is_stale)
+        None: If the user has no Stats record for this timeframe
+    """
+    conn = get_db()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute("""
+            SELECT uniqueID, createdAt, createdAt < NOW() - INTERVAL %s HOUR
+            FROM Stats
+            WHERE userName = %s
+            AND timeframe = %s
+            ORDER BY createdAt DESC, uniqueID DESC
+            LIMIT 1
+        """, (max_age_hours, userName, timeframe))
+
+        result = cursor.fetchone()
+        if not result:
+            return None
+        stats_id, created_at, is_stale = result
+        return stats_id, created_at, bool(is_stale)
+    finally:
+        cursor.close()
+        conn.close()
+
+def schedule_stats_refresh(token_info: dict, userName: str, timeframe: str) -> bool:
+    """
+    Refresh a user's snapshot in a background thread.
+
+    At most one refresh per (user, timeframe) runs at a time, and none is
+    started while the Spotify circuit breaker is open.
+
+    Args:
+        token_info: The user's OAuth token (the thread refreshes it if expired)
+        userName: The user's Spotify ID (userName)
+        timeframe: 'short_term', 'medium_term', or 'long_term'
+
+    Returns:
+        bool: True if a refresh was started
+    """
+    key = (userName, timeframe)
+    with _refreshing_lock:
+        if key in _refreshing or spotify_breaker.is_open():
+            return False
+        _refreshing.add(key)
+
+    def refresh():
         try:
-            stats_id = insert_stats_record(userName, timeframe=timeframe)
-            print(f"Created Stats record with ID: {stats_id}", flush=True)
-
-            # Insert songs and albums into database using the new stats_id
-            insert_top_songs_to_db(stats_id=stats_id, songs=top_songs)
-            print(f"Successfully inserted {len(top_songs)} songs into database!", flush=True)
-
-            insert_top_albums_to_db(stats_id=stats_id, albums=top_albums)
-            print(f"Successfully inserted {len(top_albums)} albums into database!", flush=True)
-            
-            insert_top_songs_to_db(stats_id=stats_id, songs=top_artists)
-            print(f"Successfully inserted {len(top_artists)} albums into database!", flush=True)
-            
-
-            # Use for display
-            top_songs_display = top_songs
-            top_albums_display = top_albums
+            sp, _ = get_spotify_client_for_token(token_info)
+            stream_stats_snapshot(sp, userName, timeframe)
+        except CircuitOpenError:
+            print(f"Spotify circuit open, skipped refresh for {userName} ({timeframe})", flush=True)
         except Exception as e:
-            print(f"Error creating stats or inserting data: {e}", flush=True)
-            # Still fetch for display even if DB insert fails
-            top_songs_display = fetch_all_top_songs(sp, timeframe)
-            top_albums_display = fetch_all_top_albums(sp, timeframe)
-            top_artists_display = fetch_all_top_artists(sp, timeframe)
+            print(f"Background stats refresh failed for {userName} ({timeframe}): {e}", flush=True)
+        finally:
+            with _refreshing_lock:
+                _refreshing.discard(key)
+
+    threading.Thread(target=refresh, name=f'stats-refresh-{userName}-{timeframe}', daemon=True).start()
+    return True
+
+def render_snapshot_html(timeframe: str, stats_id: int, created_at, is_stale: bool) -> str:
+    """
+    Build the stats page from a stored snapshot without calling Spotify.
+
+    Args:
+        timeframe: 'short_term', 'medium_term', or 'long_term'
+        stats_id: The snapshot to display
+        created_at: When the snapshot was taken
+        is_stale: Whether a newer snapshot is being fetched in the background
+    """
+    top_artists = fetch_snapshot_items(stats_id, 'artists', 20)
+    top_songs = fetch_snapshot_items(stats_id, 'songs', 20)
+    top_albums = fetch_snapshot_items(stats_id, 'albums', 20)
+
+    html = f"<h1>Your Spotify Stats - {TIMEFRAME_NAMES[timeframe]}</h1>"
+    html += f"<p><em>Snapshot from {created_at:%Y-%m-%d %H:%M}"
+    if is_stale:
+        html += " (refreshing in the background, reload for newer stats)"
+    html += "</em></p>"
+
+    # Timeframe selector buttons
+    html += "<div style='margin: 20px 0;'>"
+    for tf, name in TIMEFRAME_NAMES.items():
+        if tf == timeframe:
+            html += f"<strong style='margin-right: 10px;'>{name}</strong>"
+        else:
+            html += f"<a href='/stats/{tf}' style='margin-right: 10px;'>{name}</a>"
+    html += "</div>"
+
+    html += "<h2>Top Artists</h2><ul>"
+    for artist in top_artists:
+        html += f"<li><strong>#{artist['rank']}</strong> {artist['artistName']}</li>"
+    html += "</ul>"
+
+    html += "<h2>Top Songs</h2><ul>"
+    for song in top_songs:
+        html += f"<li><strong>#{song['rank']}</strong> {song['songName']} - {song['artistName']}</li>"
+    html += "</ul>"
+
+    html += "<h2>Top Albums</h2><ul>"
+    for album in top_albums:
+        html += f"<li><strong>#{album['rank']}</strong> {album['albumName']} - {album['artistName']}</li>"
+    html += "</ul>"
+
+    html += "<hr>"
+    html += "<p><a href='/stats/recently-played'>View Recently Played Stats (Last ~50 Plays)</a></p>"
+    html += "<p><a href='/'>Back to Profile</a></p>"
+    return html
+
+def stats_etag(stats_id: int, is_stale: bool = False) -> str:
+    """ETag for a stats page rendered from a snapshot; snapshots never change once written."""
+    return f"stats-{stats_id}-stale" if is_stale else f"stats-{stats_id}"
+
+def snapshot_response(timeframe: str, stats_id: int, created_at, is_stale: bool = False):
+    """
+    The stats page for a stored snapshot, tagged with its ETag.
+
+    The page only changes with the snapshot (and its stale notice), so a
+    browser that already holds it gets a 304 without anything being rendered.
+    """
+    etag = stats_etag(stats_id, is_stale)
+    if client_has_etag(etag):
+        return not_modified(etag)
+    return with_etag(render_snapshot_html(timeframe, stats_id, created_at, is_stale), etag)
+
+def render_live_stats_html(sp: spotipy.Spotify, timeframe: str) -> str:
+    """
+    Build the stats page straight from Spotify, for when no snapshot could be stored.
+
+    Every fetch goes through the Spotify circuit breaker.
+
+    Args:
+        sp: Authenticated Spotify client instance
+        timeframe: 'short_term', 'medium_term', or 'long_term'
+
+    Raises:
+        CircuitOpenError: If the breaker is open
+    """
+    # ========== TOP ARTISTS AND TRACKS (LAST 4 WEEKS) ==========
+    # Fetch top 50 artists from the past ~4 weeks
+    top_artists_week = spotify_breaker.call(fetch_all_top_artists, sp, 'short_term')
+
+    top_songs_week = spotify_breaker.call(fetch_all_top_songs, sp, 'short_term')
+
+    # Fetch top artists, songs and albums for the selected timeframe
+    top_artists = spotify_breaker.call(sp.current_user_top_artists, limit=50, time_range=timeframe)
+    top_songs_display = spotify_breaker.call(fetch_all_top_songs, sp, timeframe)
+    top_albums_display = spotify_breaker.call(fetch_all_top_albums, sp, timeframe)
 
     # ========== BUILD HTML RESPONSE ==========
-    html = f"<h1>Your Spotify Stats - {timeframe_names[timeframe]}</h1>"
+    html = f"<h1>Your Spotify Stats - {TIMEFRAME_NAMES[timeframe]}</h1>"
 
     # Display top artists from the past 4 weeks
     html += "<h2>Top Artists (Week)</h2><ul>"
@@ -289,7 +542,7 @@ def stats(timeframe='short_term'):
         html += f"<li>{artist['artistName']}</li>"
     # Timeframe selector buttons
     html += "<div style='margin: 20px 0;'>"
-    for tf, name in timeframe_names.items():
+    for tf, name in TIMEFRAME_NAMES.items():
         if tf == timeframe:
             html += f"<strong style='margin-right: 10px;'>{name}</strong>"
         else:
@@ -339,20 +592,6 @@ def stats(timeframe='short_term'):
     #     html += f"<li>{artist['name']}</li>"
     # html += "</ul>"
 
-    ##yo
-    try:
-        insert_top_songs_to_db(stats_id=4, songs=top_songs_week)
-        print(f"Successfully inserted {len(top_songs_week)} songs into database!", flush=True)
-    except Exception as e:
-        print(f"Error inserting songs: {e}", flush=True)
-
-    try:
-        insert_top_artists_to_db(stats_id=4, artists=top_artists_week)
-        print(f"Successfully inserted {len(top_artists_week)} songs into database!", flush=True)
-    except Exception as e:
-        print(f"Error inserting artists: {e}", flush=True)
-
-
     # html += "<h2>Top Tracks (Year)</h2><ul>"
     # for track in top_tracks_year:
     #     html += f"<li>{track['name']} by {track['artists'][0]['name']}</li>"
@@ -361,4 +600,90 @@ def stats(timeframe='short_term'):
     html += "<hr>"
     html += "<p><a href='/stats/recently-played'>View Recently Played Stats (Last ~50 Plays)</a></p>"
     html += "<p><a href='/'>Back to Profile</a></p>"
-    return html
\ No newline at end of file
+    return html
+
+
+def stats_stale_while_revalidate(timeframe: str):
+    """
+    Serve the stats page from the latest stored snapshot, refreshing it in the background if stale.
+
+    Only a user with no snapshot at all waits on Spotify. The response carries
+    X-Stats-Stale so clients can tell a fresh page from a stale one.
+    """
+    userName = session.get('userName')
+    token_info = session.get('token_info')
+    if not userName or not token_info:
+        return redirect('/')
+
+    latest = get_latest_stats_snapshot(userName, timeframe, max_age_hours=Config.STATS_MAX_AGE_HOURS)
+
+    if latest is None:
+        # Nothing stored yet, so this first fetch has to happen inline
+        try:
+            sp, token_info = get_spotify_client_for_token(token_info)
+            session['token_info'] = token_info
+            stream_stats_snapshot(sp, userName, timeframe)
+        except (CircuitOpenError, spotipy.SpotifyException) as e:
+            print(f"Error fetching first stats snapshot for {userName} ({timeframe}): {e}", flush=True)
+            return SPOTIFY_UNAVAILABLE_HTML, 503
+        latest = get_latest_stats_snapshot(userName, timeframe, max_age_hours=Config.STATS_MAX_AGE_HOURS)
+
+    stats_id, created_at, is_stale = latest
+    if is_stale:
+        schedule_stats_refresh(token_info, userName, timeframe)
+
+    response = snapshot_response(timeframe, stats_id, created_at, is_stale)
+    response.headers['X-Stats-Stale'] = 'true' if is_stale else 'false'
+    response.headers['X-Stats-Snapshot-Id'] = str(stats_id)
+    return response
+
+
+@stats_bp.route('/stats')
+@stats_bp.route('/stats/<timeframe>')
+def stats(timeframe='short_term'):
+    """
+    Display stats for a given timeframe.
+
+    Args:
+        timeframe: 'short_term' (4 weeks), 'medium_term' (6 months), or 'long_term' (all time)
+    """
+    # Validate timeframe
+    valid_timeframes = ['short_term', 'medium_term', 'long_term']
+    if timeframe not in valid_timeframes:
+        timeframe = 'short_term'
+
+    if Config.STATS_STALE_WHILE_REVALIDATE:
+        return stats_stale_while_revalidate(timeframe)
+
+    # A snapshot from the last 24 hours is shown as stored, without calling Spotify,
+    # so a browser that already has its page gets a 304 straight away
+    userName = session.get('userName')
+    if userName and session.get('token_info'):
+        latest = get_latest_stats_snapshot(userName, timeframe, max_age_hours=24)
+        if latest and not latest[2]:
+            stats_id, created_at, _ = latest
+            print(f"Found recent stats (ID: {stats_id}), skipping fetch and insert", flush=True)
+            return snapshot_response(timeframe, stats_id, created_at)
+
+    sp, token_info = get_authenticated_spotify_client()
+    if not sp:
+        return redirect('/')
+
+    print(f"No recent stats found, fetching new data from Spotify", flush=True)
+
+    # Fetch and store songs, albums and artists page by page as they arrive
+    try:
+        stats_id = stream_stats_snapshot(sp, userName, timeframe)
+        print(f"Created Stats record with ID: {stats_id}", flush=True)
+        return snapshot_response(timeframe, stats_id, get_stats_snapshot(stats_id)['createdAt'])
+    except CircuitOpenError:
+        # Falling back to live data would only call Spotify again
+        return SPOTIFY_UNAVAILABLE_HTML, 503
+    except Exception as e:
+        print(f"Error creating stats or inserting data: {e}", flush=True)
+
+    # Still show live data even if the DB insert fails (untagged, as it is not stored anywhere)
+    try:
+        return render_live_stats_html(sp, timeframe)
+    except CircuitOpenError:
+        return SPOTIFY_UNAVAILABLE_HTML, 503
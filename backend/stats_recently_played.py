@@ -1,11 +1,27 @@
 from flask import Blueprint, session, redirect
 import spotipy
-from collections import Counter
+import threading
+import time
+from collections import Counter, OrderedDict
+from datetime import datetime
 from db import get_db
+from db_insert import insert_recently_played_to_db
 from auth import get_authenticated_spotify_client
+from feed import publish_activities_in_background
+from http_cache import client_has_etag, with_etag, not_modified
+from config import Config
 
 stats_recently_played_bp = Blueprint('stats_recently_played', __name__)
 
+# When each user's plays were last synced from Spotify by this process.
+# Only within RECENTLY_PLAYED_REVALIDATE_SECONDS of that is the stored newest
+# play trusted to still be the newest one, so only then is a 304 sent. Users
+# missing here (never synced by this process, or evicted) just get a full page.
+LAST_SYNCED_CACHE_SIZE = 1024
+
+_last_synced = OrderedDict()
+_last_synced_lock = threading.Lock()
+
 def fetch_recently_played_tracks(sp: spotipy.Spotify) -> list:
     """
     Fetch recently played tracks (limited to last 50 tracks by Spotify API).
@@ -26,6 +42,91 @@ def fetch_recently_played_tracks(sp: spotipy.Spotify) -> list:
         print(f"Error fetching recently played: {e}", flush=True)
         return []
 
+def get_latest_played_at(userName: str):
+    """
+    Get the most recent stored play for a user.
+
+    Args:
+        userName: The user's Spotify ID (userName)
+
+    Returns:
+        datetime: playedAt of the newest RecentlyPlayed row, or None if there are none
+    """
+    conn = get_db()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute("""
+            SELECT MAX(playedAt)
+            FROM RecentlyPlayed
+            WHERE userName = %s
+        """, (userName,))
+        result = cursor.fetchone()
+        return result[0] if result else None
+    finally:
+        cursor.close()
+        conn.close()
+
+def recently_played_etag(latest_played_at) -> str:
+    """ETag for the recently played page, versioned by the newest stored play."""
+    return f"recent-{latest_played_at:%Y%m%dT%H%M%S}" if latest_played_at else "recent-none"
+
+def recently_synced(userName: str) -> bool:
+    """Whether this process synced the user's plays from Spotify within the revalidate window."""
+    with _last_synced_lock:
+        synced_at = _last_synced.get(userName)
+    return synced_at is not None and time.monotonic() - synced_at < Config.RECENTLY_PLAYED_REVALIDATE_SECONDS
+
+def mark_synced(userName: str) -> None:
+    """Record that this process just synced the user's plays, evicting the least recent users."""
+    with _last_synced_lock:
+        _last_synced[userName] = time.monotonic()
+        _last_synced.move_to_end(userName)
+        while len(_last_synced) > LAST_SYNCED_CACHE_SIZE:
+            _last_synced.popitem(last=False)
+
+def store_recently_played(userName: str, recent_tracks: list) -> int:
+    """
+    Save recently played tracks to RecentlyPlayed and share new ones to friends' feeds.
+
+    The feeds are written on a background thread once the plays are stored.
+
+    Args:
+        userName: The user's Spotify ID (userName)
+        recent_tracks: List of recently played items from Spotify API
+
+    Returns:
+        int: Number of plays that were not stored yet
+    """
+    plays = []
+    for item in recent_tracks:
+        track = item['track']
+        plays.append({
+            'songName': track['name'],
+            'artistName': track['artists'][0]['name'] if track.get('artists') else 'Unknown Artist',
+            'albumName': track.get('album', {}).get('name'),
+            'spotifyTrackId': track.get('id'),
+            # played_at looks like 2024-01-31T18:04:05.123Z; stored to the second in UTC
+            'playedAt': datetime.strptime(item['played_at'][:19], '%Y-%m-%dT%H:%M:%S'),
+            'msPlayed': track.get('duration_ms')
+        })
+
+    latest_played_at = get_latest_played_at(userName)
+    inserted = insert_recently_played_to_db(userName, plays)
+
+    new_plays = [play for play in plays if latest_played_at is None or play['playedAt'] > latest_played_at]
+    new_plays.sort(key=lambda play: play['playedAt'])
+    publish_activities_in_background(userName, [{
+        'activityType': 'play',
+        'itemName': play['songName'],
+        'artistName': play['artistName'],
+        'spotifyId': play['spotifyTrackId'],
+        'rating': None,
+        'occurredAt': play['playedAt']
+    } for play in new_plays])
+
+    return inserted
+
 def calculate_listening_minutes(recent_tracks: list) -> dict:
     """
     Calculate total listening minutes from recently played tracks.
@@ -241,6 +342,13 @@ def fetch_recently_played_top_albums(sp: spotipy.Spotify) -> list:
 @stats_recently_played_bp.route('/stats/recently-played')
 def stats_recently_played():
     """Route to display stats based on recently played tracks (last ~50 plays)."""
+    # A page synced moments ago is still current if no newer play has been stored since
+    userName = session.get('userName')
+    if userName and session.get('token_info') and recently_synced(userName):
+        etag = recently_played_etag(get_latest_played_at(userName))
+        if client_has_etag(etag):
+            return not_modified(etag)
+
     sp, token_info = get_authenticated_spotify_client()
     if not sp:
         return redirect('/')
@@ -251,6 +359,16 @@ def stats_recently_played():
     # Fetch raw recently played data (max 50 tracks)
     recent_tracks = fetch_recently_played_tracks(sp)
 
+    # Keep the plays (Spotify forgets them after 50) and share new ones with friends
+    etag = None
+    try:
+        new_plays = store_recently_played(userName, recent_tracks)
+        print(f"Stored {new_plays} new plays", flush=True)
+        etag = recently_played_etag(get_latest_played_at(userName))
+        mark_synced(userName)
+    except Exception as e:
+        print(f"Error storing recently played: {e}", flush=True)
+
     # Calculate listening statistics
     listening_stats = calculate_listening_minutes(recent_tracks)
 
@@ -292,4 +410,4 @@ def stats_recently_played():
     html += "<hr>"
     html += "<p><a href='/stats'>View 4-Week Stats</a></p>"
     html += "<p><a href='/'>Back to Profile</a></p>"
-    return html
+    return with_etag(html, etag) if etag else html
@@ -0,0 +1,424 @@
+"""
+Bulk importer for Spotify "Download your data" streaming history files.
+
+Supports both the account data export (StreamingHistory*.json, with endTime /
+trackName / msPlayed) and the extended streaming history export
+(Streaming_History_Audio_*.json, with ts / master_metadata_track_name /
+ms_played). Those files can be hundreds of MB each. They are decoded one
+object at a time instead of with json.load(), parsed in parallel (one worker
+process per file), and batch-inserted into RecentlyPlayed. A play is skipped
+if the same song by the same artist is already stored within
+PLAY_MATCH_TOLERANCE, for example synced from the API with a more precise
+timestamp. Workers check and insert their batches one at a time per user, so
+overlapping files imported together cannot both store the same play. Once the plays are in, real
+play counts and listening minutes are filled into the user's Stats snapshots.
+
+Usage:
+    python streaming_import.py <userName> StreamingHistory0.json [more files...] [--workers N]
+"""
+import argparse
+import hashlib
+import json
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from db import get_db
+from db_insert import insert_recently_played_to_db
+
+READ_CHUNK_SIZE = 1 << 20  # 1 MB
+INSERT_BATCH_SIZE = 1000
+
+# Spotify only counts a stream once it has played for 30 seconds; shorter plays are skips
+MIN_PLAY_MS = 30000
+
+# The account data export has minute precision while plays synced from the API
+# are stored to the second, so the same play can be up to this far apart
+PLAY_MATCH_TOLERANCE = timedelta(seconds=60)
+
+# How long a worker waits for another worker's batch of the same user to finish
+IMPORT_LOCK_TIMEOUT_SECONDS = 120
+
+# How far back each timeframe reaches from the snapshot's createdAt (None = all time)
+TIMEFRAME_WINDOWS = {
+    'short_term': 'INTERVAL 4 WEEK',
+    'medium_term': 'INTERVAL 6 MONTH',
+    'long_term': None,
+}
+
+
+def iter_json_array(path: str, chunk_size: int = READ_CHUNK_SIZE):
+    """
+    Yield the elements of a top-level JSON array without loading the whole file.
+
+    Args:
+        path: Path to a JSON file containing a single array
+        chunk_size: Number of characters to read at a time
+
+    Yields:
+        Each decoded element of the array, in order
+
+    Raises:
+        ValueError: If the file is not a JSON array
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    started = False
+    eof = False
+
+    with open(path, 'r', encoding='utf-8') as f:
+        while True:
+            # Skip whitespace and separators between elements
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+
+            if position >= len(buffer):
+                if eof:
+                    raise ValueError(f"{path}: unexpected end of file")
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buffer = buffer[position:] + chunk
+                position = 0
+                continue
+
+            if not started:
+                if buffer[position] != '[':
+                    raise ValueError(f"{path}: expected a JSON array")
+                started = True
+                position += 1
+                continue
+
+            if buffer[position] == ']':
+                return
+
+            try:
+                element, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # Element is cut off at the end of the buffer; read more and retry
+                if eof:
+                    raise
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buffer = buffer[position:] + chunk
+                position = 0
+                continue
+
+            yield element
+            position = end
+
+
+def normalize_play(entry: dict):
+    """
+    Convert one streaming history entry (either export format) to a RecentlyPlayed row.
+
+    Args:
+        entry: A decoded element of a StreamingHistory*.json or extended history file
+
+    Returns:
+        dict: Play dictionary for insert_recently_played_to_db()
+        None: For podcast episodes, skips, and entries missing a track name
+    """
+    if 'ts' in entry:
+        # Extended streaming history
+        song_name = entry.get('master_metadata_track_name')
+        ms_played = entry.get('ms_played') or 0
+        track_uri = entry.get('spotify_track_uri') or ''
+        play = {
+            'songName': song_name,
+            'artistName': entry.get('master_metadata_album_artist_name'),
+            'albumName': entry.get('master_metadata_album_album_name'),
+            'spotifyTrackId': track_uri.rsplit(':', 1)[-1] if track_uri.startswith('spotify:track:') else None,
+            'playedAt': datetime.strptime(entry['ts'], '%Y-%m-%dT%H:%M:%SZ'),
+            'msPlayed': ms_played,
+        }
+    elif 'endTime' in entry:
+        # Account data export (minute precision, no IDs or album)
+        song_name = entry.get('trackName')
+        ms_played = entry.get('msPlayed') or 0
+        play = {
+            'songName': song_name,
+            'artistName': entry.get('artistName'),
+            'albumName': None,
+            'spotifyTrackId': None,
+            'playedAt': datetime.strptime(entry['endTime'], '%Y-%m-%d %H:%M'),
+            'msPlayed': ms_played,
+        }
+    else:
+        return None
+
+    if not song_name or ms_played < MIN_PLAY_MS:
+        return None
+    return play
+
+
+def drop_already_stored(plays: list, stored: list, tolerance: timedelta = PLAY_MATCH_TOLERANCE) -> list:
+    """
+    Remove plays that are already stored under a slightly different timestamp.
+
+    unique_play only catches exact-second duplicates, which a minute-precision
+    export never produces for plays that were also synced from the API.
+
+    Args:
+        plays: Play dictionaries about to be inserted
+        stored: (songName, artistName, playedAt) tuples already stored for the user around the same time
+        tolerance: How far apart two timestamps of the same track can be and still be one play
+
+    Returns:
+        list: The plays with no stored counterpart; each stored play matches at most one
+    """
+    unmatched = {}
+    for song_name, artist_name, played_at in stored:
+        unmatched.setdefault((song_name, artist_name), []).append(played_at)
+    for times in unmatched.values():
+        times.sort()
+
+    fresh = []
+    for play in plays:
+        times = unmatched.get((play['songName'], play.get('artistName')), [])
+        index = bisect_left(times, play['playedAt'] - tolerance)
+        if index < len(times) and times[index] <= play['playedAt'] + tolerance:
+            del times[index]
+        else:
+            fresh.append(play)
+    return fresh
+
+
+def fetch_stored_plays_near(userName: str, plays: list, tolerance: timedelta = PLAY_MATCH_TOLERANCE) -> list:
+    """
+    Fetch the user's stored plays in the time span of a batch, widened by the tolerance.
+
+    Returns:
+        list: (songName, artistName, playedAt) tuples
+    """
+    if not plays:
+        return []
+
+    conn = get_db()
+    cursor = conn.cursor()
+
+    try:
+        # Range on unique_play (userName, playedAt, ...); also prunes partitions
+        cursor.execute("""
+            SELECT songName, artistName, playedAt
+            FROM RecentlyPlayed
+            WHERE userName = %s
+            AND playedAt BETWEEN %s AND %s
+        """, (
+            userName,
+            min(play['playedAt'] for play in plays) - tolerance,
+            max(play['playedAt'] for play in plays) + tolerance
+        ))
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+@contextmanager
+def user_import_lock(userName: str):
+    """
+    Hold a MySQL named lock on the user's plays, shared by every worker process.
+
+    Raises:
+        TimeoutError: If another worker held the lock for IMPORT_LOCK_TIMEOUT_SECONDS
+    """
+    # Lock names are limited to 64 characters, user names are not
+    name = 'import:' + hashlib.sha1(userName.encode('utf-8')).hexdigest()
+
+    conn = get_db()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute("SELECT GET_LOCK(%s, %s)", (name, IMPORT_LOCK_TIMEOUT_SECONDS))
+        if cursor.fetchone()[0] != 1:
+            raise TimeoutError(f"Timed out waiting for the import lock of {userName}")
+        try:
+            yield
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (name,))
+            cursor.fetchone()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def insert_new_plays(userName: str, plays: list) -> int:
+    """
+    Insert a batch of imported plays, skipping ones already stored within PLAY_MATCH_TOLERANCE.
+
+    The check and the insert run under the user's import lock. Otherwise two
+    workers importing overlapping files could both check before either had
+    inserted, and store the same play twice under timestamps unique_play sees
+    as different.
+    """
+    if not plays:
+        return 0
+
+    with user_import_lock(userName):
+        fresh = drop_already_stored(plays, fetch_stored_plays_near(userName, plays))
+        return insert_recently_played_to_db(userName, fresh)
+
+
+def import_history_file(userName: str, path: str) -> dict:
+    """
+    Parse one history file and insert its plays in batches.
+
+    Runs in a worker process, so it opens its own database connections.
+
+    Args:
+        userName: The user the history belongs to
+        path: Path to the history file
+
+    Returns:
+        dict: {'path': str, 'parsed': int, 'inserted': int}
+    """
+    parsed = 0
+    inserted = 0
+    batch = []
+
+    for entry in iter_json_array(path):
+        play = normalize_play(entry)
+        if not play:
+            continue
+
+        batch.append(play)
+        parsed += 1
+        if len(batch) >= INSERT_BATCH_SIZE:
+            inserted += insert_new_plays(userName, batch)
+            batch = []
+
+    inserted += insert_new_plays(userName, batch)
+    return {'path': path, 'parsed': parsed, 'inserted': inserted}
+
+
+def fill_snapshot_play_counts(userName: str) -> int:
+    """
+    Fill real playCount and totalMinutes into the user's Stats snapshots from RecentlyPlayed.
+
+    Each snapshot is counted over the plays inside its timeframe's window,
+    ending at the snapshot's createdAt. Plays are matched to Top* rows by name
+    since the account data export carries no Spotify IDs.
+
+    Args:
+        userName: The user whose snapshots to update
+
+    Returns:
+        int: Number of snapshots updated
+    """
+    conn = get_db()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute("""
+            SELECT uniqueID, timeframe, createdAt
+            FROM Stats
+            WHERE userName = %s
+        """, (userName,))
+        snapshots = cursor.fetchall()
+
+        for stats_id, timeframe, created_at in snapshots:
+            window = TIMEFRAME_WINDOWS[timeframe]
+            window_sql = f"AND playedAt > %s - {window}" if window else ""
+            window_params = (userName, created_at, created_at) if window else (userName, created_at)
+
+            plays_in_window = f"""
+                FROM RecentlyPlayed
+                WHERE userName = %s
+                AND playedAt <= %s
+                {window_sql}
+            """
+
+            cursor.execute(f"""
+                UPDATE TopSong t
+                JOIN (
+                    SELECT songName, artistName, COUNT(*) AS plays
+                    {plays_in_window}
+                    GROUP BY songName, artistName
+                ) p ON p.songName = t.songName AND p.artistName = t.artistName
+                SET t.playCount = p.plays
+                WHERE t.statsID = %s
+            """, (*window_params, stats_id))
+
+            cursor.execute(f"""
+                UPDATE TopArtist t
+                JOIN (
+                    SELECT artistName, COUNT(*) AS plays
+                    {plays_in_window}
+                    GROUP BY artistName
+                ) p ON p.artistName = t.artistName
+                SET t.playCount = p.plays
+                WHERE t.statsID = %s
+            """, (*window_params, stats_id))
+
+            cursor.execute(f"""
+                UPDATE TopAlbum t
+                JOIN (
+                    SELECT albumName, artistName, COUNT(*) AS plays
+                    {plays_in_window}
+                    AND albumName IS NOT NULL
+                    GROUP BY albumName, artistName
+                ) p ON p.albumName = t.albumName AND p.artistName = t.artistName
+                SET t.playCount = p.plays
+                WHERE t.statsID = %s
+            """, (*window_params, stats_id))
+
+            cursor.execute(f"""
+                UPDATE Stats
+                SET totalMinutes = (
+                    SELECT COALESCE(ROUND(SUM(msPlayed) / 60000), 0)
+                    {plays_in_window}
+                )
+                WHERE uniqueID = %s
+            """, (*window_params, stats_id))
+
+            # Commit per snapshot so a long backfill does not hold one huge transaction
+            conn.commit()
+
+        return len(snapshots)
+    except Exception as e:
+        conn.rollback()
+        raise e
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def import_streaming_history(userName: str, paths: list, workers: int = 4) -> dict:
+    """
+    Import streaming history files for a user, then update their snapshots.
+
+    Args:
+        userName: The user the history belongs to (must already exist in User)
+        paths: Paths to StreamingHistory*.json or extended history files
+        workers: Number of files to parse in parallel
+
+    Returns:
+        dict: {'parsed': int, 'inserted': int, 'snapshots': int}
+    """
+    parsed = 0
+    inserted = 0
+
+    with ProcessPoolExecutor(max_workers=max(1, min(workers, len(paths)))) as executor:
+        futures = [executor.submit(import_history_file, userName, path) for path in paths]
+        for future in as_completed(futures):
+            result = future.result()
+            print(f"Imported {result['path']}: {result['parsed']} plays, {result['inserted']} new", flush=True)
+            parsed += result['parsed']
+            inserted += result['inserted']
+
+    snapshots = fill_snapshot_play_counts(userName)
+    print(f"Updated play counts for {snapshots} snapshots", flush=True)
+
+    return {'parsed': parsed, 'inserted': inserted, 'snapshots': snapshots}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Import Spotify streaming history files for a user.")
+    parser.add_argument('userName', help="Spotify ID of the user the history belongs to")
+    parser.add_argument('paths', nargs='+', help="StreamingHistory*.json or extended history files")
+    parser.add_argument('--workers', type=int, default=4, help="Files to parse in parallel (default 4)")
+    args = parser.parse_args()
+
+    totals = import_streaming_history(args.userName, args.paths, args.workers)
+    print(f"Done: {totals['parsed']} plays parsed, {totals['inserted']} new", flush=True)
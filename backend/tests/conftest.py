@@ -0,0 +1,42 @@
+import os
+import sys
+
+import pytest
+from flask import Flask
+
+# The backend modules import each other as top-level modules (as app.py runs them)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fakes import FakeConnection  # noqa: E402
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    """
+    Point get_db() in the given modules at one FakeConnection.
+
+    Usage: conn = fake_db(module, ..., responder=lambda sql, params: rows)
+    """
+    def install(*modules, responder=None):
+        conn = FakeConnection(responder)
+        for module in modules:
+            monkeypatch.setattr(module, 'get_db', lambda: conn)
+        return conn
+    return install
+
+
+@pytest.fixture
+def make_client():
+    """Build a Flask test client for some blueprints, optionally logged in as userName."""
+    def make(*blueprints, userName=None):
+        app = Flask(__name__)
+        app.secret_key = 'test'
+        for blueprint in blueprints:
+            app.register_blueprint(blueprint)
+        client = app.test_client()
+        if userName:
+            with client.session_transaction() as session:
+                session['userName'] = userName
+                session['token_info'] = {'access_token': f'token-{userName}'}
+        return client
+    return make
@@ -0,0 +1,76 @@
+"""
+In-memory stand-ins for a mysql-connector connection and cursor.
+
+FakeCursor records every statement it is given and answers queries from a
+responder function, so code that talks to the database through get_db() can
+be checked without a MySQL server.
+"""
+
+
+def squash(sql: str) -> str:
+    """Collapse a statement's whitespace so tests can match on fragments of it."""
+    return ' '.join(sql.split())
+
+
+class FakeCursor:
+    def __init__(self, responder=None):
+        # responder(sql, params) -> list of rows for a query, or None for no rows
+        self.responder = responder or (lambda sql, params: None)
+        self.executed = []
+        self.rows = []
+        self.rowcount = 0
+        self.lastrowid = 1
+        self.closed = False
+
+    def execute(self, sql, params=None):
+        sql = squash(sql)
+        self.executed.append((sql, params))
+        self.rows = list(self.responder(sql, params) or [])
+        self.rowcount = len(self.rows)
+
+    def executemany(self, sql, seq_params):
+        seq_params = list(seq_params)
+        self.executed.append((squash(sql), seq_params))
+        self.rows = []
+        self.rowcount = len(seq_params)
+
+    def fetchone(self):
+        return self.rows.pop(0) if self.rows else None
+
+    def fetchall(self):
+        rows, self.rows = self.rows, []
+        return rows
+
+    def fetchmany(self, size=1):
+        rows, self.rows = self.rows[:size], self.rows[size:]
+        return rows
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def close(self):
+        self.closed = True
+
+    def statements(self, fragment: str) -> list:
+        """Every (sql, params) executed so far whose SQL contains fragment."""
+        return [(sql, params) for sql, params in self.executed if fragment in sql]
+
+
+class FakeConnection:
+    def __init__(self, responder=None):
+        self.cursor_ = FakeCursor(responder)
+        self.commits = 0
+        self.rollbacks = 0
+        self.closed = False
+
+    def cursor(self, dictionary=False, buffered=None):
+        return self.cursor_
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = True
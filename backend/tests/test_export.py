@@ -0,0 +1,77 @@
+import json
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+import export
+from export import _iter_keyset_chunks, _iter_ratings, generate_csv, generate_ndjson
+
+
+def keyset_responder(ids):
+    """Answer 'SELECT ... WHERE id > %s LIMIT %s' over a sorted list of ids."""
+    def respond(sql, params):
+        after, limit = params
+        return [{'id': i} for i in ids if i > after][:limit]
+    return respond
+
+
+def build_query(after, limit):
+    return "SELECT id FROM T WHERE id > %s ORDER BY id LIMIT %s", (after or 0, limit)
+
+
+@pytest.mark.parametrize('count, chunks', [
+    (7, [[1, 2, 3], [4, 5, 6], [7]]),
+    (6, [[1, 2, 3], [4, 5, 6]]),
+    (0, []),
+])
+def test_iter_keyset_chunks_crosses_chunk_boundaries(fake_db, count, chunks):
+    conn = fake_db(export, responder=keyset_responder(list(range(1, count + 1))))
+
+    result = [[row['id'] for row in rows]
+              for rows in _iter_keyset_chunks(build_query, key_of=lambda row: row['id'], chunk_size=3)]
+
+    assert result == chunks
+    # Each chunk seeks past the last key of the one before
+    assert [params[0] for _, params in conn.cursor_.executed] == [0] + [rows[-1] for rows in chunks if len(rows) == 3]
+    assert conn.closed
+
+
+def test_iter_ratings_keys_on_unique_id_so_null_ids_are_exported(fake_db):
+    albums = [
+        {'uniqueID': 1, 'albumName': 'No ID', 'spotifyAlbumId': None},
+        {'uniqueID': 2, 'albumName': 'Album', 'spotifyAlbumId': 'a1'},
+        {'uniqueID': 5, 'albumName': 'Also no ID', 'spotifyAlbumId': None},
+    ]
+
+    def respond(sql, params):
+        if 'FROM RatedAlbum' not in sql:
+            return []
+        _, after, limit = params
+        return [row for row in albums if row['uniqueID'] > after][:limit]
+
+    conn = fake_db(export, responder=respond)
+
+    exported = list(_iter_ratings('alice'))
+    assert exported == [
+        ('rated_album', {'albumName': 'No ID', 'spotifyAlbumId': None}),
+        ('rated_album', {'albumName': 'Album', 'spotifyAlbumId': 'a1'}),
+        ('rated_album', {'albumName': 'Also no ID', 'spotifyAlbumId': None}),
+    ]
+    assert all('AND uniqueID > %s ORDER BY uniqueID' in sql for sql, _ in conn.cursor_.executed)
+
+
+def test_generate_ndjson_and_csv_serialize_mysql_values(monkeypatch):
+    record = ('rated_song', {'songName': 'Track', 'rating': Decimal('7.5'), 'createdAt': datetime(2024, 5, 1, 12)})
+    monkeypatch.setattr(export, 'iter_user_export', lambda userName: iter([record]))
+
+    [line] = list(generate_ndjson('alice'))
+    assert json.loads(line) == {'recordType': 'rated_song', 'songName': 'Track', 'rating': 7.5,
+                                'createdAt': '2024-05-01T12:00:00'}
+
+    header, row = ''.join(generate_csv('alice')).splitlines()
+    assert header.split(',') == export.CSV_FIELDS
+    values = dict(zip(export.CSV_FIELDS, row.split(',')))
+    assert values['recordType'] == 'rated_song'
+    assert values['rating'] == '7.5'
+    assert values['createdAt'] == '2024-05-01T12:00:00'
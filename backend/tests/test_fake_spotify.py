@@ -0,0 +1,89 @@
+import pytest
+import requests
+
+from fake_spotify import FakeSpotifySettings, FakeSpotifyStats, TOP_PAGE_SIZE, _top_indexes, start_fake_spotify
+
+
+@pytest.fixture(scope='module')
+def server():
+    # Shutting a server down waits out its poll interval, so tests share one
+    server = start_fake_spotify(0, FakeSpotifySettings())
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def fake_spotify(server):
+    server.settings = FakeSpotifySettings(latency_ms=0, jitter_ms=0, pages=2)
+    server.stats = FakeSpotifyStats()
+    return server
+
+
+def url(server, path: str) -> str:
+    return f'http://127.0.0.1:{server.server_address[1]}{path}'
+
+
+def get(server, path: str, userName: str = 'alice', **params):
+    return requests.get(url(server, path), params=params, headers={'Authorization': f'Bearer token-{userName}'}, timeout=5)
+
+
+def test_top_lists_are_stable_per_user_and_distinct():
+    first = _top_indexes('alice', 'tracks', 'short_term', 100, 5000)
+    assert first == _top_indexes('alice', 'tracks', 'short_term', 100, 5000)
+    assert first != _top_indexes('bob', 'tracks', 'short_term', 100, 5000)
+    assert len(set(first)) == 100
+    # Never asks for more than the catalog holds
+    assert sorted(_top_indexes('alice', 'artists', 'long_term', 50, 10)) == list(range(10))
+
+
+@pytest.mark.parametrize('grant, expected_user', [
+    ({'grant_type': 'authorization_code', 'code': 'alice'}, 'alice'),
+    ({'grant_type': 'refresh_token', 'refresh_token': 'refresh-bob'}, 'bob'),
+])
+def test_token_grants(fake_spotify, grant, expected_user):
+    body = requests.post(url(fake_spotify, '/api/token'), data=grant, timeout=5).json()
+    assert body['access_token'] == f'token-{expected_user}'
+    assert body['refresh_token'] == f'refresh-{expected_user}'
+
+
+def test_token_rejects_unknown_grant(fake_spotify):
+    response = requests.post(url(fake_spotify, '/api/token'), data={'grant_type': 'password'}, timeout=5)
+    assert response.status_code == 400
+
+
+def test_api_requires_a_token(fake_spotify):
+    assert requests.get(url(fake_spotify, '/v1/me'), timeout=5).status_code == 401
+
+
+def test_profile_is_the_token_user(fake_spotify):
+    assert get(fake_spotify, '/v1/me', 'carol').json()['id'] == 'carol'
+
+
+def test_top_tracks_page_like_spotify(fake_spotify):
+    pages = [get(fake_spotify, '/v1/me/top/tracks', limit=TOP_PAGE_SIZE, offset=offset, time_range='short_term').json()
+             for offset in (0, TOP_PAGE_SIZE, 2 * TOP_PAGE_SIZE)]
+
+    assert [len(page['items']) for page in pages] == [TOP_PAGE_SIZE, TOP_PAGE_SIZE, 0]
+    assert all(page['total'] == 2 * TOP_PAGE_SIZE for page in pages)
+    ids = [item['id'] for page in pages for item in page['items']]
+    assert len(set(ids)) == len(ids)
+
+
+def test_recently_played_is_newest_first(fake_spotify):
+    items = get(fake_spotify, '/v1/me/player/recently-played', limit=50).json()['items']
+
+    played_at = [item['played_at'] for item in items]
+    assert len(items) == 50
+    assert played_at == sorted(played_at, reverse=True)
+
+
+def test_rate_limited_requests_get_retry_after_and_are_counted(fake_spotify):
+    fake_spotify.settings.rate_limit = 1.0
+    fake_spotify.settings.retry_after = 3
+
+    response = get(fake_spotify, '/v1/me')
+
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '3'
+    assert fake_spotify.stats.snapshot() == {'requests': 1, 'rateLimited': 1}
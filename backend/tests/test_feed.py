@@ -0,0 +1,138 @@
+import random
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+import feed
+from feed import (
+    SOURCE_ALBUM_RATING, SOURCE_FEED_ITEM, SOURCE_PLAY, SOURCE_SONG_RATING,
+    _older_than, fan_out_activities, feed_bp, feed_sort_key,
+)
+
+AT = datetime(2024, 5, 1, 12, 0)
+
+
+def test_older_than_without_cursor():
+    assert _older_than(SOURCE_PLAY, 'playedAt', 'id', None) == ("", ())
+
+
+def test_older_than_same_source_breaks_ties_on_id():
+    assert _older_than(SOURCE_PLAY, 'playedAt', 'id', (AT, SOURCE_PLAY, 42)) == (
+        "AND (playedAt < %s OR (playedAt = %s AND id < %s))", (AT, AT, 42))
+
+
+def test_older_than_lower_source_keeps_rows_at_the_cursor_time():
+    # Lower sources sort after the cursor's source at the same occurredAt
+    assert _older_than(SOURCE_FEED_ITEM, 'occurredAt', 'id', (AT, SOURCE_PLAY, 42)) == (
+        "AND occurredAt <= %s", (AT,))
+
+
+def test_older_than_higher_source_skips_rows_at_the_cursor_time():
+    assert _older_than(SOURCE_SONG_RATING, 'updatedAt', 'uniqueID', (AT, SOURCE_PLAY, 42)) == (
+        "AND updatedAt < %s", (AT,))
+
+
+def older_than_matches(source: int, item: dict, before) -> bool:
+    """Evaluate the condition _older_than() builds against one in-memory row."""
+    condition, params = _older_than(source, 't', 'i', before)
+    if not condition:
+        return True
+    if condition == "AND t <= %s":
+        return item['occurredAt'] <= params[0]
+    if condition == "AND t < %s":
+        return item['occurredAt'] < params[0]
+    assert condition == "AND (t < %s OR (t = %s AND i < %s))"
+    return (item['occurredAt'], item['id']) < (params[0], params[2])
+
+
+def test_feed_pages_visit_every_item_once_across_sources(make_client, monkeypatch):
+    rng = random.Random(7)
+    # Few distinct times and overlapping ids, so ties across sources are common
+    items = [
+        {'actorUserName': 'bob', 'activityType': 'play', 'itemName': f'Item {n}', 'artistName': None,
+         'spotifyId': None, 'rating': None, 'source': source, 'id': rng.randint(1, 6),
+         'occurredAt': AT + timedelta(minutes=rng.randint(0, 4))}
+        for n, source in enumerate(rng.choice([SOURCE_FEED_ITEM, SOURCE_PLAY, SOURCE_ALBUM_RATING, SOURCE_SONG_RATING])
+                                   for _ in range(60))
+    ]
+    # (source, id) is unique, as it is in the database
+    items = list({(item['source'], item['id']): item for item in items}.values())
+
+    def page(sources, limit, before):
+        rows = [item for item in items if item['source'] in sources and older_than_matches(item['source'], item, before)]
+        return sorted(rows, key=feed_sort_key, reverse=True)[:limit]
+
+    monkeypatch.setattr(feed, 'fetch_feed_items', lambda owner, limit, before=None: page({SOURCE_FEED_ITEM}, limit, before))
+    monkeypatch.setattr(feed, '_merge_popular_activity', lambda owner, limit, before=None: page(
+        {SOURCE_PLAY, SOURCE_ALBUM_RATING, SOURCE_SONG_RATING}, limit, before))
+
+    client = make_client(feed_bp, userName='alice')
+    seen = []
+    cursor = None
+    while True:
+        body = client.get('/api/feed?limit=3' + (f'&cursor={cursor}' if cursor else '')).get_json()
+        seen += [entry['itemName'] for entry in body['items']]
+        cursor = body['next_cursor']
+        if not cursor:
+            break
+
+    expected = [item['itemName'] for item in sorted(items, key=feed_sort_key, reverse=True)]
+    assert seen == expected
+
+
+def test_feed_rejects_malformed_cursor(make_client):
+    assert make_client(feed_bp, userName='alice').get('/api/feed?cursor=junk').status_code == 400
+
+
+def activity() -> dict:
+    return {'activityType': 'play', 'itemName': 'Track', 'artistName': 'Artist', 'spotifyId': 't1',
+            'rating': None, 'occurredAt': AT}
+
+
+def test_fan_out_skips_popular_actors(fake_db, monkeypatch):
+    monkeypatch.setattr(feed, 'get_popular_users', lambda: frozenset({'star'}))
+    cursor = fake_db(feed).cursor()
+
+    assert fan_out_activities(cursor, 'star', [activity()]) == 0
+    assert cursor.executed == []
+
+
+def test_fan_out_writes_to_every_follower(fake_db, monkeypatch):
+    monkeypatch.setattr(feed, 'get_popular_users', lambda: frozenset())
+    followers = [(f'fan{n}',) for n in range(feed.FANOUT_FOLLOWER_LIMIT + 5)]
+    cursor = fake_db(feed, responder=lambda sql, params: followers if 'FROM UserFriends' in sql else None).cursor()
+
+    # Not in the popular set yet, so every follower gets it, even past the limit
+    assert fan_out_activities(cursor, 'rising', [activity()]) == len(followers)
+    [(_, rows)] = cursor.statements('INSERT INTO FeedItem')
+    assert [row[0] for row in rows] == [fan for fan, in followers]
+
+
+def test_popular_users_refresh_on_shared_boundaries(fake_db, monkeypatch):
+    monkeypatch.setattr(feed, '_popular_users', {'users': frozenset(), 'expires': 0.0})
+    monkeypatch.setattr(feed.time, 'time', lambda: 1000.0)
+    fake_db(feed, responder=lambda sql, params: [('star',)])
+
+    assert feed.get_popular_users() == frozenset({'star'})
+    assert feed._popular_users['expires'] == 1200.0
+
+
+def test_publish_activities_in_background(monkeypatch):
+    published = threading.Event()
+    calls = []
+
+    def publish_activities(actor, activities):
+        calls.append((actor, activities))
+        published.set()
+
+    monkeypatch.setattr(feed, 'publish_activities', publish_activities)
+    feed.publish_activities_in_background('alice', [activity()])
+
+    assert published.wait(5)
+    assert calls == [('alice', [activity()])]
+
+
+def test_publish_activities_in_background_ignores_empty(monkeypatch):
+    monkeypatch.setattr(feed, 'publish_activities', lambda *args: pytest.fail('nothing to publish'))
+    feed.publish_activities_in_background('alice', [])
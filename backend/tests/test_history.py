@@ -0,0 +1,69 @@
+from datetime import datetime
+
+import db_insert
+import history
+from history import history_bp, rebuild_rank_history
+
+CREATED_AT = datetime(2024, 5, 1, 12, 0)
+
+
+def test_append_rank_history_writes_one_point_per_item(fake_db):
+    conn = fake_db(db_insert, responder=lambda sql, params: (
+        [('alice', 'short_term', CREATED_AT)] if 'FROM Stats' in sql else None))
+    cursor = conn.cursor()
+
+    db_insert._append_rank_history(cursor, 7, 'song', [
+        {'spotifyTrackId': 't1', 'rank': 1},
+        {'spotifyTrackId': None, 'rank': 2},
+        {'spotifyTrackId': 't3', 'rank': 3},
+    ])
+
+    [(sql, rows)] = cursor.statements('INSERT IGNORE INTO RankHistory')
+    assert rows == [
+        ('alice', 'short_term', 'song', 't1', CREATED_AT, 7, 1),
+        ('alice', 'short_term', 'song', 't3', CREATED_AT, 7, 3),
+    ]
+
+
+def test_append_rank_history_skips_missing_snapshot(fake_db):
+    cursor = fake_db(db_insert).cursor()
+    db_insert._append_rank_history(cursor, 7, 'song', [{'spotifyTrackId': 't1', 'rank': 1}])
+    assert cursor.statements('RankHistory') == []
+
+
+def test_rebuild_rank_history_backfills_every_item_table(fake_db):
+    conn = fake_db(history)
+    rebuild_rank_history()
+
+    statements = conn.cursor_.statements('INSERT IGNORE INTO RankHistory')
+    assert [params for _, params in statements] == [('song',), ('album',), ('artist',)]
+    assert all('JOIN Stats s ON s.uniqueID = t.statsID' in sql for sql, _ in statements)
+    assert conn.commits == 1
+
+
+def test_rank_trend_requires_login(make_client):
+    assert make_client(history_bp).get('/api/history/trend/songs/t1').status_code == 401
+
+
+def test_rank_trend_rejects_bad_kind_and_timeframe(make_client):
+    client = make_client(history_bp, userName='alice')
+    assert client.get('/api/history/trend/podcasts/t1').status_code == 400
+    assert client.get('/api/history/trend/songs/t1?timeframe=forever').status_code == 400
+
+
+def test_rank_trend_returns_points(make_client, monkeypatch):
+    calls = []
+
+    def fetch_rank_history(*args):
+        calls.append(args)
+        return [{'recordedAt': CREATED_AT, 'statsId': 7, 'rank': 3}]
+
+    monkeypatch.setattr(history, 'fetch_rank_history', fetch_rank_history)
+    response = make_client(history_bp, userName='alice').get('/api/history/trend/albums/a1?timeframe=long_term')
+
+    assert calls == [('alice', 'long_term', 'album', 'a1')]
+    assert response.get_json() == {
+        'spotifyId': 'a1',
+        'timeframe': 'long_term',
+        'points': [{'recordedAt': CREATED_AT.isoformat(), 'statsId': 7, 'rank': 3}],
+    }
@@ -0,0 +1,49 @@
+from flask import Flask
+
+from http_cache import client_has_etag, not_modified, with_etag
+
+app = Flask(__name__)
+
+
+def has_etag(etag: str, if_none_match: str = None) -> bool:
+    headers = {'If-None-Match': if_none_match} if if_none_match is not None else {}
+    with app.test_request_context(headers=headers):
+        return client_has_etag(etag)
+
+
+def test_client_has_etag_matches_its_own_tag():
+    assert has_etag('stats-7', '"stats-7"')
+
+
+def test_client_has_etag_accepts_weak_and_listed_tags():
+    # Proxies that compress responses turn strong tags into weak ones
+    assert has_etag('stats-7', 'W/"stats-7"')
+    assert has_etag('stats-7', '"stats-6", "stats-7"')
+    assert has_etag('stats-7', '*')
+
+
+def test_client_has_etag_rejects_other_or_missing_tags():
+    assert not has_etag('stats-7')
+    assert not has_etag('stats-7', '"stats-70"')
+    assert not has_etag('stats-7', '"stats-7-stale"')
+
+
+def test_with_etag_marks_the_page_private():
+    with app.test_request_context():
+        response = with_etag('<p>page</p>', 'stats-7')
+
+    assert response.status_code == 200
+    assert response.headers['ETag'] == '"stats-7"'
+    assert response.headers['Cache-Control'] == 'private, no-cache'
+    assert response.headers['Vary'] == 'Cookie'
+
+
+def test_not_modified_is_an_empty_tagged_304():
+    with app.test_request_context():
+        response = not_modified('stats-7')
+
+    assert response.status_code == 304
+    assert response.get_data() == b''
+    assert response.headers['ETag'] == '"stats-7"'
+    assert response.headers['Cache-Control'] == 'private, no-cache'
+    assert response.headers['Vary'] == 'Cookie'
@@ -0,0 +1,53 @@
+from collections import Counter
+
+from leaderboards import leaderboard_deltas
+
+
+def totals(*contributions):
+    """Leaderboard (score, userCount) per item recomputed from every user's scores."""
+    scores = Counter()
+    users = Counter()
+    for contribution in contributions:
+        scores.update(contribution)
+        users.update(contribution.keys())
+    return {spotify_id: (scores[spotify_id], users[spotify_id]) for spotify_id in users}
+
+
+def apply(board, deltas):
+    """Apply deltas the way update_leaderboards() does, pruning items no user has."""
+    board = dict(board)
+    for spotify_id, score_delta, user_delta in deltas:
+        score, users = board.get(spotify_id, (0, 0))
+        board[spotify_id] = (score + score_delta, users + user_delta)
+    return {spotify_id: entry for spotify_id, entry in board.items() if entry[1] > 0}
+
+
+def test_first_snapshot_adds_every_item():
+    assert leaderboard_deltas({}, {'a': 50, 'b': 49}) == [('a', 50, 1), ('b', 49, 1)]
+
+
+def test_same_scores_have_no_deltas():
+    assert leaderboard_deltas({'a': 50, 'b': 49}, {'a': 50, 'b': 49}) == []
+
+
+def test_rank_change_moves_score_but_not_user_count():
+    assert leaderboard_deltas({'a': 50, 'b': 49}, {'a': 49, 'b': 50}) == [('a', -1, 0), ('b', 1, 0)]
+
+
+def test_dropped_item_loses_its_score_and_user():
+    assert leaderboard_deltas({'a': 50, 'b': 49}, {'a': 50}) == [('b', -49, -1)]
+
+
+def test_deltas_are_sorted_for_lock_ordering():
+    deltas = leaderboard_deltas({'d': 3, 'a': 2}, {'c': 3, 'b': 1})
+    assert [spotify_id for spotify_id, _, _ in deltas] == ['a', 'b', 'c', 'd']
+
+
+def test_incremental_update_matches_full_recount():
+    other_user = {'a': 50, 'c': 48, 'x': 47}
+    old = {'a': 50, 'b': 49, 'c': 48}
+    new = {'c': 50, 'a': 49, 'd': 48}
+
+    board = apply(totals(old, other_user), leaderboard_deltas(old, new))
+    assert board == totals(new, other_user)
+    assert 'b' not in board
@@ -0,0 +1,107 @@
+import numpy as np
+import pytest
+
+import listening_patterns
+from listening_patterns import SECONDS_PER_DAY, compute_listening_patterns
+
+# Monday 2024-01-01 00:00 UTC
+MONDAY = 1704067200
+HOUR = 3600
+MINUTE = 60
+
+
+def patterns(played_at: list, ms_played: list, **kwargs) -> dict:
+    return compute_listening_patterns(np.array(played_at, dtype=np.int64),
+                                      np.array(ms_played, dtype=np.int64), **kwargs)
+
+
+@pytest.fixture(autouse=True)
+def fixed_now(monkeypatch):
+    # "Now" is Thursday 2024-01-04 12:00 UTC
+    monkeypatch.setattr(listening_patterns.time, 'time', lambda: MONDAY + 3 * SECONDS_PER_DAY + 12 * HOUR)
+
+
+def test_no_plays():
+    result = patterns([], [])
+    assert result['total_plays'] == 0
+    assert result['sessions']['count'] == 0
+    assert result['streaks'] == {'longest_days': 0, 'current_days': 0, 'active_days': 0}
+    assert np.array(result['heatmap_plays']).shape == (7, 24)
+
+
+def test_totals_and_heatmap_buckets():
+    # Monday 09:xx twice, Wednesday 21:xx once
+    result = patterns([MONDAY + 9 * HOUR, MONDAY + 9 * HOUR + 5 * MINUTE, MONDAY + 2 * SECONDS_PER_DAY + 21 * HOUR],
+                      [180000, 120000, 60000])
+
+    assert result['total_plays'] == 3
+    assert result['total_minutes'] == 6.0
+    heatmap = np.array(result['heatmap_plays'])
+    assert heatmap[0, 9] == 2
+    assert heatmap[2, 21] == 1
+    assert heatmap.sum() == 3
+    assert result['heatmap_minutes'][0][9] == 5.0
+
+
+def test_timezone_offset_moves_plays_to_local_hour_and_day():
+    # 02:00 UTC Monday is 21:00 Sunday in UTC-5
+    result = patterns([MONDAY + 2 * HOUR], [180000], tz_offset_minutes=-300)
+    assert result['heatmap_plays'][6][21] == 1
+
+
+def test_sessions_split_on_gaps():
+    played_at = [
+        MONDAY + 9 * HOUR,
+        MONDAY + 9 * HOUR + 3 * MINUTE,
+        MONDAY + 9 * HOUR + 6 * MINUTE,
+        # More than SESSION_GAP_SECONDS later: a new session
+        MONDAY + 12 * HOUR,
+    ]
+    result = patterns(played_at, [180000] * 4)
+
+    # First session: 6 minutes between play ends + the 3 minute first play
+    assert result['sessions'] == {
+        'count': 2,
+        'avg_minutes': 6.0,
+        'longest_minutes': 9.0,
+        'avg_plays': 2.0,
+    }
+
+
+def test_streaks():
+    # The week before: Monday to Thursday in a row, then Saturday
+    played_at = [MONDAY + (day - 7) * SECONDS_PER_DAY + HOUR for day in (0, 1, 2, 3, 5)]
+    # This week: Wednesday and today (Thursday)
+    played_at += [MONDAY + 2 * SECONDS_PER_DAY + HOUR, MONDAY + 3 * SECONDS_PER_DAY + HOUR]
+    result = patterns(played_at, [180000] * len(played_at))
+
+    assert result['streaks'] == {'longest_days': 4, 'current_days': 2, 'active_days': 7}
+
+
+def test_streak_is_not_current_after_a_missed_day():
+    result = patterns([MONDAY + HOUR, MONDAY + SECONDS_PER_DAY + HOUR], [180000, 180000])
+    assert result['streaks']['longest_days'] == 2
+    assert result['streaks']['current_days'] == 0
+
+
+def test_cached_streak_expires_when_the_day_changes(monkeypatch):
+    monkeypatch.setattr(listening_patterns, '_pattern_cache', listening_patterns.OrderedDict())
+    # Version never changes: no new plays arrive
+    monkeypatch.setattr(listening_patterns, '_get_play_versions', lambda userNames: {name: 7 for name in userNames})
+    played_at = np.array([MONDAY + 2 * SECONDS_PER_DAY + HOUR, MONDAY + 3 * SECONDS_PER_DAY + HOUR], dtype=np.int64)
+    loads = []
+
+    def load_play_arrays(userNames):
+        loads.append(userNames)
+        return {name: (played_at, np.full(len(played_at), 180000)) for name in userNames}
+
+    monkeypatch.setattr(listening_patterns, 'load_play_arrays', load_play_arrays)
+
+    assert listening_patterns.get_listening_patterns('alice')['streaks']['current_days'] == 2
+    assert listening_patterns.get_listening_patterns('alice')['streaks']['current_days'] == 2
+    assert len(loads) == 1
+
+    # Two days later the streak has lapsed even though nothing was played
+    monkeypatch.setattr(listening_patterns.time, 'time', lambda: MONDAY + 5 * SECONDS_PER_DAY + 12 * HOUR)
+    assert listening_patterns.get_listening_patterns('alice')['streaks']['current_days'] == 0
+    assert len(loads) == 2
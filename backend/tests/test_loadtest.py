@@ -0,0 +1,70 @@
+import pytest
+
+import loadtest
+from loadtest import VirtualUser, percentile, scenario_requests
+
+
+@pytest.mark.parametrize('pct, expected', [(50, 5), (95, 10), (99, 10), (10, 1), (0, 1)])
+def test_percentile_is_nearest_rank(pct, expected):
+    assert percentile(list(range(1, 11)), pct) == expected
+
+
+def test_percentile_of_nothing():
+    assert percentile([], 95) == 0.0
+
+
+def test_scenario_requests():
+    user = VirtualUser('http://app', 'alice', revalidate=True, timeout=1)
+
+    assert scenario_requests('login', user, 0) == ['/callback?code=alice']
+    assert [scenario_requests('stats', user, n) for n in range(4)] == [
+        ['/stats/short_term'], ['/stats/medium_term'], ['/stats/long_term'], ['/stats/short_term'],
+    ]
+    assert scenario_requests('recently-played', user, 2) == ['/stats/recently-played']
+
+
+class FakeResponse:
+    def __init__(self, status_code, etag=None):
+        self.status_code = status_code
+        self.headers = {'ETag': etag} if etag else {}
+
+
+def recording_session(user: VirtualUser, responses: list) -> list:
+    sent = []
+
+    def get(url, headers, **kwargs):
+        sent.append(headers)
+        return responses.pop(0)
+
+    user.session.get = get
+    return sent
+
+
+def test_virtual_user_revalidates_with_the_etag_it_was_sent():
+    user = VirtualUser('http://app', 'alice', revalidate=True, timeout=1)
+    sent = recording_session(user, [FakeResponse(200, '"stats-7"'), FakeResponse(304, '"stats-7"')])
+
+    assert user.get('/stats/short_term')[1:] == (200, None)
+    assert user.get('/stats/short_term')[1:] == (304, None)
+    assert sent == [{}, {'If-None-Match': '"stats-7"'}]
+
+
+def test_virtual_user_without_revalidation():
+    user = VirtualUser('http://app', 'alice', revalidate=False, timeout=1)
+    sent = recording_session(user, [FakeResponse(200, '"stats-7"'), FakeResponse(200, '"stats-7"')])
+
+    user.get('/stats/short_term')
+    user.get('/stats/short_term')
+    assert sent == [{}, {}]
+
+
+def test_virtual_user_reports_errors():
+    user = VirtualUser('http://app', 'alice', revalidate=True, timeout=1)
+    recording_session(user, [FakeResponse(503)])
+    assert user.get('/stats/short_term')[1:] == (503, 'HTTP 503')
+
+    def timeout(*args, **kwargs):
+        raise loadtest.requests.Timeout()
+
+    user.session.get = timeout
+    assert user.get('/stats/short_term')[1:] == (None, 'Timeout')
@@ -0,0 +1,121 @@
+import queue
+
+import pytest
+
+import now_playing
+from now_playing import (
+    POLL_INTERVAL_IDLE, POLL_INTERVAL_MAX_PLAYING, POLL_INTERVAL_MIN, POLL_INTERVAL_PAUSED,
+    SUBSCRIBER_QUEUE_SIZE, NowPlayingPoller, next_poll_interval, normalize_playback, playback_changed,
+)
+
+
+def state(track='t1', playing=True, progress=10000, duration=200000, fetched_at=100.0) -> dict:
+    return {
+        'isPlaying': playing,
+        'progressMs': progress,
+        'durationMs': duration,
+        'songName': 'Track',
+        'artistName': 'Artist',
+        'albumName': 'Album',
+        'spotifyTrackId': track,
+        'imageUrl': None,
+        'fetchedAt': fetched_at,
+    }
+
+
+def test_normalize_playback_nothing_playing():
+    result = normalize_playback(None)
+    assert result['isPlaying'] is False
+    assert result['spotifyTrackId'] is None
+
+
+def test_normalize_playback_track():
+    result = normalize_playback({
+        'is_playing': True,
+        'progress_ms': 1234,
+        'item': {
+            'id': 't1',
+            'name': 'Track',
+            'duration_ms': 200000,
+            'artists': [{'name': 'Artist'}, {'name': 'Featured'}],
+            'album': {'name': 'Album', 'images': [{'url': 'https://i.example/a.jpg'}]},
+        },
+    })
+    assert {key: value for key, value in result.items() if key != 'fetchedAt'} == {
+        'isPlaying': True,
+        'progressMs': 1234,
+        'durationMs': 200000,
+        'songName': 'Track',
+        'artistName': 'Artist',
+        'albumName': 'Album',
+        'spotifyTrackId': 't1',
+        'imageUrl': 'https://i.example/a.jpg',
+    }
+
+
+def test_progress_advancing_normally_is_not_a_change():
+    assert not playback_changed(state(progress=10000, fetched_at=100.0), state(progress=20000, fetched_at=110.0))
+
+
+@pytest.mark.parametrize('current', [
+    state(track='t2'),
+    state(playing=False),
+    # Seeked forward a minute
+    state(progress=80000, fetched_at=110.0),
+])
+def test_track_pause_and_seek_are_changes(current):
+    assert playback_changed(state(), current)
+
+
+def test_first_state_is_a_change():
+    assert playback_changed(None, state())
+
+
+@pytest.mark.parametrize('current, interval', [
+    (state(track=None), POLL_INTERVAL_IDLE),
+    (state(playing=False), POLL_INTERVAL_PAUSED),
+    # 9 seconds left: wake just after the track ends
+    (state(progress=191000, duration=200000), 10),
+    (state(progress=199900, duration=200000), POLL_INTERVAL_MIN),
+    (state(progress=0, duration=600000), POLL_INTERVAL_MAX_PLAYING),
+])
+def test_next_poll_interval(current, interval):
+    assert next_poll_interval(current) == pytest.approx(interval)
+
+
+def test_slow_subscriber_keeps_the_newest_states():
+    poller = NowPlayingPoller('alice', {})
+    with now_playing._pollers_lock:
+        subscriber = poller.add_subscriber()
+
+    for progress in range(SUBSCRIBER_QUEUE_SIZE + 3):
+        poller._publish(state(progress=progress))
+
+    received = [subscriber.get_nowait()['progressMs'] for _ in range(subscriber.qsize())]
+    assert received == list(range(3, SUBSCRIBER_QUEUE_SIZE + 3))
+
+
+def test_one_poller_per_user_stops_after_last_tab(monkeypatch):
+    polled = queue.Queue()
+
+    def poll(self):
+        polled.put(self.userName)
+        return state()
+
+    monkeypatch.setattr(NowPlayingPoller, '_poll', poll)
+
+    first, first_tab = now_playing.subscribe_now_playing('alice', {'access_token': 'a'})
+    second, second_tab = now_playing.subscribe_now_playing('alice', {'access_token': 'b'})
+    assert first is second
+    assert first.token_info == {'access_token': 'b'}
+
+    # Both tabs get the first state
+    assert first_tab.get(timeout=5)['spotifyTrackId'] == 't1'
+    assert second_tab.get(timeout=5)['spotifyTrackId'] == 't1'
+
+    now_playing.unsubscribe_now_playing(first, first_tab)
+    now_playing.unsubscribe_now_playing(second, second_tab)
+    first.join(timeout=5)
+
+    assert not first.is_alive()
+    assert 'alice' not in now_playing._pollers
@@ -0,0 +1,52 @@
+import base64
+from datetime import datetime
+
+import pytest
+
+from pagination import MAX_PAGE_SIZE, decode_cursor, encode_cursor, parse_page_size
+
+
+def raw_cursor(text: str) -> str:
+    return base64.urlsafe_b64encode(text.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def test_cursor_round_trip():
+    key = (datetime(2024, 5, 1, 12, 30, 15), 1, 42)
+    assert decode_cursor(encode_cursor(*key), datetime, int, int) == key
+
+
+def test_cursor_round_trip_with_strings():
+    assert decode_cursor(encode_cursor('Track 1', 7), str, int) == ('Track 1', 7)
+
+
+@pytest.mark.parametrize('cursor', [None, ''])
+def test_missing_cursor_decodes_to_none(cursor):
+    assert decode_cursor(cursor, datetime, int) is None
+
+
+@pytest.mark.parametrize('cursor', [
+    'not base64!',
+    raw_cursor('not json'),
+    raw_cursor('{"a": 1}'),
+    raw_cursor('["2024-05-01T12:30:15"]'),
+    raw_cursor('["not a date", 1]'),
+    raw_cursor('["2024-05-01T12:30:15", "x"]'),
+    raw_cursor('[null, 1]'),
+    raw_cursor('["2024-05-01T12:30:15", null]'),
+    raw_cursor('[1, [1]]'),
+])
+def test_malformed_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError, match='Invalid cursor'):
+        decode_cursor(cursor, datetime, int)
+
+
+@pytest.mark.parametrize('value, expected', [
+    (None, 20),
+    ('5', 5),
+    ('junk', 20),
+    ('0', 1),
+    ('-3', 1),
+    ('100000', MAX_PAGE_SIZE),
+])
+def test_parse_page_size(value, expected):
+    assert parse_page_size(value) == expected
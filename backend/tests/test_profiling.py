@@ -0,0 +1,137 @@
+import os
+import threading
+import time
+
+import pytest
+from flask import Flask, g
+
+import profiling
+from profiling import RequestSampler, _classify, init_profiling, waiting_on
+
+# Runs with a module name the profiler charges to Spotify
+SPOTIFY_CODE = """
+def wait_for_spotify(release):
+    release.wait()
+"""
+
+
+def spotify_thread(release: threading.Event) -> threading.Thread:
+    module_globals = {'__name__': 'spotipy.client'}
+    exec(SPOTIFY_CODE, module_globals)
+    thread = threading.Thread(target=module_globals['wait_for_spotify'], args=(release,), daemon=True)
+    thread.start()
+    return thread
+
+
+@pytest.mark.parametrize('modules, category', [
+    (['__main__', 'stats', 'mysql.connector.cursor', 'requests.sessions'], 'db'),
+    (['__main__', 'stats', 'spotipy.client', 'urllib3.connectionpool'], 'spotify'),
+    (['__main__', 'stats', 'json.encoder'], 'python'),
+])
+def test_classify(modules, category):
+    assert _classify(modules) == category
+
+
+def test_breakdown_scales_samples_to_wall_time():
+    sampler = RequestSampler(0, interval_ms=5)
+    sampler.categories.update({'spotify': 6, 'db': 3, 'python': 1})
+    sampler.elapsed = 0.2
+
+    assert sampler.breakdown_ms() == {'spotify': 120.0, 'db': 60.0, 'python': 20.0, 'wall': 200.0, 'samples': 10}
+
+
+def test_breakdown_without_samples():
+    sampler = RequestSampler(0, interval_ms=5)
+    assert sampler.breakdown_ms() == {'spotify': 0.0, 'db': 0.0, 'python': 0.0, 'wall': 0.0, 'samples': 0}
+
+
+def profiled_app(monkeypatch, tmp_path, token='secret', users=()):
+    monkeypatch.setattr(profiling.Config, 'PROFILING_HEADER_TOKEN', token)
+    monkeypatch.setattr(profiling.Config, 'PROFILING_USERS', set(users))
+    monkeypatch.setattr(profiling.Config, 'PROFILING_SAMPLE_INTERVAL_MS', 1)
+    monkeypatch.setattr(profiling.Config, 'PROFILING_OUTPUT_DIR', str(tmp_path))
+
+    app = Flask(__name__)
+    app.secret_key = 'test'
+
+    @app.route('/api/slow')
+    def slow():
+        time.sleep(0.03)
+        return 'ok'
+
+    init_profiling(app)
+    return app
+
+
+def test_profiled_request_reports_breakdown_and_writes_stacks(monkeypatch, tmp_path):
+    client = profiled_app(monkeypatch, tmp_path).test_client()
+
+    response = client.get('/api/slow', headers={'X-Profile': 'secret'})
+
+    breakdown = dict(part.split('=') for part in response.headers['X-Profile-Breakdown'].split(';'))
+    assert float(breakdown['wall']) >= 30
+    assert int(breakdown['samples']) > 0
+    [written] = os.listdir(tmp_path)
+    assert written == response.headers['X-Profile-File']
+    assert 'api_slow' in written
+    # Collapsed stacks: "frame;frame;frame count", root first
+    stacks = dict(line.rsplit(' ', 1) for line in (tmp_path / written).read_text().splitlines())
+    assert all(int(count) > 0 for count in stacks.values())
+    assert any(f'{__name__}:slow:' in stack.split(';')[-1] for stack in stacks)
+
+
+def test_requests_without_the_token_are_not_profiled(monkeypatch, tmp_path):
+    client = profiled_app(monkeypatch, tmp_path).test_client()
+
+    for headers in ({}, {'X-Profile': 'wrong'}):
+        response = client.get('/api/slow', headers=headers)
+        assert 'X-Profile-Breakdown' not in response.headers
+    assert os.listdir(tmp_path) == []
+
+
+def test_listed_users_are_profiled(monkeypatch, tmp_path):
+    client = profiled_app(monkeypatch, tmp_path, token='', users={'alice'}).test_client()
+    with client.session_transaction() as session:
+        session['userName'] = 'alice'
+
+    assert 'X-Profile-Breakdown' in client.get('/api/slow').headers
+
+
+def test_hooks_not_installed_when_unconfigured(monkeypatch, tmp_path):
+    app = profiled_app(monkeypatch, tmp_path, token='')
+
+    assert app.before_request_funcs == {}
+    assert app.after_request_funcs == {}
+
+
+def test_waiting_on_charges_the_helper_thread():
+    release = threading.Event()
+    helper = spotify_thread(release)
+    sampler = RequestSampler(threading.get_ident(), interval_ms=1)
+
+    with Flask(__name__).test_request_context():
+        g.profiler = sampler
+        sampler.start()
+        with waiting_on(helper):
+            assert sampler.delegate_thread_id == helper.ident
+            # Block like the request thread does on the snapshot queue
+            for _ in range(1000):
+                if sampler.categories['spotify'] >= 5:
+                    break
+                release.wait(0.005)
+        assert sampler.delegate_thread_id is None
+        sampler.stop()
+
+    release.set()
+    helper.join()
+    assert sampler.categories['spotify'] >= 5
+    assert any('spotipy.client:wait_for_spotify' in stack for stack in sampler.stacks)
+
+
+def test_waiting_on_outside_a_profiled_request():
+    thread = threading.current_thread()
+    with waiting_on(thread):
+        pass
+    with Flask(__name__).test_request_context():
+        with waiting_on(thread):
+            pass
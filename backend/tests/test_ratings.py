@@ -0,0 +1,99 @@
+import json
+from decimal import Decimal
+
+import pytest
+
+import ratings
+from ratings import _adjust_aggregate, _rating_bucket, rebuild_rating_aggregates, summarize_ratings
+
+
+@pytest.mark.parametrize('rating, bucket', [
+    (Decimal('0.0'), '0'),
+    (Decimal('7.9'), '7'),
+    (Decimal('8.0'), '8'),
+    (Decimal('10.0'), '10'),
+])
+def test_rating_bucket_is_whole_number_part(rating, bucket):
+    assert _rating_bucket(rating) == bucket
+
+
+def test_adjust_aggregate_new_rating():
+    assert _adjust_aggregate(0, 0, {}, new_rating=Decimal('7.5')) == (1, Decimal('7.5'), {'7': 1})
+
+
+def test_adjust_aggregate_changed_rating_moves_bucket():
+    totals = _adjust_aggregate(2, Decimal('15.0'), {'7': 1, '8': 1},
+                               old_rating=Decimal('7.0'), new_rating=Decimal('9.5'))
+    assert totals == (2, Decimal('17.5'), {'8': 1, '9': 1})
+
+
+def test_adjust_aggregate_deleted_rating_drops_empty_bucket():
+    assert _adjust_aggregate(1, Decimal('7.5'), {'7': 1}, old_rating=Decimal('7.5')) == (0, Decimal('0.0'), {})
+
+
+def test_adjust_aggregate_does_not_modify_distribution():
+    distribution = {'7': 1}
+    _adjust_aggregate(1, Decimal('7.5'), distribution, new_rating=Decimal('8.0'))
+    assert distribution == {'7': 1}
+
+
+def test_summarize_ratings_matches_incremental_updates():
+    rows = [
+        ('a1', 'Album 1', 'Artist', Decimal('7.5')),
+        ('a1', None, None, Decimal('9.0')),
+        ('a2', 'Album 2', 'Other', Decimal('10.0')),
+    ]
+    assert summarize_ratings(rows) == {
+        'a1': ('Album 1', 'Artist', 2, Decimal('16.5'), {'7': 1, '9': 1}),
+        'a2': ('Album 2', 'Other', 1, Decimal('10.0'), {'10': 1}),
+    }
+
+
+def test_apply_rating_delta_updates_locked_row(fake_db):
+    conn = fake_db(ratings, responder=lambda sql, params: (
+        [(2, Decimal('15.0'), '{"7": 1, "8": 1}')] if 'FOR UPDATE' in sql else None))
+    cursor = conn.cursor()
+
+    ratings._apply_rating_delta(cursor, 'albums', 'a1', old_rating=Decimal('7.0'), new_rating=Decimal('8.5'),
+                                name='Album 1', artist_name='Artist')
+
+    [(sql, params)] = cursor.statements('UPDATE AlbumRatingAggregate')
+    assert params == (2, Decimal('16.5'), json.dumps({'8': 2}), 'Album 1', 'Artist', 'a1')
+
+
+def test_rebuild_rating_aggregates_replaces_both_tables(fake_db):
+    stored = {
+        'RatedAlbum': [('a1', 'Album 1', 'Artist', Decimal('6.0')), ('a1', 'Album 1', 'Artist', Decimal('8.0'))],
+        'RatedSong': [],
+    }
+    conn = fake_db(ratings, responder=lambda sql, params: next(
+        (rows for table, rows in stored.items() if f'FROM {table} ' in sql), None))
+
+    rebuild_rating_aggregates()
+
+    cursor = conn.cursor_
+    assert [sql for sql, _ in cursor.statements('DELETE FROM')] == [
+        'DELETE FROM AlbumRatingAggregate', 'DELETE FROM SongRatingAggregate']
+    [(_, rows)] = cursor.statements('INSERT INTO AlbumRatingAggregate')
+    assert rows == [('a1', 'Album 1', 'Artist', 2, Decimal('14.0'), json.dumps({'6': 1, '8': 1}))]
+    assert cursor.statements('INSERT INTO SongRatingAggregate') == []
+    assert conn.commits == 1
+
+
+@pytest.mark.parametrize('rating', ['NaN', 'sNaN', 'Infinity', '1e100', '-0.01', '10.01', 'ten', None])
+def test_rate_item_rejects_invalid_ratings(make_client, monkeypatch, rating):
+    monkeypatch.setattr(ratings, 'upsert_rating', lambda *args: pytest.fail('should not be stored'))
+    client = make_client(ratings.ratings_bp, userName='alice')
+
+    response = client.post('/api/ratings/albums', json={'spotifyAlbumId': 'a1', 'rating': rating})
+    assert response.status_code == 400
+
+
+def test_rate_item_rounds_to_stored_precision(make_client, monkeypatch):
+    stored = []
+    monkeypatch.setattr(ratings, 'upsert_rating', lambda *args: stored.append(args))
+    monkeypatch.setattr(ratings, 'get_rating_aggregate', lambda kind, spotify_id: None)
+    client = make_client(ratings.ratings_bp, userName='alice')
+
+    client.post('/api/ratings/songs', json={'spotifyTrackId': 't1', 'rating': 7.25})
+    assert stored[0][3] == Decimal('7.3')
@@ -0,0 +1,125 @@
+from collections import Counter
+from itertools import permutations
+
+import pytest
+
+import recommendations
+from recommendations import _pairs_involving, cooccurrence_deltas, update_cooccurrence
+
+
+def full_counts(*baskets):
+    """Pair counts recomputed from scratch over every user's basket."""
+    counts = Counter()
+    for basket in baskets:
+        counts.update(permutations(basket, 2))
+    return counts
+
+
+def apply(counts, deltas, decremented):
+    """Apply deltas the way update_cooccurrence() does, pruning rows at zero."""
+    counts = Counter(counts)
+    for pair, delta in deltas:
+        counts[pair] += delta
+    for pair in decremented:
+        if counts[pair] <= 0:
+            del counts[pair]
+    return counts
+
+
+def test_pairs_involving_covers_both_directions():
+    assert _pairs_involving({'a'}, {'a', 'b', 'c'}) == {
+        ('a', 'b'), ('b', 'a'), ('a', 'c'), ('c', 'a'),
+    }
+
+
+def test_pairs_involving_skips_self_pairs_and_duplicates():
+    pairs = _pairs_involving({'a', 'b'}, {'a', 'b'})
+    assert pairs == {('a', 'b'), ('b', 'a')}
+
+
+def test_pairs_involving_nothing_changed():
+    assert _pairs_involving(set(), {'a', 'b'}) == set()
+
+
+def test_first_basket_adds_every_pair_once():
+    deltas, decremented = cooccurrence_deltas(set(), {'a', 'b', 'c'})
+    assert decremented == []
+    assert all(delta == 1 for _, delta in deltas)
+    assert Counter(pair for pair, _ in deltas) == full_counts({'a', 'b', 'c'})
+
+
+def test_unchanged_basket_has_no_deltas():
+    assert cooccurrence_deltas({'a', 'b'}, {'a', 'b'}) == ([], [])
+
+
+def test_deltas_are_sorted_for_lock_ordering():
+    deltas, decremented = cooccurrence_deltas({'d', 'a', 'c'}, {'b', 'a', 'e'})
+    assert deltas == sorted(deltas)
+    assert decremented == sorted(decremented)
+
+
+def test_increments_and_decrements_never_touch_the_same_pair():
+    deltas, _ = cooccurrence_deltas({'a', 'b', 'c'}, {'b', 'c', 'd'})
+    pairs = [pair for pair, _ in deltas]
+    assert len(pairs) == len(set(pairs))
+
+
+@pytest.mark.parametrize('old, new', [
+    (set(), {'a'}),
+    ({'a'}, set()),
+    ({'a', 'b', 'c'}, {'b', 'c', 'd'}),
+    ({'a', 'b'}, {'c', 'd'}),
+    ({'a', 'b', 'c', 'd'}, {'a'}),
+])
+def test_incremental_update_matches_full_recount(old, new):
+    other_user = {'a', 'c', 'x'}
+    counts = full_counts(old, other_user)
+
+    deltas, decremented = cooccurrence_deltas(old, new)
+    assert apply(counts, deltas, decremented) == full_counts(new, other_user)
+
+
+def test_pairs_only_this_user_had_are_pruned():
+    counts = full_counts({'a', 'b'})
+    deltas, decremented = cooccurrence_deltas({'a', 'b'}, {'a', 'c'})
+    updated = apply(counts, deltas, decremented)
+
+    assert ('a', 'b') not in updated
+    assert ('b', 'a') not in updated
+    assert updated[('a', 'c')] == 1
+
+
+def basket_responder(stored: list, snapshot_items: dict):
+    """Answer update_cooccurrence()'s reads: stored basket rows, one snapshot per timeframe, its items."""
+    def respond(sql, params):
+        if 'FROM CooccurrenceBasket' in sql:
+            return stored
+        if 'FROM Stats' in sql:
+            return [(1,)] if params[1] == 'short_term' else []
+        if 'FROM TopSong' in sql:
+            return [(item,) for item in snapshot_items.get('song', [])]
+        if 'FROM TopArtist' in sql:
+            return [(item,) for item in snapshot_items.get('artist', [])]
+    return respond
+
+
+def test_update_cooccurrence_locks_baskets_before_reading_the_snapshot(fake_db):
+    cursor = fake_db(recommendations, responder=basket_responder([], {'song': ['s1', 's2']})).cursor()
+    update_cooccurrence(cursor, 'alice')
+
+    first, *rest = [sql for sql, _ in cursor.executed]
+    assert 'FROM CooccurrenceBasket' in first and first.endswith('FOR UPDATE')
+    # Everything the new basket is built from is read with locking reads
+    reads = [sql for sql in rest if sql.startswith('SELECT')]
+    assert reads and all(sql.endswith('FOR SHARE') for sql in reads)
+
+
+def test_update_cooccurrence_diffs_against_the_stored_basket(fake_db):
+    stored = [('song', 's1'), ('song', 'gone'), ('artist', 'a1')]
+    cursor = fake_db(recommendations, responder=basket_responder(stored, {'song': ['s1', 's2'], 'artist': ['a1']})).cursor()
+    update_cooccurrence(cursor, 'alice')
+
+    [(_, removed)] = cursor.statements('DELETE FROM CooccurrenceBasket')
+    [(_, added)] = cursor.statements('INSERT INTO CooccurrenceBasket')
+    assert removed == [('alice', 'song', 'gone')]
+    assert added == [('alice', 'song', 's2')]
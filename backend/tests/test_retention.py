@@ -0,0 +1,108 @@
+from datetime import date
+
+import pytest
+
+import retention
+from retention import (
+    _add_months, check_partitioned, delete_user_plays, expired_partitions,
+    plan_future_partitions,
+)
+
+PARTITIONS = [
+    ('p_start', date(2020, 1, 1)),
+    ('p202401', date(2024, 2, 1)),
+    ('p202402', date(2024, 3, 1)),
+    ('p_future', None),
+]
+
+
+@pytest.mark.parametrize('day, months, expected', [
+    (date(2024, 1, 31), 1, date(2024, 2, 1)),
+    (date(2024, 11, 15), 2, date(2025, 1, 1)),
+    (date(2024, 12, 1), 1, date(2025, 1, 1)),
+    (date(2024, 1, 1), -1, date(2023, 12, 1)),
+    (date(2024, 3, 10), -14, date(2023, 1, 1)),
+    (date(2024, 5, 20), 0, date(2024, 5, 1)),
+])
+def test_add_months(day, months, expected):
+    assert _add_months(day, months) == expected
+
+
+def test_check_partitioned_accepts_monthly_layout():
+    check_partitioned(PARTITIONS)
+
+
+@pytest.mark.parametrize('partitions', [
+    [],
+    # What information_schema reports for an unpartitioned table
+    [(None, None)],
+    [('p_start', date(2020, 1, 1))],
+])
+def test_check_partitioned_rejects_other_layouts(partitions):
+    with pytest.raises(RuntimeError, match='002_partition_recently_played'):
+        check_partitioned(partitions)
+
+
+def test_plan_future_partitions_continues_from_last_bound():
+    assert plan_future_partitions(PARTITIONS, date(2024, 6, 1)) == [
+        ('p202403', date(2024, 4, 1)),
+        ('p202404', date(2024, 5, 1)),
+        ('p202405', date(2024, 6, 1)),
+    ]
+
+
+def test_plan_future_partitions_crosses_year_end():
+    partitions = [('p_start', date(2024, 12, 1)), ('p_future', None)]
+    assert plan_future_partitions(partitions, date(2025, 2, 1)) == [
+        ('p202412', date(2025, 1, 1)),
+        ('p202501', date(2025, 2, 1)),
+    ]
+
+
+def test_plan_future_partitions_nothing_when_already_ahead():
+    assert plan_future_partitions(PARTITIONS, date(2024, 3, 1)) == []
+
+
+def test_expired_partitions_stop_at_cutoff():
+    # A partition whose upper bound equals the cutoff holds only older plays
+    assert expired_partitions(PARTITIONS, date(2024, 2, 1)) == ['p_start', 'p202401']
+    assert expired_partitions(PARTITIONS, date(2024, 1, 31)) == ['p_start']
+
+
+def test_expired_partitions_skip_unknown_names():
+    partitions = [('p_start', date(2020, 1, 1)), ('manual', date(2021, 1, 1)), ('p_future', None)]
+    assert expired_partitions(partitions, date(2030, 1, 1)) == ['p_start']
+
+
+def test_ensure_future_partitions_refuses_unpartitioned_table(fake_db):
+    conn = fake_db(retention, responder=lambda sql, params: [(None, None)])
+
+    with pytest.raises(RuntimeError):
+        retention.ensure_future_partitions()
+    assert conn.cursor_.statements('ALTER TABLE') == []
+
+
+def test_rollup_refuses_unpartitioned_table(fake_db):
+    conn = fake_db(retention, responder=lambda sql, params: [(None, None)])
+
+    with pytest.raises(RuntimeError):
+        retention.rollup_expired_partitions()
+    assert conn.cursor_.statements('ALTER TABLE') == []
+
+
+def test_delete_user_plays_covers_every_play_table(fake_db):
+    cursor = fake_db(retention).cursor()
+    delete_user_plays(cursor, 'gone')
+
+    assert cursor.executed == [
+        (f"DELETE FROM {table} WHERE userName = %s", ('gone',))
+        for table in ['RecentlyPlayed', 'RecentlyPlayedMonthly', 'RecentlyPlayedVersion']
+    ]
+
+
+def test_purge_deleted_users_commits_per_user(fake_db):
+    conn = fake_db(retention, responder=lambda sql, params: [('gone',), ('left',)] if 'LEFT JOIN User' in sql else None)
+
+    assert retention.purge_deleted_users() == ['gone', 'left']
+    assert len(conn.cursor_.statements('DELETE FROM RecentlyPlayed ')) == 2
+    assert conn.commits == 2
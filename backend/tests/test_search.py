@@ -0,0 +1,83 @@
+import pytest
+
+import search
+from search import _boolean_mode_query, index_catalog_items, search_bp, search_catalog
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('radi', '+"radi"'),
+    ('  ok   computer ', '+"ok" +"computer"'),
+    # Quotes would end the phrase early, so they are dropped
+    ('say "hi"', '+"say" +"hi"'),
+    ('"', ''),
+])
+def test_boolean_mode_query_requires_every_word(query, expected):
+    assert _boolean_mode_query(query) == expected
+
+
+def song(track_id, name='Song', artist='Artist'):
+    return {'spotifyTrackId': track_id, 'songName': name, 'artistName': artist, 'imageUrl': None}
+
+
+def test_index_catalog_items_counts_only_new_items_for_the_user(fake_db):
+    cursor = fake_db(search, responder=lambda sql, params: [('t1',)] if 'FROM SearchCatalogUser' in sql else None).cursor()
+
+    index_catalog_items(cursor, 'alice', 'song', [song('t2'), song('t1'), song('t2', 'Dup'), song(None), song('t3', None)],
+                        'spotifyTrackId', 'songName')
+
+    [(_, upserts)] = cursor.statements('INSERT INTO SearchCatalog ')
+    # Deduplicated, first occurrence kept, in key order for lock ordering
+    assert upserts == [('song', 't1', 'Song', 'Artist', None), ('song', 't2', 'Song', 'Artist', None)]
+    [(_, members)] = cursor.statements('INSERT IGNORE INTO SearchCatalogUser')
+    assert members == [('song', 't2', 'alice')]
+    [(_, bumps)] = cursor.statements('SET popularity = popularity + 1')
+    assert bumps == [('song', 't2')]
+
+
+def test_index_catalog_items_skips_known_items(fake_db):
+    cursor = fake_db(search, responder=lambda sql, params: [('t1',)] if 'FROM SearchCatalogUser' in sql else None).cursor()
+
+    index_catalog_items(cursor, 'alice', 'song', [song('t1')], 'spotifyTrackId', 'songName')
+
+    assert cursor.statements('SET popularity') == []
+
+
+def test_index_catalog_items_without_usable_items(fake_db):
+    cursor = fake_db(search).cursor()
+    index_catalog_items(cursor, 'alice', 'song', [song(None)], 'spotifyTrackId', 'songName')
+    assert cursor.executed == []
+
+
+@pytest.mark.parametrize('query', ['', 'a', ' a ', '"'])
+def test_short_queries_skip_the_database(fake_db, query):
+    conn = fake_db(search)
+    assert search_catalog(query) == []
+    assert conn.cursor_.executed == []
+
+
+def test_search_catalog_filters_by_type_and_drops_relevance(fake_db):
+    row = {'itemType': 'artist', 'spotifyId': 'a1', 'name': 'Radiohead', 'artistName': None,
+           'imageUrl': None, 'popularity': 4, 'relevance': 1.5}
+    conn = fake_db(search, responder=lambda sql, params: [dict(row)])
+
+    results = search_catalog('radi', 'artist', 5)
+
+    assert results == [{key: value for key, value in row.items() if key != 'relevance'}]
+    [(sql, params)] = conn.cursor_.executed
+    assert 'AND itemType = %s' in sql
+    assert params == ['+"radi"', '+"radi"', 'artist', 5]
+
+
+def test_search_route_rejects_unknown_type(make_client):
+    response = make_client(search_bp).get('/api/search?q=radi&type=playlist')
+    assert response.status_code == 400
+
+
+def test_search_route_clamps_limit(make_client, monkeypatch):
+    calls = []
+    monkeypatch.setattr(search, 'search_catalog', lambda *args: calls.append(args) or [])
+
+    body = make_client(search_bp).get('/api/search?q=radi&limit=5000').get_json()
+
+    assert body == {'query': 'radi', 'results': []}
+    assert calls == [('radi', None, search.parse_page_size('5000'))]
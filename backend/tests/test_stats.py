@@ -0,0 +1,187 @@
+import pytest
+import spotipy
+
+import stats
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from stats import SPOTIFY_UNAVAILABLE_HTML, stats_bp
+
+
+class UnusedSpotify:
+    """Fails the test if any Spotify endpoint is actually called."""
+
+    def current_user_top_artists(self, **kwargs):
+        pytest.fail('Spotify was called while the breaker was open')
+
+    def current_user_top_tracks(self, **kwargs):
+        pytest.fail('Spotify was called while the breaker was open')
+
+
+@pytest.fixture
+def open_breaker(monkeypatch):
+    breaker = CircuitBreaker('test', failure_threshold=1, reset_timeout=60)
+    breaker.record_failure()
+    monkeypatch.setattr(stats, 'spotify_breaker', breaker)
+    return breaker
+
+
+@pytest.fixture
+def default_mode(monkeypatch):
+    monkeypatch.setattr(stats.Config, 'STATS_STALE_WHILE_REVALIDATE', False)
+    monkeypatch.setattr(stats, 'get_latest_stats_snapshot', lambda *args, **kwargs: None)
+    monkeypatch.setattr(stats, 'get_authenticated_spotify_client', lambda: (UnusedSpotify(), {}))
+
+
+@pytest.fixture
+def swr_mode(monkeypatch):
+    monkeypatch.setattr(stats.Config, 'STATS_STALE_WHILE_REVALIDATE', True)
+    monkeypatch.setattr(stats, 'get_latest_stats_snapshot', lambda *args, **kwargs: None)
+    monkeypatch.setattr(stats, 'get_spotify_client_for_token', lambda token_info: (UnusedSpotify(), token_info))
+
+
+def raising(error):
+    def fail(*args, **kwargs):
+        raise error
+    return fail
+
+
+def test_open_circuit_returns_503_without_live_fallback(default_mode, make_client, monkeypatch):
+    monkeypatch.setattr(stats, 'stream_stats_snapshot', raising(CircuitOpenError('open')))
+    monkeypatch.setattr(stats, 'render_live_stats_html', raising(AssertionError('live fallback used')))
+
+    response = make_client(stats_bp, userName='alice').get('/stats/short_term')
+
+    assert response.status_code == 503
+    assert response.get_data(as_text=True) == SPOTIFY_UNAVAILABLE_HTML
+
+
+def test_live_fallback_goes_through_the_breaker(default_mode, open_breaker, make_client, monkeypatch):
+    # The database write fails for another reason, then the breaker opens
+    monkeypatch.setattr(stats, 'stream_stats_snapshot', raising(RuntimeError('db down')))
+
+    response = make_client(stats_bp, userName='alice').get('/stats/short_term')
+
+    assert response.status_code == 503
+
+
+def test_render_live_stats_html_fails_fast_when_open(open_breaker):
+    with pytest.raises(CircuitOpenError):
+        stats.render_live_stats_html(UnusedSpotify(), 'short_term')
+
+
+@pytest.mark.parametrize('error', [
+    CircuitOpenError('open'),
+    spotipy.SpotifyException(502, -1, 'bad gateway'),
+])
+def test_first_fetch_spotify_failures_return_503(swr_mode, make_client, monkeypatch, error):
+    monkeypatch.setattr(stats, 'stream_stats_snapshot', raising(error))
+
+    response = make_client(stats_bp, userName='alice').get('/stats/medium_term')
+
+    assert response.status_code == 503
+    assert response.get_data(as_text=True) == SPOTIFY_UNAVAILABLE_HTML
+
+
+def test_first_fetch_other_failures_surface(swr_mode, make_client, monkeypatch):
+    monkeypatch.setattr(stats, 'stream_stats_snapshot', raising(RuntimeError('db down')))
+
+    response = make_client(stats_bp, userName='alice').get('/stats/medium_term')
+
+    assert response.status_code == 500
+
+
+def track(n: int, album: str = None) -> dict:
+    album = album or f'al{n}'
+    return {
+        'id': f't{n}', 'name': f'Track {n}', 'artists': [{'name': 'Artist'}],
+        'album': {'id': album, 'name': f'Album {album}', 'artists': [{'name': 'Artist'}], 'images': []},
+    }
+
+
+class PagedSpotify:
+    """Serves fixed top tracks and artists with Spotify's limit/offset paging."""
+
+    def __init__(self, tracks: int, artists: int):
+        self.tracks = [track(n) for n in range(tracks)]
+        self.artists = [{'id': f'a{n}', 'name': f'Artist {n}', 'images': []} for n in range(artists)]
+        self.calls = []
+
+    def current_user_top_tracks(self, limit, offset, time_range):
+        self.calls.append(('tracks', offset))
+        return {'items': self.tracks[offset:offset + limit]}
+
+    def current_user_top_artists(self, limit, offset, time_range):
+        self.calls.append(('artists', offset))
+        return {'items': self.artists[offset:offset + limit]}
+
+
+@pytest.mark.parametrize('count, offsets', [
+    (0, [0]),
+    (3, [0]),
+    # A full last page costs one more request that comes back empty
+    (4, [0, 4]),
+    (5, [0, 4]),
+    (8, [0, 4, 8]),
+])
+def test_iter_snapshot_pages_page_boundaries(count, offsets):
+    sp = PagedSpotify(tracks=count, artists=count)
+    pages = list(stats.iter_snapshot_pages(sp, 'short_term', batch_size=4))
+
+    assert sp.calls == [('tracks', offset) for offset in offsets] + [('artists', offset) for offset in offsets]
+    songs = [row for kind, rows in pages if kind == 'songs' for row in rows]
+    artists = [row for kind, rows in pages if kind == 'artists' for row in rows]
+    assert [song['rank'] for song in songs] == list(range(1, count + 1))
+    assert [song['spotifyTrackId'] for song in songs] == [f't{n}' for n in range(count)]
+    assert [artist['rank'] for artist in artists] == list(range(1, count + 1))
+    # Albums come last, once every track page has been counted
+    assert pages[-1][0] == 'albums'
+    assert len(pages[-1][1]) == count
+
+
+def test_iter_snapshot_pages_counts_failures_on_the_breaker(monkeypatch):
+    breaker = CircuitBreaker('test', failure_threshold=1, reset_timeout=60)
+    monkeypatch.setattr(stats, 'spotify_breaker', breaker)
+    sp = PagedSpotify(tracks=0, artists=0)
+    sp.current_user_top_tracks = raising(spotipy.SpotifyException(500, -1, 'boom'))
+
+    with pytest.raises(spotipy.SpotifyException):
+        list(stats.iter_snapshot_pages(sp, 'short_term'))
+    assert breaker.is_open()
+
+
+def test_album_ranking_orders_by_track_count_across_pages():
+    ranking = stats.AlbumRanking()
+    ranking.add_tracks([track(1, 'x'), track(2, 'y'), track(3, 'y')])
+    ranking.add_tracks([track(4, 'z'), track(5, 'z'), track(6, 'z'), track(7, 'x')])
+
+    assert [(album['spotifyAlbumId'], album['rank']) for album in ranking.ranked()] == [
+        ('z', 1), ('x', 2), ('y', 3),
+    ]
+
+
+def test_album_ranking_keeps_first_seen_order_for_ties():
+    ranking = stats.AlbumRanking()
+    ranking.add_tracks([track(1, 'b'), track(2, 'a'), track(3, 'c'), track(4, 'a'), track(5, 'b')])
+
+    assert [album['spotifyAlbumId'] for album in ranking.ranked()] == ['b', 'a', 'c']
+
+
+def test_album_ranking_skips_tracks_without_an_album():
+    ranking = stats.AlbumRanking()
+    no_album = dict(track(1), album=None)
+    no_album_id = dict(track(2), album={'name': 'Local file'})
+    ranking.add_tracks([no_album, no_album_id, track(3, 'x')])
+
+    [album] = ranking.ranked()
+    assert album == {
+        'albumName': 'Album x', 'artistName': 'Artist', 'spotifyAlbumId': 'x',
+        'imageUrl': None, 'playCount': 0, 'rank': 1,
+    }
+
+
+def test_album_ranking_matches_fetch_all_top_albums():
+    sp = PagedSpotify(tracks=9, artists=0)
+    for n, item in enumerate(sp.tracks):
+        item['album']['id'] = f'al{n % 3}'
+    pages = list(stats.iter_snapshot_pages(sp, 'short_term', batch_size=4))
+
+    assert pages[-1][1] == stats.fetch_all_top_albums(sp, 'short_term', batch_size=4)
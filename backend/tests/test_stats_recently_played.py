@@ -0,0 +1,57 @@
+from collections import OrderedDict
+from datetime import datetime
+
+import pytest
+
+import stats_recently_played
+from stats_recently_played import (
+    mark_synced, recently_played_etag, recently_synced, stats_recently_played_bp,
+)
+
+
+@pytest.fixture(autouse=True)
+def empty_sync_cache(monkeypatch):
+    monkeypatch.setattr(stats_recently_played, '_last_synced', OrderedDict())
+
+
+def test_recently_synced_expires_after_the_revalidate_window(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(stats_recently_played.time, 'monotonic', lambda: now[0])
+    monkeypatch.setattr(stats_recently_played.Config, 'RECENTLY_PLAYED_REVALIDATE_SECONDS', 60)
+
+    assert not recently_synced('alice')
+    mark_synced('alice')
+    now[0] += 59
+    assert recently_synced('alice')
+    now[0] += 1
+    assert not recently_synced('alice')
+
+
+def test_sync_times_are_bounded_least_recent_first(monkeypatch):
+    monkeypatch.setattr(stats_recently_played, 'LAST_SYNCED_CACHE_SIZE', 2)
+
+    mark_synced('alice')
+    mark_synced('bob')
+    mark_synced('alice')
+    mark_synced('carol')
+
+    assert list(stats_recently_played._last_synced) == ['alice', 'carol']
+
+
+def test_recently_played_etag():
+    assert recently_played_etag(datetime(2024, 5, 1, 12, 30, 5)) == 'recent-20240501T123005'
+    assert recently_played_etag(None) == 'recent-none'
+
+
+def test_recently_synced_page_revalidates_without_spotify(make_client, monkeypatch):
+    latest = datetime(2024, 5, 1, 12, 30, 5)
+    monkeypatch.setattr(stats_recently_played, 'get_latest_played_at', lambda userName: latest)
+    monkeypatch.setattr(stats_recently_played, 'get_authenticated_spotify_client',
+                        lambda: pytest.fail('Spotify was called for a page the browser already has'))
+    mark_synced('alice')
+
+    response = make_client(stats_recently_played_bp, userName='alice').get(
+        '/stats/recently-played', headers={'If-None-Match': '"recent-20240501T123005"'})
+
+    assert response.status_code == 304
+    assert response.headers['ETag'] == '"recent-20240501T123005"'
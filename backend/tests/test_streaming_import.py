@@ -0,0 +1,158 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+import streaming_import
+from streaming_import import drop_already_stored, iter_json_array, normalize_play
+
+
+def play(song_name: str, played_at: datetime, artist_name: str = 'Artist') -> dict:
+    return {'songName': song_name, 'artistName': artist_name, 'playedAt': played_at}
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 1 << 20])
+def test_iter_json_array_yields_every_element(tmp_path, chunk_size):
+    elements = [{'trackName': f'Track {i}', 'msPlayed': i * 1000, 'nested': [1, {'a': 'b'}]} for i in range(20)]
+    path = tmp_path / 'history.json'
+    path.write_text(json.dumps(elements, indent=2), encoding='utf-8')
+
+    assert list(iter_json_array(str(path), chunk_size=chunk_size)) == elements
+
+
+def test_iter_json_array_empty_array(tmp_path):
+    path = tmp_path / 'history.json'
+    path.write_text(' [ ] ', encoding='utf-8')
+    assert list(iter_json_array(str(path))) == []
+
+
+def test_iter_json_array_rejects_non_array(tmp_path):
+    path = tmp_path / 'history.json'
+    path.write_text('{"trackName": "Track"}', encoding='utf-8')
+    with pytest.raises(ValueError, match='expected a JSON array'):
+        list(iter_json_array(str(path)))
+
+
+def test_iter_json_array_rejects_truncated_file(tmp_path):
+    path = tmp_path / 'history.json'
+    path.write_text('[{"trackName": "Track 1"}, {"trackName": "Tra', encoding='utf-8')
+    with pytest.raises(ValueError):
+        list(iter_json_array(str(path), chunk_size=8))
+
+
+def test_normalize_play_account_data_export():
+    assert normalize_play({
+        'endTime': '2024-05-01 12:30',
+        'artistName': 'Artist',
+        'trackName': 'Track',
+        'msPlayed': 180000,
+    }) == {
+        'songName': 'Track',
+        'artistName': 'Artist',
+        'albumName': None,
+        'spotifyTrackId': None,
+        'playedAt': datetime(2024, 5, 1, 12, 30),
+        'msPlayed': 180000,
+    }
+
+
+def test_normalize_play_extended_history():
+    assert normalize_play({
+        'ts': '2024-05-01T12:30:15Z',
+        'master_metadata_track_name': 'Track',
+        'master_metadata_album_artist_name': 'Artist',
+        'master_metadata_album_album_name': 'Album',
+        'spotify_track_uri': 'spotify:track:abc123',
+        'ms_played': 180000,
+    }) == {
+        'songName': 'Track',
+        'artistName': 'Artist',
+        'albumName': 'Album',
+        'spotifyTrackId': 'abc123',
+        'playedAt': datetime(2024, 5, 1, 12, 30, 15),
+        'msPlayed': 180000,
+    }
+
+
+@pytest.mark.parametrize('entry', [
+    # Skip: played for less than 30 seconds
+    {'endTime': '2024-05-01 12:30', 'trackName': 'Track', 'msPlayed': 29999},
+    # Podcast episode: no track name
+    {'ts': '2024-05-01T12:30:15Z', 'master_metadata_track_name': None,
+     'episode_name': 'Episode', 'ms_played': 600000},
+    # Neither export format
+    {'trackName': 'Track', 'msPlayed': 180000},
+])
+def test_normalize_play_skips(entry):
+    assert normalize_play(entry) is None
+
+
+def test_drop_already_stored_matches_within_tolerance():
+    at = datetime(2024, 5, 1, 12, 30)
+    plays = [play('Track', at), play('Other', at)]
+    stored = [('Track', 'Artist', at + timedelta(seconds=42))]
+
+    assert drop_already_stored(plays, stored) == [play('Other', at)]
+
+
+def test_drop_already_stored_keeps_plays_outside_tolerance():
+    at = datetime(2024, 5, 1, 12, 30)
+    plays = [play('Track', at)]
+    stored = [('Track', 'Artist', at + timedelta(seconds=61)), ('Track', 'Artist', at - timedelta(seconds=61))]
+
+    assert drop_already_stored(plays, stored) == plays
+
+
+def test_drop_already_stored_matches_each_stored_play_once():
+    # Two back-to-back plays of a short song, only one of them synced before
+    at = datetime(2024, 5, 1, 12, 30)
+    plays = [play('Track', at), play('Track', at + timedelta(seconds=40))]
+    stored = [('Track', 'Artist', at + timedelta(seconds=5))]
+
+    assert drop_already_stored(plays, stored) == [play('Track', at + timedelta(seconds=40))]
+
+
+def test_drop_already_stored_tells_artists_apart():
+    # Same title by a different artist, played right after
+    at = datetime(2024, 5, 1, 12, 30)
+    plays = [play('Intro', at, 'Artist A')]
+    stored = [('Intro', 'Artist B', at + timedelta(seconds=20))]
+
+    assert drop_already_stored(plays, stored) == plays
+
+
+def test_insert_new_plays_checks_and_inserts_under_the_user_lock(fake_db, monkeypatch):
+    at = datetime(2024, 5, 1, 12, 30)
+    locked = []
+
+    def respond(sql, params):
+        if 'GET_LOCK' in sql:
+            locked.append(True)
+            return [(1,)]
+        if 'RELEASE_LOCK' in sql:
+            locked.pop()
+            return [(1,)]
+        if 'FROM RecentlyPlayed' in sql:
+            assert locked
+            return [('Track', 'Artist', at + timedelta(seconds=30))]
+
+    def insert_recently_played_to_db(userName, plays):
+        assert locked
+        return len(plays)
+
+    conn = fake_db(streaming_import, responder=respond)
+    monkeypatch.setattr(streaming_import, 'insert_recently_played_to_db', insert_recently_played_to_db)
+
+    inserted = streaming_import.insert_new_plays('alice', [play('Track', at), play('Other', at)])
+
+    assert inserted == 1
+    assert locked == []
+    [(_, lock_params)] = conn.cursor_.statements('GET_LOCK')
+    assert len(lock_params[0]) <= 64
+
+
+def test_user_import_lock_times_out(fake_db):
+    fake_db(streaming_import, responder=lambda sql, params: [(0,)] if 'GET_LOCK' in sql else None)
+    with pytest.raises(TimeoutError):
+        with streaming_import.user_import_lock('alice'):
+            pass